@@ -0,0 +1,101 @@
+"""
+In-process stand-in for pybatfish's Session, for benchmarking the verifier
+without a Batfish container. It implements only what BatfishConnector uses:
+init_snapshot, delete_snapshot, get_component_versions and the
+fileParseStatus / initIssues / undefinedReferences questions, plus
+differentialReachability / compareFilters (always empty). Answers come from a
+line scan of the uploaded files after a fixed delay (BATFISH_STANDIN_LATENCY seconds, default 0.05),
+so results measure the MCP and threading overhead around Batfish, not
+Batfish itself.
+
+Select it with BATFISH_SESSION_FACTORY=batfish_standin:Session (with this
+directory on PYTHONPATH).
+"""
+import os
+import time
+from typing import Any, Dict, List
+
+class _Frame:
+    def __init__(self, records: List[Dict[str, Any]]):
+        self._records = records
+
+    def to_dict(self, orient: str = "records") -> List[Dict[str, Any]]:
+        return list(self._records)
+
+class _Answer:
+    def __init__(self, records: List[Dict[str, Any]]):
+        self._records = records
+
+    def frame(self) -> _Frame:
+        return _Frame(self._records)
+
+class _Question:
+    def __init__(self, fn):
+        self._fn = fn
+
+    def answer(self, snapshot: str = None, reference_snapshot: str = None) -> _Answer:
+        return _Answer(self._fn(snapshot))
+
+class _Questions:
+    def __init__(self, session: "Session"):
+        self._session = session
+
+    def fileParseStatus(self) -> _Question:
+        return _Question(self._session._parse_status)
+
+    def initIssues(self) -> _Question:
+        return _Question(self._session._init_issues)
+
+    def undefinedReferences(self) -> _Question:
+        return _Question(lambda snapshot: [])
+
+    def differentialReachability(self, **params) -> _Question:
+        return _Question(lambda snapshot: [])
+
+    def compareFilters(self, **params) -> _Question:
+        return _Question(lambda snapshot: [])
+
+class Session:
+    def __init__(self, host: str = "localhost", port_v2: int = 9996, ssl: bool = False, **kwargs):
+        self.host = host
+        self.latency = float(os.environ.get("BATFISH_STANDIN_LATENCY", "0.05"))
+        self.q = _Questions(self)
+        self._snapshots: Dict[str, Dict[str, str]] = {}
+        self._current = None
+
+    def get_component_versions(self) -> Dict[str, str]:
+        return {"Batfish": "stand-in"}
+
+    def init_snapshot(self, upload: str, name: str = None, overwrite: bool = False) -> str:
+        files = {}
+        for root, _, names in os.walk(upload):
+            for filename in names:
+                path = os.path.join(root, filename)
+                with open(path, 'r', errors='ignore') as f:
+                    files[os.path.relpath(path, upload)] = f.read()
+        name = name or f"ss_{len(self._snapshots)}"
+        self._snapshots[name] = files
+        self._current = name
+        time.sleep(self.latency)
+        return name
+
+    def delete_snapshot(self, name: str) -> None:
+        self._snapshots.pop(name, None)
+
+    def _files(self, snapshot: str = None) -> Dict[str, str]:
+        return self._snapshots.get(snapshot or self._current, {})
+
+    def _parse_status(self, snapshot: str = None) -> List[Dict[str, Any]]:
+        return [{
+            "File_Name": name,
+            "Status": "PASSED" if "hostname" in text else "PARTIALLY_UNRECOGNIZED",
+            "File_Format": "CISCO_IOS",
+        } for name, text in self._files(snapshot).items()]
+
+    def _init_issues(self, snapshot: str = None) -> List[Dict[str, Any]]:
+        issues = []
+        for name, text in self._files(snapshot).items():
+            for lineno, line in enumerate(text.splitlines(), start=1):
+                if line.strip().startswith("%"):
+                    issues.append({"Line": lineno, "Description": f"Unrecognized line in {name}: {line.strip()}"})
+        return issues
@@ -0,0 +1,286 @@
+"""
+End-to-end tool benchmark.
+
+Starts every MCP server as a subprocess over stdio (exactly as an MCP client
+would), pointed at a synthetic inventory and IPAM database of the requested
+size, simulated consoles (shared/console_sim.py) and an in-process Batfish
+stand-in, then measures per-tool latency (p50/p99) and throughput (calls/sec
+at a fixed client concurrency).
+
+    python benchmarks/tool_bench.py --sizes 10,100,1000 --out bench.json
+    python benchmarks/tool_bench.py --sizes 100 --compare bench.json
+
+Each size is a device count: a fifth are routers, the rest Linux hosts. The
+IPAM database holds `--ipam-factor` allocations per device.
+"""
+import argparse
+import asyncio
+import ipaddress
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+import yaml
+from mcp import ClientSession, StdioServerParameters
+from mcp.client.stdio import stdio_client
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_ROOT = os.path.dirname(BENCH_DIR)
+sys.path.append(REPO_ROOT)
+from shared.console_sim import ConsoleSimulator, synthetic_inventory
+
+SERVERS = {
+    "deployer": "servers/deployer/server.py",
+    "observer": "servers/observer/server.py",
+    "ipam": "servers/ipam/server.py",
+    "librarian": "servers/librarian/server.py",
+    "auditor": "servers/auditor/server.py",
+    "verifier": "servers/verifier/src/server.py",
+}
+
+SEARCH_QUERIES = ["FastEthernet0/0", '"physical wiring"', "R1 R2 link", "interface", "ospf static route", "10.0.12.1"]
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(round(pct / 100.0 * len(sorted_values) + 0.5)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+def build_ipam_db(inventory: Dict[str, Any], allocations: int) -> Dict[str, Any]:
+    """One subnet per router LAN holding its hosts, plus a pool pre-filled with `allocations` entries."""
+    db = {"subnets": {"pool": "100.64.0.0/10"}, "allocations": {}}
+    for name, host in inventory["hosts"].items():
+        data = host["data"]
+        if "linux" in host["groups"]:
+            db["allocations"][data["ip"]] = name
+        else:
+            lan = data["interfaces"][0]["ip"]
+            db["subnets"][f"lan-{name}"] = str(ipaddress.ip_interface(lan).network)
+    base = int(ipaddress.ip_address("100.64.0.1"))
+    for i in range(allocations):
+        db["allocations"][str(ipaddress.ip_address(base + i))] = f"bench-{i}"
+    return db
+
+def cisco_config(lines: int) -> str:
+    body = ["hostname bench", "service password-encryption", "ntp server 10.0.0.1"]
+    i = 0
+    while len(body) < lines:
+        body += [f"interface FastEthernet{i // 4}/{i % 4}", f" description bench {i}",
+                 f" ip address 10.{i // 250}.{i % 250}.1 255.255.255.0", "!"]
+        i += 1
+    return "\n".join(body[:lines])
+
+class Workload:
+    """A tool, the server that owns it, and a generator of call arguments."""
+
+    def __init__(self, server: str, tool: str, args: Callable[[int], Dict[str, Any]]):
+        self.server = server
+        self.tool = tool
+        self.args = args
+
+def workloads(inventory: Dict[str, Any], db: Dict[str, Any], rng: random.Random, size: int) -> List[Workload]:
+    hosts = inventory["hosts"]
+    routers = [n for n, h in hosts.items() if "cisco" in h["groups"]]
+    linux = [n for n, h in hosts.items() if "linux" in h["groups"]]
+    addresses = [h["data"]["ip"] for h in hosts.values() if "linux" in h["groups"]]
+    subnets = sorted(s for s in db["subnets"] if s != "pool") + ["pool"]
+    device_config = cisco_config(max(50, size * 5))
+    with open(os.path.join(REPO_ROOT, "servers/verifier/tests/cisco_valid.cfg"), 'r') as f:
+        verifier_config = f.read()
+
+    def deploy(i):
+        if i % 2 and linux:
+            return {"device": rng.choice(linux), "config": "ip link set eth0 up", "dry_run": False}
+        return {"device": rng.choice(routers), "config": f"interface FastEthernet0/0\n description bench {i}",
+                "dry_run": False}
+
+    return [
+        Workload("deployer", "deploy_config", deploy),
+        Workload("observer", "check_reachability",
+                 lambda i: {"source_device": rng.choice(linux or routers), "target_ip": rng.choice(addresses)}),
+        Workload("ipam", "allocate_ip", lambda i: {"subnet_name": rng.choice(subnets), "description": f"bench-call-{i}"}),
+        Workload("librarian", "get_device_info", lambda i: {"device_name": rng.choice(list(hosts))}),
+        Workload("librarian", "search_docs", lambda i: {"query": SEARCH_QUERIES[i % len(SEARCH_QUERIES)]}),
+        Workload("auditor", "check_compliance", lambda i: {"device_config": device_config}),
+        Workload("verifier", "verify_device_config",
+                 lambda i: {"config_content": verifier_config, "hostname": f"bench{i}", "platform": "cisco_ios"}),
+    ]
+
+def _is_error(result) -> bool:
+    if result.isError:
+        return True
+    text = result.content[0].text if result.content else ""
+    if text.startswith("{"):
+        # Structured results report failures in an "error" field
+        try:
+            return "error" in json.loads(text)
+        except ValueError:
+            return False
+    return text.startswith(("Error", "FAILURE", "Unexpected error"))
+
+async def measure(session: ClientSession, workload: Workload, iterations: int, concurrency: int,
+                  warmup: int) -> Dict[str, Any]:
+    for i in range(warmup):
+        await session.call_tool(workload.tool, arguments=workload.args(i))
+
+    latencies = []
+    errors = 0
+    first_error = None
+    for i in range(iterations):
+        start = time.perf_counter()
+        result = await session.call_tool(workload.tool, arguments=workload.args(i))
+        latencies.append(time.perf_counter() - start)
+        if _is_error(result):
+            errors += 1
+            first_error = first_error or (result.content[0].text[:200] if result.content else "isError")
+
+    # Throughput: the same number of calls, `concurrency` in flight at a time
+    sem = asyncio.Semaphore(concurrency)
+
+    async def one(i):
+        async with sem:
+            return await session.call_tool(workload.tool, arguments=workload.args(i))
+
+    start = time.perf_counter()
+    results = await asyncio.gather(*(one(i) for i in range(iterations)))
+    elapsed = time.perf_counter() - start
+    errors += sum(1 for r in results if _is_error(r))
+
+    latencies.sort()
+    return {
+        "server": workload.server,
+        "tool": workload.tool,
+        "iterations": iterations,
+        "concurrency": concurrency,
+        "p50_ms": round(percentile(latencies, 50) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 3),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 3),
+        "max_ms": round(latencies[-1] * 1000, 3),
+        "calls_per_sec": round(iterations / elapsed, 2) if elapsed > 0 else None,
+        "errors": errors,
+        "first_error": first_error,
+    }
+
+async def run_size(size: int, args) -> List[Dict[str, Any]]:
+    rng = random.Random(args.seed)
+    routers = max(1, size // 5)
+    inventory = synthetic_inventory(routers, max(0, size - routers))
+    results = []
+
+    with tempfile.TemporaryDirectory(prefix="tool_bench_") as tmp:
+        sim = await ConsoleSimulator.from_inventory(inventory, host="127.0.0.1", any_port=True,
+                                                    latency=args.console_latency, seed=args.seed)
+        db = build_ipam_db(inventory, size * args.ipam_factor)
+        paths = {
+            "INVENTORY_PATH": os.path.join(tmp, "inventory.yaml"),
+            "IPAM_DB_PATH": os.path.join(tmp, "ipam_db.json"),
+            "TOPOLOGY_PATH": os.path.join(tmp, "topology_physical.yaml"),
+            "LIBRARIAN_INDEX_DIR": os.path.join(tmp, "search_index"),
+            "DEPLOYER_SNAPSHOT_DIR": os.path.join(tmp, "snapshots"),
+        }
+        with open(paths["INVENTORY_PATH"], 'w') as f:
+            yaml.safe_dump(inventory, f, sort_keys=False)
+        with open(paths["IPAM_DB_PATH"], 'w') as f:
+            json.dump(db, f)
+        with open(paths["TOPOLOGY_PATH"], 'w') as f:
+            yaml.safe_dump({"links": []}, f)
+
+        env = {
+            **os.environ, **paths,
+            "PYTHONPATH": os.pathsep.join([REPO_ROOT, BENCH_DIR, os.environ.get("PYTHONPATH", "")]),
+            "BATFISH_SESSION_FACTORY": "batfish_standin:Session",
+            "BATFISH_STANDIN_LATENCY": str(args.batfish_latency),
+        }
+        selected = workloads(inventory, db, rng, size)
+        if args.tools:
+            selected = [w for w in selected if w.tool in args.tools]
+
+        try:
+            for server in dict.fromkeys(w.server for w in selected):
+                params = StdioServerParameters(command=sys.executable, args=[os.path.join(REPO_ROOT, SERVERS[server])],
+                                               env=env, cwd=REPO_ROOT)
+                with open(os.devnull, 'w') as devnull:
+                    async with stdio_client(params, errlog=devnull) as (read, write):
+                        async with ClientSession(read, write) as session:
+                            await session.initialize()
+                            for workload in (w for w in selected if w.server == server):
+                                row = await measure(session, workload, args.iterations, args.concurrency, args.warmup)
+                                row["size"] = size
+                                results.append(row)
+                                print(f"  size={size:<6} {workload.tool:<22} p50={row['p50_ms']:>9.2f}ms "
+                                      f"p99={row['p99_ms']:>9.2f}ms  {row['calls_per_sec'] or 0:>8.1f}/s"
+                                      + (f"  errors={row['errors']}" if row["errors"] else ""), flush=True)
+        finally:
+            await sim.stop()
+    return results
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=REPO_ROOT, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(current: List[Dict[str, Any]], baseline_path: str) -> None:
+    with open(baseline_path, 'r') as f:
+        baseline = {(r["size"], r["tool"]): r for r in json.load(f)["results"]}
+    print(f"\nAgainst {baseline_path} (ratio > 1 means slower / fewer calls):")
+    for row in current:
+        old = baseline.get((row["size"], row["tool"]))
+        if not old:
+            continue
+        p50 = row["p50_ms"] / old["p50_ms"] if old["p50_ms"] else float("nan")
+        p99 = row["p99_ms"] / old["p99_ms"] if old["p99_ms"] else float("nan")
+        tput = (old["calls_per_sec"] or 0) / row["calls_per_sec"] if row["calls_per_sec"] else float("nan")
+        print(f"  size={row['size']:<6} {row['tool']:<22} p50 x{p50:.2f}  p99 x{p99:.2f}  throughput x{tput:.2f}")
+
+async def main_async(args) -> Dict[str, Any]:
+    results = []
+    for size in args.sizes:
+        print(f"Benchmarking {size} devices ...", flush=True)
+        results.extend(await run_size(size, args))
+    return {
+        "meta": {
+            "revision": git_revision(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "args": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        },
+        "results": results,
+    }
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="MCP tool latency/throughput benchmark")
+    parser.add_argument("--sizes", type=lambda s: [int(x) for x in s.split(",")], default=[10, 100],
+                        help="Comma-separated device counts")
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--warmup", type=int, default=3)
+    parser.add_argument("--ipam-factor", type=int, default=10, help="IPAM allocations per device")
+    parser.add_argument("--console-latency", type=float, default=0.0, help="Simulated seconds per console command")
+    parser.add_argument("--batfish-latency", type=float, default=0.05, help="Stand-in seconds per snapshot")
+    parser.add_argument("--tools", type=lambda s: s.split(","), default=None, help="Only these tools")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--out", default=None, help="Write results as JSON to this file")
+    parser.add_argument("--compare", default=None, help="Earlier results JSON to compare against")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(main_async(args))
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {args.out}")
+    if args.compare:
+        compare(report["results"], args.compare)
+
+if __name__ == "__main__":
+    main()
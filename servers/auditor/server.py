@@ -1,5 +1,9 @@
 from mcp.server.fastmcp import FastMCP
 from typing import Dict, Any, List
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), "../../"))
+from shared.metrics import instrument_server
 
 mcp = FastMCP("Auditor Server")
 
@@ -65,5 +69,7 @@ def audit_network_security() -> str:
 2. Generate Audit Report.
 """
 
+instrument_server(mcp, "auditor")
+
 if __name__ == "__main__":
     mcp.run()
@@ -0,0 +1,493 @@
+import asyncio
+import ipaddress
+import json
+import os
+import re
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+from shared.console_pool import console_pool, console_address
+from shared.gns3_utils import PROMPT_RE, parse_linux_ip_addr
+from shared.metrics import metrics
+from shared.responses import DEVICE_ERROR_RE, parse_ping
+
+# Pre-change snapshots, one JSON file per revision, newest SNAPSHOT_KEEP kept per device
+SNAPSHOT_DIR = os.environ.get(
+    "DEPLOYER_SNAPSHOT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "snapshots")
+)
+SNAPSHOT_KEEP = int(os.environ.get("DEPLOYER_SNAPSHOT_KEEP", "20"))
+
+# Running-config lines that open a block of indented sub-commands
+IOS_BLOCKS = ("interface ", "router ", "line ", "vlan ", "ip access-list ")
+IOS_NOISE = ("Building configuration", "Current configuration", "version ")
+
+def _platform(host_data: Dict[str, Any]) -> str:
+    return "linux" if "linux" in host_data.get("groups", []) else "cisco_ios"
+
+def _console_key(host_data: Dict[str, Any]) -> Tuple[str, Any]:
+    return console_address(host_data)
+
+# --- Offline verification ---
+
+def _inventory_owners(hosts: Dict[str, Dict[str, Any]]) -> Dict[str, str]:
+    owners = {}
+    for name, data in hosts.items():
+        data = data.get("data") or {}
+        ips = [i.get("ip") for i in data.get("interfaces") or []] + [data.get("ip")]
+        for ip in ips:
+            try:
+                owners[str(ipaddress.ip_interface(str(ip)).ip)] = name
+            except ValueError:
+                continue
+    return owners
+
+def _check_address(address: str, issues: List[str], owners: Dict[str, str], device: str,
+                   line: str) -> Optional[ipaddress.IPv4Interface]:
+    try:
+        iface = ipaddress.ip_interface(address)
+    except ValueError:
+        issues.append(f"error: invalid address in '{line}'")
+        return None
+    if iface.network.prefixlen < iface.max_prefixlen - 1 and iface.ip in (iface.network.network_address,
+                                                                           iface.network.broadcast_address):
+        issues.append(f"error: {iface.ip} is the network or broadcast address of {iface.network} ('{line}')")
+    owner = owners.get(str(iface.ip))
+    if owner and owner != device:
+        issues.append(f"error: {iface.ip} is already assigned to {owner} in the inventory ('{line}')")
+    return iface
+
+def verify_offline(device: str, platform: str, config: str,
+                   hosts: Dict[str, Dict[str, Any]]) -> Tuple[List[str], List[str]]:
+    """
+    Checks a config snippet without touching the device: address and mask
+    syntax, network/broadcast addresses, addresses owned by another device and
+    next hops outside every known subnet. Returns (errors, warnings).
+    """
+    issues: List[str] = []
+    owners = _inventory_owners(hosts)
+    data = hosts.get(device, {}).get("data") or {}
+    subnets = []
+    for ip in [i.get("ip") for i in data.get("interfaces") or []] + [data.get("ip")]:
+        try:
+            subnets.append(ipaddress.ip_interface(str(ip)).network)
+        except ValueError:
+            continue
+    known_interfaces = {i.get("name") for i in data.get("interfaces") or []} | {data.get("interface")}
+    next_hops = []
+
+    for raw in config.splitlines():
+        line = raw.strip()
+        words = line.split()
+        if not words:
+            continue
+        if platform == "linux":
+            if words[:3] in (["ip", "addr", "add"], ["ip", "address", "add"]) and len(words) >= 4:
+                iface = _check_address(words[3], issues, owners, device, line)
+                if iface is not None:
+                    subnets.append(iface.network)
+            elif words[:3] == ["ip", "route", "add"] and "via" in words:
+                next_hops.append((words[words.index("via") + 1], line))
+            continue
+        if words[0] == "interface" and len(words) >= 2:
+            if known_interfaces - {None} and words[1] not in known_interfaces:
+                issues.append(f"warning: interface {words[1]} is not in the inventory for {device}")
+        elif words[:2] == ["ip", "address"] and len(words) >= 4:
+            iface = _check_address(f"{words[2]}/{words[3]}", issues, owners, device, line)
+            if iface is not None:
+                subnets.append(iface.network)
+        elif words[:2] == ["ip", "route"] and len(words) >= 5:
+            try:
+                ipaddress.ip_network(f"{words[2]}/{words[3]}")
+            except ValueError:
+                issues.append(f"error: invalid prefix or mask in '{line}'")
+            if re.match(r"^\d+\.\d+\.\d+\.\d+$", words[4]):
+                next_hops.append((words[4], line))
+
+    for hop, line in next_hops:
+        try:
+            address = ipaddress.ip_address(hop)
+        except ValueError:
+            issues.append(f"error: invalid next hop in '{line}'")
+            continue
+        if subnets and not any(address in net for net in subnets):
+            issues.append(f"warning: next hop {hop} is not in a connected subnet of {device} ('{line}')")
+
+    errors = [i[len("error: "):] for i in issues if i.startswith("error: ")]
+    warnings = [i[len("warning: "):] for i in issues if i.startswith("warning: ")]
+    return errors, warnings
+
+# --- Snapshots and restore ---
+
+def _command_lines(output: str, command: str) -> List[str]:
+    """Drops the command echo and the trailing prompt from console output."""
+    lines = output.splitlines()
+    if lines and lines[0].strip().endswith(command):
+        lines = lines[1:]
+    if lines and PROMPT_RE.search(lines[-1]):
+        lines = lines[:-1]
+    return lines
+
+async def capture_state(console, platform: str) -> Dict[str, Any]:
+    """Running config (IOS) or addresses and routes (Linux) of one device."""
+    if platform == "linux":
+        addr = await console.send_command("ip -o -4 addr show", wait_time=0.5)
+        routes = await console.send_command("ip route", wait_time=0.5)
+        addresses: Dict[str, List[str]] = {}
+        for entry in parse_linux_ip_addr(addr):
+            addresses.setdefault(entry["name"], []).append(entry["ip"])
+        return {"addresses": addresses,
+                "routes": [l.strip() for l in _command_lines(routes, "ip route") if l.strip()]}
+    await console.send_command("end", wait_time=0.5)
+    output = await console.send_command("show running-config", wait_time=1.0)
+    return {"running_config": "\n".join(_command_lines(output, "show running-config"))}
+
+def _ios_blocks(config: str) -> Tuple[Dict[str, List[str]], List[str]]:
+    """Splits an IOS config into {block header: [child lines]} and top-level lines."""
+    blocks: Dict[str, List[str]] = {}
+    top: List[str] = []
+    header = None
+    for raw in config.splitlines():
+        line = raw.strip()
+        if not line or line in ("!", "end") or line.startswith(IOS_NOISE):
+            header = None
+            continue
+        if raw[:1].isspace():
+            if header is not None:
+                blocks[header].append(line)
+            continue
+        if line.startswith(IOS_BLOCKS):
+            header = line
+            blocks.setdefault(header, [])
+        else:
+            header = None
+            top.append(line)
+    return blocks, top
+
+def _negate(line: str) -> Optional[str]:
+    # "no X" lines are undone by re-applying the target's positive line instead
+    if line.startswith("no ") or line.split()[0] == "hostname":
+        return None
+    return f"no {line}"
+
+def ios_restore_commands(current: str, target: str) -> List[str]:
+    """Commands that turn the `current` running config back into `target`."""
+    cur_blocks, cur_top = _ios_blocks(current)
+    tgt_blocks, tgt_top = _ios_blocks(target)
+    commands: List[str] = []
+    for header in list(cur_blocks) + [h for h in tgt_blocks if h not in cur_blocks]:
+        cur = cur_blocks.get(header, [])
+        tgt = tgt_blocks.get(header)
+        if tgt is None and not header.startswith("interface "):
+            commands.append(f"no {header}")
+            continue
+        tgt = tgt or []
+        removed = [n for n in (_negate(l) for l in cur if l not in tgt) if n]
+        added = [l for l in tgt if l not in cur]
+        if not removed and not added:
+            continue
+        commands.append(header)
+        commands.extend(removed + added)
+        commands.append("exit")
+    commands.extend(n for n in (_negate(l) for l in cur_top if l not in tgt_top) if n)
+    commands.extend(l for l in tgt_top if l not in cur_top)
+    return commands
+
+def linux_restore_commands(current: Dict[str, Any], target: Dict[str, Any]) -> List[str]:
+    """iproute2 commands that bring addresses and non-kernel routes back to `target`."""
+    commands: List[str] = []
+    cur_addr, tgt_addr = current.get("addresses", {}), target.get("addresses", {})
+    for dev in sorted(set(cur_addr) | set(tgt_addr)):
+        for ip in cur_addr.get(dev, []):
+            if ip not in tgt_addr.get(dev, []):
+                commands.append(f"ip addr del {ip} dev {dev}")
+        for ip in tgt_addr.get(dev, []):
+            if ip not in cur_addr.get(dev, []):
+                commands.append(f"ip addr add {ip} dev {dev}")
+
+    def static(routes):
+        return [r for r in routes if "proto kernel" not in r]
+
+    cur_routes, tgt_routes = static(current.get("routes", [])), static(target.get("routes", []))
+    commands.extend(f"ip route del {r}" for r in cur_routes if r not in tgt_routes)
+    commands.extend(f"ip route add {r}" for r in tgt_routes if r not in cur_routes)
+    return commands
+
+def save_snapshot(device: str, platform: str, state: Dict[str, Any]) -> str:
+    """Stores a pre-change snapshot and returns its revision id."""
+    revision = time.strftime("%Y%m%d-%H%M%S") + f"-{int(time.time() * 1000) % 1000:03d}"
+    directory = os.path.join(SNAPSHOT_DIR, device)
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{revision}.json")
+    with open(f"{path}.tmp", 'w') as f:
+        json.dump({"device": device, "platform": platform, "revision": revision, "state": state}, f, indent=2)
+    os.replace(f"{path}.tmp", path)
+    for old in sorted(os.listdir(directory))[:-SNAPSHOT_KEEP]:
+        try:
+            os.remove(os.path.join(directory, old))
+        except OSError:
+            pass
+    return revision
+
+def list_snapshots(device: str) -> List[str]:
+    try:
+        return sorted(f[:-len(".json")] for f in os.listdir(os.path.join(SNAPSHOT_DIR, device)) if f.endswith(".json"))
+    except OSError:
+        return []
+
+def load_snapshot(device: str, revision: str = "last") -> Optional[Dict[str, Any]]:
+    revisions = list_snapshots(device)
+    if not revisions:
+        return None
+    if revision == "last":
+        revision = revisions[-1]
+    try:
+        with open(os.path.join(SNAPSHOT_DIR, device, f"{revision}.json"), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+async def restore(host_data: Dict[str, Any], snapshot: Dict[str, Any]) -> Dict[str, Any]:
+    """Re-applies a snapshot by diffing it against the live state; returns the commands sent."""
+    platform = _platform(host_data)
+    async with console_pool.session(*_console_key(host_data), platform=platform) as console:
+        current = await capture_state(console, platform)
+        if platform == "linux":
+            commands = linux_restore_commands(current, snapshot["state"])
+            output = await console.configure_linux("\n".join(commands)) if commands else ""
+        else:
+            commands = ios_restore_commands(current["running_config"], snapshot["state"]["running_config"])
+            output = await console.configure_cisco("\n".join(commands)) if commands else ""
+    console_pool.mark_changed(*_console_key(host_data))
+    return {"revision": snapshot["revision"], "commands": commands,
+            "device_errors": DEVICE_ERROR_RE.findall(output)}
+
+# --- Post-change checks ---
+
+def _expected_interfaces(config: str) -> Dict[str, Dict[str, Any]]:
+    """Interfaces the snippet configures, with the IP and admin state it asks for."""
+    expected: Dict[str, Dict[str, Any]] = {}
+    current = None
+    for raw in config.splitlines():
+        words = raw.split()
+        if not words:
+            continue
+        if words[0] == "interface" and len(words) >= 2:
+            current = expected.setdefault(words[1], {})
+            continue
+        # Snippets are not always indented: a global command also closes the block
+        if words[0] in ("exit", "end") or words[:2] == ["ip", "route"] or \
+                (not raw[:1].isspace() and words[0] not in ("ip", "no", "shutdown", "description")):
+            current = None
+            continue
+        if current is None:
+            continue
+        if words[:2] == ["ip", "address"] and len(words) >= 4:
+            current["ip"] = words[2]
+        elif words == ["no", "shutdown"]:
+            current["up"] = True
+        elif words == ["shutdown"]:
+            current["up"] = False
+    return expected
+
+def _find_interface(interfaces: Dict[str, Dict[str, Any]], name: str) -> Optional[Dict[str, Any]]:
+    """Matches abbreviated names too: 'f0/0' and 'Fa0/0' find 'FastEthernet0/0'."""
+    if name in interfaces:
+        return interfaces[name]
+    match = re.match(r"^([A-Za-z-]+)(.*)$", name)
+    if not match:
+        return None
+    kind, number = match.group(1).lower(), match.group(2)
+    for live_name, live in interfaces.items():
+        if live_name.lower().startswith(kind) and live_name[len(live_name) - len(number):] == number \
+                and live_name[:len(live_name) - len(number)].isalpha():
+            return live
+    return None
+
+def default_ping_targets(platform: str, config: str) -> List[str]:
+    """Next hops of the routes the snippet adds: they must answer after the change."""
+    targets = []
+    for line in config.splitlines():
+        words = line.split()
+        if platform == "linux" and words[:3] == ["ip", "route", "add"] and "via" in words:
+            targets.append(words[words.index("via") + 1])
+        elif platform != "linux" and words[:2] == ["ip", "route"] and len(words) >= 5 \
+                and re.match(r"^\d+\.\d+\.\d+\.\d+$", words[4]):
+            targets.append(words[4])
+    return list(dict.fromkeys(targets))
+
+async def check_interfaces(host_data: Dict[str, Any], config: str) -> Dict[str, Any]:
+    platform = _platform(host_data)
+    async with console_pool.session(*_console_key(host_data), platform=platform) as console:
+        if platform == "linux":
+            output = await console.send_command("ip -o -4 addr show", wait_time=0.5)
+            live = {i["ip"] for i in parse_linux_ip_addr(output)}
+            wanted = [w[3] for w in (l.split() for l in config.splitlines())
+                      if w[:3] in (["ip", "addr", "add"], ["ip", "address", "add"]) and len(w) >= 4]
+            missing = [ip for ip in wanted if ip not in live]
+            return {"check": "interfaces", "ok": not missing,
+                    "detail": f"missing addresses: {', '.join(missing)}" if missing else "addresses present"}
+        interfaces = {i["name"]: i for i in await console.get_interfaces()}
+    problems, warnings = [], []
+    for name, want in _expected_interfaces(config).items():
+        live = _find_interface(interfaces, name)
+        if live is None:
+            problems.append(f"{name} not found")
+            continue
+        if "ip" in want and live["ip"] != want["ip"]:
+            problems.append(f"{name} has {live['ip']}, expected {want['ip']}")
+        if not want.get("up"):
+            continue
+        if "admin" in (live["status"] or ""):
+            # 'no shutdown' did not take: that is the change failing
+            problems.append(f"{name} is {live['status']}/{live['protocol']}")
+        elif live["status"] != "up" or live["protocol"] != "up":
+            # Enabled but no link yet (peer shut, cable, keepalives): not this change's fault
+            warnings.append(f"{name} is {live['status']}/{live['protocol']}")
+    result = {"check": "interfaces", "ok": not problems,
+              "detail": "; ".join(problems + warnings) or "interfaces as configured"}
+    if warnings:
+        result["warnings"] = warnings
+    return result
+
+async def check_ping(host_data: Dict[str, Any], source: str, target: str) -> Dict[str, Any]:
+    platform = _platform(host_data)
+    async with console_pool.session(*_console_key(host_data), platform=platform) as console:
+        output = await console.ping(target)
+    ping = parse_ping(output)
+    if "loss_percent" in ping:
+        detail = f"{'reachable' if ping['reachable'] else 'unreachable'}, {ping['loss_percent']}% loss"
+    else:
+        detail = "reachable" if ping["reachable"] else output.strip()[-200:]
+    return {"check": f"ping {source} -> {target}", "ok": ping["reachable"], "detail": detail}
+
+# --- Pipeline ---
+
+class _Stages:
+    """Times each pipeline stage (also as a deploy.<stage> metrics span)."""
+
+    def __init__(self):
+        self.stages: List[Dict[str, Any]] = []
+        self._started = time.perf_counter()
+
+    @contextmanager
+    def run(self, name: str):
+        entry = {"stage": name, "ok": True}
+        start = time.perf_counter()
+        try:
+            with metrics.span(f"deploy.{name}"):
+                yield entry
+        except Exception as e:
+            entry["ok"] = False
+            entry["detail"] = str(e) or type(e).__name__
+            raise
+        finally:
+            entry["seconds"] = round(time.perf_counter() - start, 4)
+            self.stages.append(entry)
+
+    @property
+    def last_ok(self) -> bool:
+        return bool(self.stages) and self.stages[-1]["ok"]
+
+    def total(self) -> float:
+        return round(time.perf_counter() - self._started, 4)
+
+def _ping_jobs(device: str, hosts: Dict[str, Dict[str, Any]], targets: List[str], checks: List[Dict[str, Any]]):
+    jobs = []
+    for target in targets:
+        try:
+            source, ip = device, str(ipaddress.ip_address(target))
+        except ValueError:
+            source, _, ip = target.partition(":")
+        source_data = hosts.get(source)
+        if source_data is None:
+            checks.append({"check": f"ping {source} -> {ip}", "ok": False, "detail": "unknown device"})
+            continue
+        jobs.append(check_ping(source_data, source, ip))
+    return jobs
+
+async def run_change(device: str, host_data: Dict[str, Any], hosts: Dict[str, Dict[str, Any]], config: str,
+                     ping_targets: Optional[List[str]] = None, check_interfaces_after: bool = True,
+                     auto_rollback: bool = True, dry_run: bool = False, verify: bool = True) -> Dict[str, Any]:
+    """
+    verify -> snapshot -> apply -> checks (concurrent) -> rollback on failure.
+
+    `ping_targets` entries are "IP" (pinged from `device`) or "DEVICE:IP";
+    None means the next hops of the routes the snippet adds.
+    """
+    platform = _platform(host_data)
+    stages = _Stages()
+    result: Dict[str, Any] = {"device": device, "platform": platform, "status": None}
+
+    def finish(status: str) -> Dict[str, Any]:
+        result["status"] = status
+        result["stages"] = stages.stages
+        result["total_seconds"] = stages.total()
+        return result
+
+    if verify:
+        with stages.run("verify") as stage:
+            errors, warnings = verify_offline(device, platform, config, hosts)
+            stage["ok"] = not errors
+            stage["detail"] = {"errors": errors, "warnings": warnings}
+        if errors:
+            return finish("rejected")
+    if dry_run:
+        result["plan"] = config
+        return finish("dry_run")
+
+    try:
+        with stages.run("snapshot") as stage:
+            async with console_pool.session(*_console_key(host_data), platform=platform) as console:
+                state = await capture_state(console, platform)
+            revision = save_snapshot(device, platform, state)
+            stage["detail"] = {"revision": revision}
+    except Exception:
+        # Nothing was changed yet
+        return finish("failed")
+    result["revision"] = revision
+
+    try:
+        with stages.run("apply") as stage:
+            async with console_pool.session(*_console_key(host_data), platform=platform) as console:
+                if platform == "linux":
+                    output = await console.configure_linux(config)
+                else:
+                    output = await console.configure_cisco(config)
+            console_pool.mark_changed(*_console_key(host_data))
+            result["output"] = output
+            rejected = DEVICE_ERROR_RE.findall(output)
+            if rejected:
+                stage["ok"] = False
+                stage["detail"] = {"device_errors": rejected}
+    except Exception:
+        # The change may be half applied; fall through to the rollback
+        console_pool.mark_changed(*_console_key(host_data))
+
+    if stages.last_ok:
+        with stages.run("checks") as stage:
+            checks: List[Dict[str, Any]] = []
+            targets = default_ping_targets(platform, config) if ping_targets is None else ping_targets
+            jobs = _ping_jobs(device, hosts, targets, checks)
+            if check_interfaces_after:
+                jobs.append(check_interfaces(host_data, config))
+            for res in await asyncio.gather(*jobs, return_exceptions=True):
+                if isinstance(res, Exception):
+                    checks.append({"check": "error", "ok": False, "detail": str(res) or type(res).__name__})
+                else:
+                    checks.append(res)
+            stage["ok"] = all(c["ok"] for c in checks)
+            stage["detail"] = {"passed": sum(c["ok"] for c in checks), "failed": sum(not c["ok"] for c in checks)}
+        result["checks"] = checks
+        if stages.last_ok:
+            return finish("applied")
+
+    if not auto_rollback:
+        return finish("failed")
+    try:
+        with stages.run("rollback") as stage:
+            result["rollback"] = await restore(host_data, load_snapshot(device, revision))
+            stage["ok"] = not result["rollback"]["device_errors"]
+    except Exception:
+        return finish("rollback_failed")
+    return finish("rolled_back" if stages.last_ok else "rollback_failed")
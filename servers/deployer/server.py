@@ -1,11 +1,20 @@
 from mcp.server.fastmcp import FastMCP
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 import time
 
 import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(__file__), "../../"))
-from shared.gns3_utils import GNS3Console, load_inventory
+from shared.gns3_utils import load_inventory
+from shared.console_pool import console_pool, console_address
+from shared.metrics import instrument_server
+from shared.responses import register_transcript_tool, with_transcript
+
+try:
+    from .pipeline import run_change, load_snapshot, list_snapshots, restore
+except ImportError:
+    sys.path.append(os.path.dirname(__file__))
+    from pipeline import run_change, load_snapshot, list_snapshots, restore
 
 mcp = FastMCP("Deployer Server")
 
@@ -20,7 +29,7 @@ def get_config_diff(device: str, new_config: str) -> str:
 
 
 @mcp.tool()
-def deploy_config(device: str, config: str, dry_run: bool = True, auto_rollback: bool = True) -> str:
+async def deploy_config(device: str, config: str, dry_run: bool = True, auto_rollback: bool = True) -> Dict[str, Any]:
     """
     Deploys a configuration snippet to a device via GNS3 Console (Telnet).
     
@@ -58,20 +67,27 @@ def deploy_config(device: str, config: str, dry_run: bool = True, auto_rollback:
         ip route 10.0.0.0 255.255.255.0 20.0.0.1
         ```
         
-        dry_run: If True (default), only shows what WOULD be deployed. 
-                 Set to False to actually apply changes to the GNS3 device.
+        dry_run: If True (default), only shows what WOULD be deployed: the
+                 commands are returned as a transcript (get_transcript) without
+                 touching the device. Set to False to actually apply changes to the GNS3 device.
+        auto_rollback: Snapshot the device first and restore it if a command is
+                 rejected or a 'no shutdown' interface stays administratively down
+                 (line protocol still down is only reported as a warning).
                  
     Returns:
-        str: Console output from the device or error message.
+        Dict: {"status": success|partial|applied|rejected|rolled_back|rollback_failed|failed|dry_run,
+               "device", "console", "commands", "device_errors": [{"line", "message", "command"}],
+               "transcript_id", "error"}. The full console output is fetched on demand
+               with get_transcript(transcript_id); device error line numbers refer to it.
         
     Note:
-        - Commands are sent via Telnet to localhost:PORT (from inventory)
+        - Commands are sent via Telnet to HOSTNAME:PORT (GNS3 compute host and console port from inventory)
         - Linux uses iproute2 commands
         - Cisco uses IOS commands
         - DO NOT use Ansible/SSH/NAPALM syntax
     """
-    if dry_run:
-        return f"[DRY-RUN] Would push the following config to {device} (localhost via Telnet):\n{config}"
+    planned = [line.strip() for line in config.splitlines() if line.strip()]
+    commands = len(planned)
 
     try:
         # Load Inventory to get Port
@@ -79,37 +95,132 @@ def deploy_config(device: str, config: str, dry_run: bool = True, auto_rollback:
         host_data = inv.get("hosts", {}).get(device)
         
         if not host_data:
-            return f"Error: Device {device} not found in inventory."
+            return {"error": f"Device {device} not found in inventory."}
             
-        port = host_data.get("port")
+        hostname, port = console_address(host_data)
         if not port:
-             return f"Error: No port defined for {device} in invenotry."
+             return {"error": f"No port defined for {device} in inventory."}
              
         # Connect via GNS3 Utils
         groups = host_data.get("groups", [])
         platform = "linux" if "linux" in groups else "cisco_ios"
+        summary = {"status": "success", "device": device, "console": f"{hostname}:{port}", "commands": commands}
+
+        if dry_run:
+            # The commands as they would be sent, one per line
+            summary["status"] = "dry_run"
+            return with_transcript(summary, "\n".join(planned), "deploy_config", device, scan_errors=False)
+
+        if auto_rollback:
+            result = await run_change(device, host_data, inv.get("hosts", {}), config,
+                                      ping_targets=[], verify=False)
+            summary.update(status=result["status"], revision=result.get("revision"),
+                           seconds=result["total_seconds"])
+            if result["status"] != "applied":
+                failed = next((s for s in result["stages"] if not s["ok"] and s["stage"] != "rollback"), {})
+                summary["error"] = f"{failed.get('stage', 'deploy')} failed on {device}: {_failure_reason(failed, result)}"
+            return with_transcript(summary, result.get("output", ""), "deploy_config", device)
+
+        async with console_pool.session(hostname, port, platform=platform) as console:
+            if platform == "linux":
+                output = await console.configure_linux(config)
+            else:
+                output = await console.configure_cisco(config)
+        console_pool.mark_changed(hostname, port)
         
-        console = GNS3Console("localhost", port, platform=platform)
-        console.connect()
-        
-        if platform == "linux":
-            output = console.configure_linux(config)
-        else:
-            output = console.configure_cisco(config)
-            
-        console.close()
-        
-        return f"SUCCESS: Config deployed to {device} (Port {port}).\nOutput Capture:\n{output}"
+        with_transcript(summary, output, "deploy_config", device)
+        if "device_errors" in summary:
+            rejected = summary.get("device_errors_total", len(summary["device_errors"]))
+            summary["status"] = "partial"
+            summary["error"] = f"{device} rejected {rejected} of {commands} commands"
+        return summary
 
     except Exception as e:
-        return f"FAILURE: Connection/Deployment failed: {str(e)}"
+        return {"status": "failed", "error": f"Connection/Deployment failed: {str(e)}"}
 
+def _failure_reason(stage: Dict[str, Any], result: Dict[str, Any]) -> str:
+    """One line on why a pipeline stage failed (the details are in the transcript and checks)."""
+    detail = stage.get("detail")
+    if isinstance(detail, dict) and detail.get("device_errors"):
+        return f"device rejected {len(detail['device_errors'])} commands"
+    if isinstance(detail, dict) and "failed" in detail:
+        failed = [c["check"] for c in result.get("checks", []) if not c["ok"]]
+        return f"{detail['failed']} checks failed ({', '.join(failed)})"
+    return str(detail or "unknown error")[:200]
 
 
+
+@mcp.tool()
+async def deploy_change(device: str, config: str, ping_targets: Optional[List[str]] = None,
+                        check_interfaces: bool = True, auto_rollback: bool = True,
+                        dry_run: bool = False) -> Dict[str, Any]:
+    """
+    Safe change in one call: offline verification, snapshot of the running
+    state, apply, post-change checks run concurrently, and automatic rollback
+    to the snapshot if any check fails. Every stage is timed.
+
+    Args:
+        device: Hostname matching inventory.
+        config: The commands to execute on the device (same syntax as deploy_config).
+        ping_targets: Reachability checks after the change: "IP" (pinged from `device`)
+                      or "DEVICE:IP". Default: the next hops of the routes the change adds.
+        check_interfaces: Check that configured interfaces have the requested IP and are not left
+                          administratively down (line protocol down is a warning).
+        auto_rollback: Restore the snapshot when the device rejects a command or a check fails.
+        dry_run: Only run the offline verification.
+
+    Returns:
+        Dict: {"status": applied|rejected|rolled_back|rollback_failed|failed|dry_run,
+               "stages": [{"stage", "ok", "seconds", "detail"}], "checks": [...], "revision",
+               "transcript_id", ...}. The console output of the apply stage is fetched
+               with get_transcript(transcript_id).
+    """
+    try:
+        inv = load_inventory()
+        hosts = inv.get("hosts", {})
+        host_data = hosts.get(device)
+        if not host_data:
+            return {"error": f"Device {device} not found in inventory."}
+        if not host_data.get("port"):
+            return {"error": f"No port defined for {device} in inventory."}
+        result = await run_change(device, host_data, hosts, config, ping_targets=ping_targets,
+                                  check_interfaces_after=check_interfaces, auto_rollback=auto_rollback,
+                                  dry_run=dry_run)
+        if "output" in result:
+            # Console output is kept aside; rejected lines are quoted with their line numbers
+            with_transcript(result, result.pop("output"), "deploy_change", device)
+        return result
+    except Exception as e:
+        return {"error": f"Deployment pipeline failed: {str(e)}"}
+
 @mcp.tool()
-def rollback(device: str, revision_id: str = "last") -> str:
-    """Manually rollback configuration."""
-    return f"Rolled back {device} to revision {revision_id}."
+async def rollback(device: str, revision_id: str = "last") -> str:
+    """
+    Restores a device to a snapshot taken before a deployment.
+
+    Args:
+        device: Hostname matching inventory.
+        revision_id: Snapshot revision, or "last" for the most recent one.
+
+    Returns:
+        str: The commands sent, or an error message listing the available revisions.
+    """
+    try:
+        host_data = load_inventory().get("hosts", {}).get(device)
+        if not host_data:
+            return f"Error: Device {device} not found in inventory."
+        snapshot = load_snapshot(device, revision_id)
+        if snapshot is None:
+            available = ", ".join(list_snapshots(device)) or "none"
+            return f"Error: No snapshot '{revision_id}' for {device}. Available: {available}"
+        result = await restore(host_data, snapshot)
+        if result["device_errors"]:
+            return f"FAILURE: Rollback of {device} to {result['revision']} hit device errors: {result['device_errors']}"
+        if not result["commands"]:
+            return f"SUCCESS: {device} already matches revision {result['revision']}."
+        return f"SUCCESS: Rolled back {device} to revision {result['revision']}:\n" + "\n".join(result["commands"])
+    except Exception as e:
+        return f"FAILURE: Rollback failed: {str(e)}"
 
 @mcp.prompt()
 def plan_deployment(device: str) -> str:
@@ -118,11 +229,13 @@ def plan_deployment(device: str) -> str:
 1. Retrieve current config.
 2. Generate candidate config.
 3. Call `get_config_diff` to review changes.
-4. Verify config with `verifier` server.
-5. Call `deploy_config` with dry_run=True.
-6. Check connection (Telnet/SSH) parameters.
-7. Call `deploy_config` with dry_run=False.
+4. Call `deploy_change` with the candidate: it verifies offline, snapshots {device},
+   applies, runs the reachability/interface checks in parallel and rolls back on failure.
+5. If the status is not `applied`, read the failed stage and checks before retrying.
 """
 
+register_transcript_tool(mcp)
+instrument_server(mcp, "deployer")
+
 if __name__ == "__main__":
     mcp.run()
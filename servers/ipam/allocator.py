@@ -0,0 +1,192 @@
+import bisect
+import ipaddress
+import os
+import random
+import re
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+# Allocation strategies: lowest free address, a random free address (spreads
+# hosts over huge IPv6 prefixes), or the modified EUI-64 address of a MAC.
+STRATEGIES = ("next", "random", "eui64")
+
+MAC_RE = re.compile(r"^[0-9A-Fa-f]{12}$")
+
+_rng = random.Random()
+
+class RangeSet:
+    """
+    Allocated addresses of one subnet as sorted, disjoint, non-adjacent
+    integer intervals [start, end]. Lookups are a bisect over the interval
+    starts, so finding a free address never depends on the prefix size.
+    """
+
+    __slots__ = ("starts", "ends")
+
+    def __init__(self):
+        self.starts: List[int] = []
+        self.ends: List[int] = []
+
+    @classmethod
+    def from_sorted(cls, values: Iterable[int]) -> "RangeSet":
+        ranges = cls()
+        for value in values:
+            if ranges.ends and value <= ranges.ends[-1] + 1:
+                ranges.ends[-1] = max(ranges.ends[-1], value)
+            else:
+                ranges.starts.append(value)
+                ranges.ends.append(value)
+        return ranges
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def _find(self, value: int) -> int:
+        """Index of the last interval starting at or before value (-1 if none)."""
+        return bisect.bisect_right(self.starts, value) - 1
+
+    def __contains__(self, value: int) -> bool:
+        i = self._find(value)
+        return i >= 0 and value <= self.ends[i]
+
+    def add(self, value: int) -> bool:
+        """Marks value as allocated; False if it already was."""
+        i = self._find(value)
+        if i >= 0 and value <= self.ends[i]:
+            return False
+        joins_left = i >= 0 and self.ends[i] == value - 1
+        joins_right = i + 1 < len(self.starts) and self.starts[i + 1] == value + 1
+        if joins_left and joins_right:
+            self.ends[i] = self.ends[i + 1]
+            del self.starts[i + 1], self.ends[i + 1]
+        elif joins_left:
+            self.ends[i] = value
+        elif joins_right:
+            self.starts[i + 1] = value
+        else:
+            self.starts.insert(i + 1, value)
+            self.ends.insert(i + 1, value)
+        return True
+
+    def next_free(self, first: int, last: int, start: Optional[int] = None) -> Optional[int]:
+        """First free value in [start, last], wrapping around to [first, start); None if all taken."""
+        start = first if start is None else start
+        i = self._find(start)
+        # Intervals are merged, so the address right after one is always free
+        candidate = self.ends[i] + 1 if i >= 0 and start <= self.ends[i] else start
+        if candidate <= last:
+            return candidate
+        if start > first:
+            candidate = self.next_free(first, last, first)
+            return candidate if candidate is not None and candidate < start else None
+        return None
+
+def usable_range(net: ipaddress._BaseNetwork) -> Tuple[int, int]:
+    """First and last assignable address: no network/broadcast on IPv4, no subnet-router anycast on IPv6."""
+    first, last = int(net.network_address), int(net.broadcast_address)
+    if net.max_prefixlen - net.prefixlen <= 1:
+        # /31, /32, /127, /128: every address is usable (RFC 3021, RFC 6164)
+        return first, last
+    if net.version == 4:
+        return first + 1, last - 1
+    return first + 1, last
+
+def eui64_interface_id(mac: str) -> int:
+    """'52:54:00:12:34:56' -> 0x505400fffe123456 (modified EUI-64, U/L bit flipped)."""
+    digits = re.sub(r"[:\-.]", "", mac.strip())
+    if not MAC_RE.match(digits):
+        raise ValueError(f"Invalid MAC address '{mac}'")
+    value = int(digits, 16)
+    high, low = value >> 24, value & 0xFFFFFF
+    return ((high ^ 0x020000) << 40) | (0xFFFE << 24) | low
+
+class SubnetIndex:
+    """Allocation state of one subnet: exact capacity, used count and allocated ranges."""
+
+    def __init__(self, network: ipaddress._BaseNetwork, allocated: List[int]):
+        self.network = network
+        self.first, self.last = usable_range(network)
+        self.total = self.last - self.first + 1
+        self.ranges = RangeSet.from_sorted(allocated)
+        # Sum of interval sizes: one address spelled twice in the db counts once
+        self.used = sum(e - s + 1 for s, e in zip(self.ranges.starts, self.ranges.ends))
+
+    def add(self, value: int) -> None:
+        if self.ranges.add(value):
+            self.used += 1
+
+    def pick(self, strategy: str = "next", mac: str = "") -> Optional[int]:
+        """A free address for the strategy, or None when the subnet is full."""
+        if strategy == "next":
+            return self.ranges.next_free(self.first, self.last)
+        if strategy == "random":
+            return self.ranges.next_free(self.first, self.last, _rng.randint(self.first, self.last))
+        if strategy == "eui64":
+            if self.network.version != 6 or self.network.prefixlen > 64:
+                raise ValueError("eui64 needs an IPv6 subnet of /64 or shorter")
+            value = int(self.network.network_address) | eui64_interface_id(mac)
+            return None if value in self.ranges else value
+        raise ValueError(f"Unknown strategy '{strategy}'. Use one of: {', '.join(STRATEGIES)}")
+
+    def usage(self) -> Dict[str, Any]:
+        return {"used": self.used, "total": self.total, "free": self.total - self.used}
+
+def build_indexes(subnets: Dict[str, str], allocations: Dict[str, Any]) -> Dict[str, SubnetIndex]:
+    """One sort of all allocations, then a bisect per subnet to slice out its addresses."""
+    by_version: Dict[int, List[int]] = {4: [], 6: []}
+    for ip in allocations:
+        try:
+            address = ipaddress.ip_address(ip)
+        except ValueError:
+            continue
+        by_version[address.version].append(int(address))
+    for values in by_version.values():
+        values.sort()
+
+    indexes = {}
+    for name, cidr in subnets.items():
+        try:
+            net = ipaddress.ip_network(cidr)
+        except ValueError:
+            continue
+        values = by_version[net.version]
+        lo = bisect.bisect_left(values, int(net.network_address))
+        hi = bisect.bisect_right(values, int(net.broadcast_address))
+        first, last = usable_range(net)
+        indexes[name] = SubnetIndex(net, [v for v in values[lo:hi] if first <= v <= last])
+    return indexes
+
+class AllocatorCache:
+    """
+    Subnet indexes for the IPAM database file, rebuilt only when the file was
+    written by someone else: after our own save the cached indexes (updated in
+    place) are re-stamped with the new file identity.
+    """
+
+    def __init__(self):
+        self._stamp = None
+        self._indexes: Dict[str, SubnetIndex] = {}
+
+    @staticmethod
+    def _file_stamp(path: str):
+        try:
+            st = os.stat(path)
+            return (st.st_ino, st.st_mtime_ns, st.st_size)
+        except OSError:
+            return None
+
+    def get(self, path: str, db: Dict[str, Any]) -> Dict[str, SubnetIndex]:
+        stamp = self._file_stamp(path)
+        if stamp is None or stamp != self._stamp:
+            self._indexes = build_indexes(db.get("subnets", {}), db.get("allocations", {}))
+            self._stamp = stamp
+        return self._indexes
+
+    def saved(self, path: str) -> None:
+        self._stamp = self._file_stamp(path)
+
+    def invalidate(self) -> None:
+        """Drops the indexes, e.g. when they hold allocations that could not be saved."""
+        self._stamp = None
+        self._indexes = {}
+
+allocator_cache = AllocatorCache()
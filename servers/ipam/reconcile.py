@@ -0,0 +1,187 @@
+import ipaddress
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+WORD_RE = re.compile(r"[A-Za-z0-9_]+")
+
+FIXES = ("register", "release_orphans", "relabel")
+
+def _ip(value: Any) -> Optional[str]:
+    """'40.0.0.99/24' or '40.0.0.99' -> '40.0.0.99'; anything unparsable -> None."""
+    text = str(value).strip()
+    try:
+        if "/" in text:
+            return str(ipaddress.ip_interface(text).ip)
+        return str(ipaddress.ip_address(text))
+    except ValueError:
+        return None
+
+def index_inventory(inventory: Dict[str, Any]) -> Tuple[Dict[str, List[Dict[str, str]]], List[Dict[str, Any]]]:
+    """
+    One pass over the inventory: {ip: [{"device", "interface"}, ...]}, plus
+    entries whose ip field does not parse.
+    """
+    owners: Dict[str, List[Dict[str, str]]] = {}
+    invalid = []
+    for device, host in (inventory.get("hosts") or {}).items():
+        data = host.get("data") or {}
+        entries = [(i.get("name"), i.get("ip")) for i in data.get("interfaces") or []]
+        if data.get("ip"):
+            entries.append((data.get("interface") or "eth0", data["ip"]))
+        for interface, raw in entries:
+            if not raw:
+                continue
+            ip = _ip(raw)
+            if ip is None:
+                invalid.append({"device": device, "interface": interface, "ip": raw})
+                continue
+            owners.setdefault(ip, []).append({"device": device, "interface": interface})
+    return owners, invalid
+
+def index_allocations(allocations: Dict[str, str]) -> Tuple[Dict[str, List[str]], List[str]]:
+    """One pass over IPAM allocations: {normalised ip: [raw keys]}, plus unparsable keys."""
+    index: Dict[str, List[str]] = {}
+    invalid = []
+    for key in allocations:
+        ip = _ip(key)
+        if ip is None or "/" in key:
+            invalid.append(key)
+        else:
+            index.setdefault(ip, []).append(key)
+    return index, invalid
+
+def index_subnets(subnets: Dict[str, str]) -> Dict[Tuple[int, int], Dict[int, str]]:
+    """
+    Managed subnets keyed by (IP version, prefix length), then network address
+    as an int, so finding an address's subnet is one dict lookup per distinct
+    prefix length instead of a scan of every subnet.
+    """
+    index: Dict[Tuple[int, int], Dict[int, str]] = {}
+    for name, cidr in subnets.items():
+        try:
+            net = ipaddress.ip_network(cidr)
+        except ValueError:
+            continue
+        # The first subnet listed keeps a network address claimed twice
+        index.setdefault((net.version, net.prefixlen), {}).setdefault(int(net.network_address), name)
+    # Longest prefix first, so nested subnets resolve to the most specific one
+    return dict(sorted(index.items(), key=lambda item: item[0][1], reverse=True))
+
+def canonical_description(owner: Dict[str, str]) -> str:
+    return f"{owner['device']}:{owner['interface']}"
+
+def reconcile(inventory: Dict[str, Any], db: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Cross-checks IPAM allocations against the inventory addressing.
+
+    Both sides are hashed by normalised address once, so the whole check is
+    linear in the number of records. Device names are matched against the
+    words of free-text IPAM descriptions ("New IP for PC3" -> PC3).
+    """
+    owners, invalid_inventory = index_inventory(inventory)
+    allocations = db.get("allocations", {})
+    alloc_index, invalid_ipam = index_allocations(allocations)
+    subnets = index_subnets(db.get("subnets", {}))
+    devices = {name.lower(): name for name in (inventory.get("hosts") or {})}
+
+    def subnet_of(ip: str) -> Optional[str]:
+        addr = ipaddress.ip_address(ip)
+        value = int(addr)
+        for (version, prefixlen), networks in subnets.items():
+            if version != addr.version:
+                continue
+            host_bits = addr.max_prefixlen - prefixlen
+            name = networks.get(value >> host_bits << host_bits)
+            if name is not None:
+                return name
+        return None
+
+    def mentioned(description: str) -> List[str]:
+        return sorted({devices[w] for w in WORD_RE.findall(description.lower()) if w in devices})
+
+    report = {
+        "orphan_allocations": [],   # in IPAM, on no inventory interface
+        "unregistered": [],         # in the inventory and a managed subnet, missing from IPAM
+        "unmanaged": [],            # in the inventory, outside every managed subnet
+        "conflicts": [],            # IPAM description names a different device than the inventory
+        "unlabelled": [],           # IPAM description names no device at all
+        "duplicates": [],           # one address on several interfaces, or several IPAM keys
+        "invalid": {"inventory": invalid_inventory, "ipam": invalid_ipam},
+    }
+
+    for ip, keys in alloc_index.items():
+        if len(keys) > 1:
+            report["duplicates"].append({"ip": ip, "source": "ipam", "keys": keys})
+        description = str(allocations[keys[0]])
+        names = mentioned(description)
+        holders = owners.get(ip)
+        if not holders:
+            # Every key spelling this address is orphaned, not just the first
+            report["orphan_allocations"].append({
+                "ip": keys[0], "keys": keys, "description": description, "subnet": subnet_of(ip),
+                "mentions": names,
+            })
+            continue
+        holder_names = {h["device"] for h in holders}
+        if not names:
+            report["unlabelled"].append({"ip": keys[0], "description": description, "owners": holders})
+        elif not holder_names.intersection(names):
+            report["conflicts"].append({"ip": keys[0], "description": description, "mentions": names, "owners": holders})
+
+    for ip, holders in owners.items():
+        if len(holders) > 1:
+            report["duplicates"].append({"ip": ip, "source": "inventory", "owners": holders})
+        if ip in alloc_index:
+            continue
+        subnet = subnet_of(ip)
+        entry = {"ip": ip, "owners": holders}
+        if subnet:
+            report["unregistered"].append({**entry, "subnet": subnet})
+        else:
+            report["unmanaged"].append(entry)
+
+    report["summary"] = {
+        "inventory_addresses": len(owners),
+        "ipam_allocations": len(allocations),
+        **{k: len(v) for k, v in report.items() if isinstance(v, list)},
+    }
+    return report
+
+def plan_fixes(report: Dict[str, Any], fixes: List[str]) -> List[Dict[str, Any]]:
+    """
+    Turns a report into IPAM changes:
+      register        - allocate unregistered inventory addresses
+      release_orphans - delete allocations no inventory interface uses
+      relabel         - rewrite conflicting/unlabelled descriptions as 'device:interface'
+    Addresses used on several interfaces are left alone; they need a human.
+    """
+    unknown = [f for f in fixes if f not in FIXES]
+    if unknown:
+        raise ValueError(f"Unknown fixes {unknown}; expected any of {list(FIXES)}")
+    duplicated = {d["ip"] for d in report["duplicates"] if d["source"] == "inventory"}
+    changes = []
+    if "register" in fixes:
+        for item in report["unregistered"]:
+            if item["ip"] not in duplicated:
+                changes.append({"op": "allocate", "ip": item["ip"],
+                                "description": canonical_description(item["owners"][0])})
+    if "release_orphans" in fixes:
+        for item in report["orphan_allocations"]:
+            for key in item["keys"]:
+                changes.append({"op": "release", "ip": key, "description": item["description"]})
+    if "relabel" in fixes:
+        for item in report["conflicts"] + report["unlabelled"]:
+            if len(item["owners"]) == 1:
+                changes.append({"op": "relabel", "ip": item["ip"], "old": item["description"],
+                                "description": canonical_description(item["owners"][0])})
+    return changes
+
+def apply_changes(db: Dict[str, Any], changes: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Applies planned changes to a copy of the IPAM db; the original is untouched."""
+    allocations = dict(db.get("allocations", {}))
+    for change in changes:
+        if change["op"] == "release":
+            allocations.pop(change["ip"], None)
+        else:
+            allocations[change["ip"]] = change["description"]
+    return {**db, "allocations": allocations}
@@ -1,22 +1,69 @@
 from mcp.server.fastmcp import FastMCP
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 import ipaddress
 import json
 import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(__file__), "../../"))
+from shared.inventory_cache import inventory_cache
+from shared.metrics import instrument_server, metrics
+
+try:
+    from .reconcile import reconcile, plan_fixes, apply_changes
+    from .allocator import STRATEGIES, allocator_cache
+except ImportError:
+    sys.path.append(os.path.dirname(__file__))
+    from reconcile import reconcile, plan_fixes, apply_changes
+    from allocator import STRATEGIES, allocator_cache
 
 mcp = FastMCP("IPAM Server")
 
-DB_FILE = os.path.join(os.path.dirname(__file__), "ipam_db.json")
+DB_FILE = os.environ.get("IPAM_DB_PATH", os.path.join(os.path.dirname(__file__), "ipam_db.json"))
 
 def load_db():
     if not os.path.exists(DB_FILE):
         return {"subnets": {}, "allocations": {}}
-    with open(DB_FILE, 'r') as f:
+    with metrics.span("ipam.load"), open(DB_FILE, 'r') as f:
         return json.load(f)
 
 def save_db(data):
-    with open(DB_FILE, 'w') as f:
+    # Write-then-rename so a crash never leaves a half-written database.
+    # The whole file is rewritten: persisting a change costs O(database size).
+    tmp = f"{DB_FILE}.tmp"
+    with metrics.span("ipam.save"), open(tmp, 'w') as f:
         json.dump(data, f, indent=4)
+    os.replace(tmp, DB_FILE)
+
+def _save_allocations(db):
+    """Saves allocations picked through the cached indexes, which already hold them."""
+    try:
+        save_db(db)
+    except Exception:
+        # Otherwise later calls would skip addresses that never reached the file
+        allocator_cache.invalidate()
+        raise
+    allocator_cache.saved(DB_FILE)
+
+def _allocate(db, indexes, subnet_name, description, strategy="next", mac=""):
+    """Picks and records one address; returns it, or None when the subnet is full."""
+    index = indexes[subnet_name]
+    value = index.pick(strategy, mac=mac)
+    if value is None:
+        return None
+    ip = ipaddress.ip_address(value)
+    db["allocations"][str(ip)] = description
+    # Overlapping subnets (e.g. a /64 inside a managed /48) see the address too
+    for other in indexes.values():
+        if other.network.version == ip.version and other.first <= value <= other.last:
+            other.add(value)
+    return str(ip)
+
+def _format_usage(name, cidr, usage):
+    used, total = usage["used"], usage["total"]
+    percent = used * 100 / total if total > 0 else 0
+    # Huge IPv6 prefixes: keep a few significant digits instead of printing 0.0%
+    shown = f"{percent:.1f}" if percent == 0 or percent >= 0.1 else f"{percent:.3g}"
+    return f"Subnet {name} ({cidr}): {used}/{total} used ({shown}%), {usage['free']} free"
 
 @mcp.tool()
 def add_subnet(name: str, cidr: str) -> str:
@@ -45,57 +92,142 @@ def list_subnets() -> Dict[str, str]:
 
 @mcp.tool()
 def get_subnet_usage(subnet_name: str) -> str:
-    """Calculate usage for a specific subnet."""
+    """Calculate usage for a specific subnet (exact, also for IPv6 prefixes)."""
     db = load_db()
     subnets = db["subnets"]
-    allocations = db["allocations"]
     
     if subnet_name not in subnets:
         return f"Error: Subnet '{subnet_name}' not found."
     
-    cidr = subnets[subnet_name]
-    net = ipaddress.ip_network(cidr)
-    total_hosts = net.num_addresses - 2 # exclude net/broadcast
-    
-    used_count = 0
-    for ip in allocations:
-        if ipaddress.ip_address(ip) in net:
-            used_count += 1
-            
-    usage_percent = (used_count / total_hosts) * 100 if total_hosts > 0 else 0
-    return f"Subnet {subnet_name} ({cidr}): {used_count}/{total_hosts} used ({usage_percent:.1f}%)"
+    index = allocator_cache.get(DB_FILE, db)[subnet_name]
+    return _format_usage(subnet_name, subnets[subnet_name], index.usage())
 
 @mcp.tool()
-def allocate_ip(subnet_name: str, description: str) -> str:
+def allocate_ip(subnet_name: str, description: str, strategy: str = "next", mac: str = "") -> str:
     """
-    Allocates the NEXT available IP address in a subnet.
+    Allocates an available IP address in a subnet (IPv4 or IPv6, any prefix size).
     
     Args:
         subnet_name: The descriptive alias of the subnet.
         description: A note about what this IP is for (e.g., 'PC3').
+        strategy: 'next' (lowest free address, default), 'random' (random free
+                  address, spreads hosts over large IPv6 prefixes) or 'eui64'
+                  (IPv6 address derived from `mac`).
+        mac: MAC address of the host, for strategy 'eui64'.
         
     Returns:
         str: The allocated IP address or an error if subnet is full.
     """
     db = load_db()
     subnets = db["subnets"]
-    allocations = db["allocations"]
     
     if subnet_name not in subnets:
         return f"Error: Subnet '{subnet_name}' not found."
+    if strategy not in STRATEGIES:
+        return f"Error: Unknown strategy '{strategy}'. Use one of: {', '.join(STRATEGIES)}"
 
-    cidr = subnets[subnet_name]
-    net = ipaddress.ip_network(cidr)
-    
-    # Simple sequential scan
-    for ip in net.hosts():
-        ip_str = str(ip)
-        if ip_str not in allocations:
-            allocations[ip_str] = description
-            save_db(db)
-            return f"Allocated {ip_str} for '{description}' in {subnet_name}"
-            
-    return f"Error: No IPs available in {subnet_name}"
+    indexes = allocator_cache.get(DB_FILE, db)
+    try:
+        ip_str = _allocate(db, indexes, subnet_name, description, strategy=strategy, mac=mac)
+    except ValueError as e:
+        return f"Error: {e}"
+    if ip_str is None:
+        if strategy == "eui64":
+            return f"Error: The EUI-64 address for {mac} is already allocated in {subnet_name}"
+        return f"Error: No IPs available in {subnet_name}"
+    try:
+        _save_allocations(db)
+    except OSError as e:
+        return f"Error: Could not save the IPAM database: {e}"
+    return f"Allocated {ip_str} for '{description}' in {subnet_name}"
+
+@mcp.tool()
+def allocate_ips(subnet_name: str, descriptions: List[str], strategy: str = "next",
+                 macs: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Allocates one address per description in a single database write. For
+    dual-stack hosts, call it once for the IPv4 subnet and once for the IPv6 one.
+
+    Args:
+        subnet_name: The descriptive alias of the subnet.
+        descriptions: One note per address to allocate (e.g., host names).
+        strategy: 'next', 'random' or 'eui64' (see allocate_ip).
+        macs: For 'eui64', one MAC address per description.
+
+    Returns:
+        Dict: {"allocated": {description: ip}, "failed": {description: reason}, "usage": "..."}
+    """
+    db = load_db()
+    subnets = db["subnets"]
+    if subnet_name not in subnets:
+        return {"error": f"Subnet '{subnet_name}' not found."}
+    if strategy not in STRATEGIES:
+        return {"error": f"Unknown strategy '{strategy}'. Use one of: {', '.join(STRATEGIES)}"}
+    if strategy == "eui64" and len(macs or []) != len(descriptions):
+        return {"error": "Strategy 'eui64' needs one MAC address per description."}
+
+    indexes = allocator_cache.get(DB_FILE, db)
+    allocated, failed = {}, {}
+    with metrics.span("ipam.allocate_batch"):
+        for i, description in enumerate(descriptions):
+            mac = macs[i] if macs else ""
+            try:
+                ip_str = _allocate(db, indexes, subnet_name, description, strategy=strategy, mac=mac)
+            except ValueError as e:
+                failed[description] = str(e)
+                continue
+            if ip_str is None:
+                if strategy != "eui64":
+                    failed.update({d: "subnet full" for d in descriptions[i:]})
+                    break
+                failed[description] = "already allocated"
+                continue
+            allocated[description] = ip_str
+    if allocated:
+        try:
+            _save_allocations(db)
+        except OSError as e:
+            return {"error": f"Could not save the IPAM database: {e}", "failed": failed}
+    usage = _format_usage(subnet_name, subnets[subnet_name], indexes[subnet_name].usage())
+    return {"allocated": allocated, "failed": failed, "usage": usage}
+
+@mcp.tool()
+def reconcile_with_inventory(fixes: Optional[List[str]] = None, dry_run: bool = True) -> Dict[str, Any]:
+    """
+    Cross-checks IPAM allocations against the addresses in the inventory (Source of Truth).
+
+    Reports orphan allocations (no device uses them), unregistered inventory
+    addresses, descriptions that name the wrong device, and duplicate addresses.
+    Optionally fixes IPAM in one transaction: either every change is written or none.
+
+    Args:
+        fixes: Any of 'register' (allocate unregistered addresses), 'release_orphans'
+               (delete unused allocations), 'relabel' (set descriptions to 'device:interface').
+        dry_run: If True (default), only return the planned changes.
+
+    Returns:
+        Dict: The report, plus 'changes' and 'applied' when fixes are requested.
+    """
+    try:
+        inventory, revision = inventory_cache.snapshot()
+    except Exception as e:
+        return {"error": f"Failed to load inventory: {str(e)}"}
+    db = load_db()
+    report = reconcile(inventory, db)
+    report["inventory_revision"] = revision
+    if not fixes:
+        return report
+
+    try:
+        changes = plan_fixes(report, fixes)
+    except ValueError as e:
+        return {"error": str(e)}
+    report["changes"] = changes
+    report["applied"] = False
+    if changes and not dry_run:
+        save_db(apply_changes(db, changes))
+        report["applied"] = True
+    return report
 
 @mcp.resource("ipam://subnets/list")
 def resource_subnets() -> str:
@@ -107,6 +239,8 @@ def resource_subnets() -> str:
         output.append(f"- {name}: {cidr}")
     return "\n".join(output)
 
+instrument_server(mcp, "ipam")
+
 if __name__ == "__main__":
     # Ensure DB exists
     if not os.path.exists(DB_FILE):
@@ -0,0 +1,131 @@
+import ipaddress
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../../../"))
+from servers.ipam.allocator import RangeSet, SubnetIndex, build_indexes, eui64_interface_id, usable_range
+
+def intervals(ranges):
+    return list(zip(ranges.starts, ranges.ends))
+
+# --- RangeSet ---
+
+def test_from_sorted_merges_adjacent_and_duplicate_values():
+    ranges = RangeSet.from_sorted([1, 2, 2, 3, 5, 7, 8])
+    assert intervals(ranges) == [(1, 3), (5, 5), (7, 8)]
+
+def test_add_joins_left_right_and_both():
+    ranges = RangeSet.from_sorted([1, 5])
+    assert ranges.add(2)                      # joins (1, 1)
+    assert ranges.add(4)                      # joins (5, 5)
+    assert intervals(ranges) == [(1, 2), (4, 5)]
+    assert ranges.add(3)                      # bridges both
+    assert intervals(ranges) == [(1, 5)]
+    assert not ranges.add(3)
+    assert ranges.add(0) and ranges.add(9)
+    assert intervals(ranges) == [(0, 5), (9, 9)]
+
+def test_contains():
+    ranges = RangeSet.from_sorted([10, 11, 12, 20])
+    assert 10 in ranges and 12 in ranges and 20 in ranges
+    assert 9 not in ranges and 13 not in ranges and 21 not in ranges
+
+def test_next_free_skips_allocated_runs():
+    ranges = RangeSet.from_sorted([1, 2, 3, 5])
+    assert ranges.next_free(1, 10) == 4
+    assert ranges.next_free(1, 10, start=5) == 6
+    assert ranges.next_free(1, 10, start=8) == 8
+
+def test_next_free_wraps_around_from_start():
+    ranges = RangeSet.from_sorted([7, 8, 9, 10])
+    assert ranges.next_free(1, 10, start=7) == 1
+
+def test_next_free_on_an_exhausted_range():
+    ranges = RangeSet.from_sorted(range(1, 11))
+    assert ranges.next_free(1, 10) is None
+    assert ranges.next_free(1, 10, start=6) is None
+
+def test_next_free_single_free_address_before_start():
+    ranges = RangeSet.from_sorted([v for v in range(1, 11) if v != 2])
+    assert ranges.next_free(1, 10, start=5) == 2
+
+def test_random_adds_match_a_set():
+    rng = random.Random(7)
+    ranges, reference = RangeSet(), set()
+    for _ in range(2000):
+        value = rng.randrange(200)
+        assert ranges.add(value) == (value not in reference)
+        reference.add(value)
+    # Intervals stay sorted, disjoint and non-adjacent
+    for (s1, e1), (s2, e2) in zip(intervals(ranges), intervals(ranges)[1:]):
+        assert s1 <= e1 < s2 - 1 <= e2
+    assert {v for s, e in intervals(ranges) for v in range(s, e + 1)} == reference
+    free = [v for v in range(200) if v not in reference]
+    assert ranges.next_free(0, 199) == (free[0] if free else None)
+
+# --- Subnets ---
+
+@pytest.mark.parametrize("cidr, first, last", [
+    ("10.0.0.0/24", "10.0.0.1", "10.0.0.254"),
+    ("10.0.0.0/30", "10.0.0.1", "10.0.0.2"),
+    ("10.0.0.0/31", "10.0.0.0", "10.0.0.1"),
+    ("10.0.0.7/32", "10.0.0.7", "10.0.0.7"),
+    ("2001:db8::/64", "2001:db8::1", "2001:db8::ffff:ffff:ffff:ffff"),
+    ("2001:db8::/127", "2001:db8::", "2001:db8::1"),
+])
+def test_usable_range(cidr, first, last):
+    assert usable_range(ipaddress.ip_network(cidr)) == (int(ipaddress.ip_address(first)),
+                                                        int(ipaddress.ip_address(last)))
+
+def test_subnet_fills_up_then_reports_none():
+    index = build_indexes({"p2p": "10.0.0.0/30"}, {})["p2p"]
+    picked = []
+    for _ in range(2):
+        picked.append(index.pick())
+        index.add(picked[-1])
+    assert [str(ipaddress.ip_address(v)) for v in picked] == ["10.0.0.1", "10.0.0.2"]
+    assert index.pick() is None
+    assert index.pick("random") is None
+    assert index.usage() == {"used": 2, "total": 2, "free": 0}
+
+def test_host_subnet_has_one_address():
+    index = build_indexes({"lo": "10.0.0.7/32"}, {})["lo"]
+    assert index.pick() == int(ipaddress.ip_address("10.0.0.7"))
+    index.add(index.pick())
+    assert index.pick() is None
+
+def test_build_indexes_slices_allocations_per_subnet():
+    allocations = {"10.0.0.1": "a", "10.0.0.255": "broadcast", "10.0.1.5": "b",
+                   "2001:db8::1": "c", "not-an-ip": "x"}
+    indexes = build_indexes({"lan": "10.0.0.0/24", "other": "10.0.1.0/24", "v6": "2001:db8::/64",
+                             "broken": "10.0.0.0/33"}, allocations)
+    assert set(indexes) == {"lan", "other", "v6"}
+    # The broadcast address is outside the usable range, so it is not counted
+    assert indexes["lan"].usage()["used"] == 1
+    assert indexes["other"].usage()["used"] == 1
+    assert indexes["v6"].usage() == {"used": 1, "total": 2 ** 64 - 1, "free": 2 ** 64 - 2}
+
+def test_same_address_spelled_twice_counts_once():
+    indexes = build_indexes({"v6": "2001:db8::/64"}, {"2001:db8::5": "a", "2001:DB8::5": "b"})
+    assert indexes["v6"].usage()["used"] == 1
+
+def test_huge_ipv6_prefix_picks_without_scanning():
+    index = build_indexes({"v6": "2001:db8::/32"}, {"2001:db8::1": "a", "2001:db8::2": "b"})["v6"]
+    assert str(ipaddress.ip_address(index.pick())) == "2001:db8::3"
+    value = index.pick("random")
+    assert index.first <= value <= index.last and value not in index.ranges
+
+def test_eui64():
+    assert eui64_interface_id("52:54:00:12:34:56") == 0x505400FFFE123456
+    index = build_indexes({"v6": "2001:db8::/64"}, {})["v6"]
+    value = index.pick("eui64", mac="52-54-00-12-34-56")
+    assert str(ipaddress.ip_address(value)) == "2001:db8::5054:ff:fe12:3456"
+    index.add(value)
+    assert index.pick("eui64", mac="525400123456") is None
+    with pytest.raises(ValueError):
+        index.pick("eui64", mac="not-a-mac")
+    with pytest.raises(ValueError):
+        build_indexes({"v4": "10.0.0.0/24"}, {})["v4"].pick("eui64", mac="52:54:00:12:34:56")
@@ -0,0 +1,123 @@
+import copy
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../../../"))
+from servers.ipam.reconcile import apply_changes, index_allocations, index_inventory, plan_fixes, reconcile
+
+INVENTORY = {
+    "hosts": {
+        "R1": {"data": {"interfaces": [
+            {"name": "FastEthernet0/0", "ip": "10.0.0.1/24"},
+            {"name": "FastEthernet0/1", "ip": "10.0.1.1/24"},
+            {"name": "Loopback0", "ip": "10.0.0.129/32"},
+            {"name": "Tunnel0", "ip": "172.16.0.1/30"},
+            {"name": "Serial0/0", "ip": "not-an-ip"},
+            {"name": "Serial0/1"}]}},
+        "PC1": {"data": {"ip": "10.0.0.10/24"}},
+        "PC2": {"data": {"ip": "10.0.1.10/24", "interface": "ens3"}},
+        "PC3": {"data": {"ip": "10.0.1.10"}},
+        "PC4": {"data": {"ip": "2001:db8::4/64"}},
+    }
+}
+
+DB = {
+    "subnets": {"lan": "10.0.0.0/24", "loopbacks": "10.0.0.128/25", "lan2": "10.0.1.0/24",
+                "lan-copy": "10.0.1.0/24", "v6": "2001:db8::/64", "broken": "10.0.0.0/33"},
+    "allocations": {
+        "10.0.0.1": "R1 Fa0/0 gateway",
+        "10.0.0.10": "New IP for PC3",
+        "10.0.1.1": "uplink",
+        "10.0.0.200": "old PC9 lease",
+        "2001:db8::5": "PC5",
+        "2001:DB8::5": "PC5 again",
+        "10.0.0.0/24": "a cidr key",
+    },
+}
+
+@pytest.fixture
+def report():
+    return reconcile(INVENTORY, DB)
+
+def by_ip(items):
+    return {item["ip"]: item for item in items}
+
+def test_index_inventory():
+    owners, invalid = index_inventory(INVENTORY)
+    assert owners["10.0.1.10"] == [{"device": "PC2", "interface": "ens3"}, {"device": "PC3", "interface": "eth0"}]
+    assert owners["2001:db8::4"] == [{"device": "PC4", "interface": "eth0"}]
+    assert invalid == [{"device": "R1", "interface": "Serial0/0", "ip": "not-an-ip"}]
+    assert index_inventory({}) == ({}, [])
+
+def test_index_allocations_normalises_spellings():
+    index, invalid = index_allocations(DB["allocations"])
+    assert index["2001:db8::5"] == ["2001:db8::5", "2001:DB8::5"]
+    assert invalid == ["10.0.0.0/24"]
+
+def test_orphans_carry_every_key_and_their_subnet(report):
+    orphans = by_ip(report["orphan_allocations"])
+    assert set(orphans) == {"10.0.0.200", "2001:db8::5"}
+    assert orphans["2001:db8::5"]["keys"] == ["2001:db8::5", "2001:DB8::5"]
+    assert orphans["10.0.0.200"]["subnet"] == "loopbacks"
+    assert orphans["2001:db8::5"]["subnet"] == "v6"
+
+def test_longest_prefix_subnet_and_first_listed_duplicate(report):
+    unregistered = by_ip(report["unregistered"])
+    assert unregistered["10.0.0.129"]["subnet"] == "loopbacks"
+    assert unregistered["10.0.1.10"]["subnet"] == "lan2"
+    assert unregistered["2001:db8::4"]["subnet"] == "v6"
+    assert set(unregistered) == {"10.0.0.129", "10.0.1.10", "2001:db8::4"}
+
+def test_unmanaged_addresses(report):
+    assert [item["ip"] for item in report["unmanaged"]] == ["172.16.0.1"]
+
+def test_conflicts_and_unlabelled(report):
+    conflicts = by_ip(report["conflicts"])
+    assert set(conflicts) == {"10.0.0.10"}
+    assert conflicts["10.0.0.10"]["mentions"] == ["PC3"]
+    assert conflicts["10.0.0.10"]["owners"] == [{"device": "PC1", "interface": "eth0"}]
+    assert [item["ip"] for item in report["unlabelled"]] == ["10.0.1.1"]
+
+def test_duplicates_and_invalid(report):
+    duplicates = {(d["source"], d["ip"]) for d in report["duplicates"]}
+    assert duplicates == {("ipam", "2001:db8::5"), ("inventory", "10.0.1.10")}
+    assert report["invalid"]["ipam"] == ["10.0.0.0/24"]
+    assert report["invalid"]["inventory"][0]["interface"] == "Serial0/0"
+    assert report["summary"]["ipam_allocations"] == 7
+    assert report["summary"]["orphan_allocations"] == 2
+
+def test_clean_state_reports_nothing():
+    inventory = {"hosts": {"R1": {"data": {"ip": "10.0.0.1/24"}}}}
+    db = {"subnets": {"lan": "10.0.0.0/24"}, "allocations": {"10.0.0.1": "R1:eth0"}}
+    report = reconcile(inventory, db)
+    assert all(not v for k, v in report.items() if isinstance(v, list))
+
+def test_plan_fixes(report):
+    changes = plan_fixes(report, ["register", "release_orphans", "relabel"])
+    allocate = {c["ip"]: c["description"] for c in changes if c["op"] == "allocate"}
+    # 10.0.1.10 sits on two interfaces and is left for a human
+    assert allocate == {"10.0.0.129": "R1:Loopback0", "2001:db8::4": "PC4:eth0"}
+    assert sorted(c["ip"] for c in changes if c["op"] == "release") == ["10.0.0.200", "2001:DB8::5", "2001:db8::5"]
+    relabel = {c["ip"]: (c["old"], c["description"]) for c in changes if c["op"] == "relabel"}
+    assert relabel == {"10.0.0.10": ("New IP for PC3", "PC1:eth0"), "10.0.1.1": ("uplink", "R1:FastEthernet0/1")}
+
+def test_plan_fixes_subset_and_unknown(report):
+    assert plan_fixes(report, []) == []
+    assert {c["op"] for c in plan_fixes(report, ["relabel"])} == {"relabel"}
+    with pytest.raises(ValueError):
+        plan_fixes(report, ["register", "delete_everything"])
+
+def test_apply_changes_leaves_the_original_untouched(report):
+    original = copy.deepcopy(DB)
+    fixed = apply_changes(DB, plan_fixes(report, ["register", "release_orphans", "relabel"]))
+    assert DB == original
+    assert fixed["subnets"] == DB["subnets"]
+    assert "2001:db8::5" not in fixed["allocations"] and "2001:DB8::5" not in fixed["allocations"]
+    assert fixed["allocations"]["10.0.0.10"] == "PC1:eth0"
+    assert fixed["allocations"]["10.0.0.129"] == "R1:Loopback0"
+
+    again = reconcile(INVENTORY, fixed)
+    assert again["orphan_allocations"] == [] and again["conflicts"] == [] and again["unlabelled"] == []
+    assert [item["ip"] for item in again["unregistered"]] == ["10.0.1.10"]
@@ -0,0 +1,344 @@
+import glob
+import hashlib
+import heapq
+import json
+import logging
+import math
+import os
+import re
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Letter runs and digit runs are separate tokens, so "FastEthernet0/0" matches
+# a query for "fastethernet" and "10.0.12.1" is searchable as a phrase.
+TOKEN_RE = re.compile(r"[^\W\d_]+|\d+")
+HEADER_RE = re.compile(r"^(#{1,6})\s+(.*?)\s*#*\s*$")
+QUERY_RE = re.compile(r'"([^"]+)"|(\S+)')
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
+
+def split_sections(content: str) -> List[Dict[str, Any]]:
+    """
+    Splits a markdown document on headers. Each section keeps its header
+    trail ("Topology > Physical Wiring Table") and starting line number.
+    Lines inside ``` fences are never treated as headers.
+    """
+    sections = []
+    trail: List[Tuple[int, str]] = []
+    current = {"header": "", "line": 1, "lines": []}
+    in_fence = False
+
+    for lineno, line in enumerate(content.splitlines(), start=1):
+        if line.lstrip().startswith("```"):
+            in_fence = not in_fence
+        match = None if in_fence else HEADER_RE.match(line)
+        if match:
+            if current["lines"] or current["header"]:
+                sections.append(current)
+            level = len(match.group(1))
+            trail = [t for t in trail if t[0] < level] + [(level, match.group(2))]
+            current = {"header": " > ".join(t[1] for t in trail), "line": lineno, "lines": [line]}
+        else:
+            current["lines"].append(line)
+
+    if current["lines"]:
+        sections.append(current)
+    return [{"header": s["header"], "line": s["line"], "text": "\n".join(s["lines"])} for s in sections]
+
+class DocIndex:
+    """
+    Persistent positional inverted index over the markdown knowledge base,
+    ranked with BM25.
+
+    Documents are indexed per section, so results point at the part of a
+    runbook that matched. refresh() only re-indexes files whose mtime/size
+    changed and is throttled to once per `refresh_interval` seconds, so a
+    query normally touches only the posting lists of its own terms.
+
+    On disk the index is a directory with one shard per source file plus a
+    manifest, so re-indexing a file rewrites only that file's shard.
+    """
+
+    VERSION = 1
+
+    def __init__(self, docs_path: str, index_dir: Optional[str] = None,
+                 refresh_interval: float = 2.0, k1: float = 1.5, b: float = 0.75):
+        self.docs_path = docs_path
+        self.index_dir = index_dir
+        self.refresh_interval = refresh_interval
+        self.k1 = k1
+        self.b = b
+        self._lock = threading.RLock()
+        self._last_refresh = None
+        self.files: Dict[str, Dict[str, Any]] = {}            # relpath -> {"stamp", "sections"}
+        self.sections: Dict[int, Dict[str, Any]] = {}         # sid -> {"file", "header", "line", "text", "length", "terms"}
+        self.postings: Dict[str, Dict[int, List[int]]] = {}   # term -> sid -> positions
+        self.total_length = 0
+        self._next_id = 0
+        if index_dir:
+            self.load()
+
+    # --- Persistence ---
+
+    def _manifest_path(self) -> str:
+        return os.path.join(self.index_dir, "manifest.json")
+
+    def _shard_path(self, rel: str) -> str:
+        return os.path.join(self.index_dir, hashlib.sha1(rel.encode()).hexdigest()[:16] + ".json")
+
+    @staticmethod
+    def _write_json(path: str, data: Any) -> None:
+        tmp = f"{path}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(data, f)
+        os.replace(tmp, path)
+
+    def load(self) -> bool:
+        """Loads every shard listed in the manifest. Unreadable shards are re-indexed on refresh."""
+        try:
+            with open(self._manifest_path(), 'r') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if manifest.get("version") != self.VERSION:
+            return False
+
+        with self._lock:
+            for rel, stamp in manifest.get("files", {}).items():
+                try:
+                    with open(self._shard_path(rel), 'r') as f:
+                        shard = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                self._add_sections(rel, stamp, shard)
+        return True
+
+    def _save_file(self, rel: str, shard: List[Dict[str, Any]]) -> None:
+        if not self.index_dir:
+            return
+        try:
+            os.makedirs(self.index_dir, exist_ok=True)
+            self._write_json(self._shard_path(rel), shard)
+        except OSError as e:
+            logger.warning("Could not persist search index shard for %s: %s", rel, e)
+
+    def _drop_file(self, rel: str) -> None:
+        if not self.index_dir:
+            return
+        try:
+            os.remove(self._shard_path(rel))
+        except OSError:
+            pass
+
+    def _save_manifest(self) -> None:
+        if not self.index_dir:
+            return
+        manifest = {
+            "version": self.VERSION,
+            "files": {rel: entry["stamp"] for rel, entry in self.files.items()},
+        }
+        try:
+            os.makedirs(self.index_dir, exist_ok=True)
+            self._write_json(self._manifest_path(), manifest)
+        except OSError as e:
+            logger.warning("Could not persist search index manifest to %s: %s", self.index_dir, e)
+
+    # --- Incremental indexing ---
+
+    def refresh(self, force: bool = False) -> int:
+        """Re-indexes changed, new and deleted files. Returns the number of files touched."""
+        with self._lock:
+            now = time.monotonic()
+            if not force and self._last_refresh is not None and now - self._last_refresh < self.refresh_interval:
+                return 0
+            self._last_refresh = now
+
+            on_disk = {}
+            for path in glob.glob(os.path.join(self.docs_path, "**", "*.md"), recursive=True):
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                on_disk[os.path.relpath(path, self.docs_path)] = [st.st_mtime_ns, st.st_size]
+
+            removed = [rel for rel in self.files if rel not in on_disk]
+            changed = [rel for rel, stamp in on_disk.items() if self.files.get(rel, {}).get("stamp") != stamp]
+
+            for rel in removed:
+                self._remove_file(rel)
+                self._drop_file(rel)
+            for rel in changed:
+                self._remove_file(rel)
+                shard = self._index_file(rel)
+                if shard is not None:
+                    self._add_sections(rel, on_disk[rel], shard)
+                    self._save_file(rel, shard)
+
+            if removed or changed:
+                self._save_manifest()
+            return len(removed) + len(changed)
+
+    def _index_file(self, rel: str) -> Optional[List[Dict[str, Any]]]:
+        """Tokenizes one file into shard form: sections with their term positions."""
+        try:
+            with open(os.path.join(self.docs_path, rel), 'r', errors='ignore') as f:
+                content = f.read()
+        except OSError:
+            return None
+
+        shard = []
+        for section in split_sections(content):
+            tokens = tokenize(section["text"])
+            if not tokens:
+                continue
+            terms: Dict[str, List[int]] = {}
+            for pos, term in enumerate(tokens):
+                terms.setdefault(term, []).append(pos)
+            shard.append({**section, "length": len(tokens), "terms": terms})
+        return shard
+
+    def _add_sections(self, rel: str, stamp: List[int], shard: List[Dict[str, Any]]) -> None:
+        sids = []
+        for section in shard:
+            sid = self._next_id
+            self._next_id += 1
+            for term, positions in section["terms"].items():
+                self.postings.setdefault(term, {})[sid] = positions
+            self.sections[sid] = {
+                "file": rel,
+                "header": section["header"],
+                "line": section["line"],
+                "text": section["text"],
+                "length": section["length"],
+                "terms": list(section["terms"]),
+            }
+            self.total_length += section["length"]
+            sids.append(sid)
+        self.files[rel] = {"stamp": stamp, "sections": sids}
+
+    def _remove_file(self, rel: str) -> None:
+        entry = self.files.pop(rel, None)
+        if not entry:
+            return
+        for sid in entry["sections"]:
+            section = self.sections.pop(sid, None)
+            if not section:
+                continue
+            self.total_length -= section["length"]
+            for term in section["terms"]:
+                post = self.postings.get(term)
+                if post is not None:
+                    post.pop(sid, None)
+                    if not post:
+                        del self.postings[term]
+
+    # --- Querying ---
+
+    @staticmethod
+    def parse_query(query: str) -> List[Tuple[List[str], bool]]:
+        """
+        Splits a query into units of (tokens, required). A bare word is one
+        unit even if it tokenizes into several terms ("10.0.12.1"), and must
+        then appear as a phrase to score. Quoted phrases are required.
+        """
+        units = []
+        for phrase, word in QUERY_RE.findall(query):
+            tokens = tokenize(phrase or word)
+            if tokens:
+                units.append((tokens, bool(phrase)))
+        return units
+
+    def _phrase_matches(self, phrase: List[str]) -> set:
+        """Sections containing `phrase`, checked from its rarest term outwards."""
+        posts = [self.postings.get(t) for t in phrase]
+        if not all(posts):
+            return set()
+        anchor = min(range(len(phrase)), key=lambda i: len(posts[i]))
+        candidates = set(posts[anchor])
+        for post in sorted(posts, key=len):
+            candidates.intersection_update(post)
+            if not candidates:
+                return candidates
+
+        matches = set()
+        for sid in candidates:
+            position_sets = [set(post[sid]) for post in posts]
+            for p in posts[anchor][sid]:
+                start = p - anchor
+                if all(start + i in positions for i, positions in enumerate(position_sets)):
+                    matches.add(sid)
+                    break
+        return matches
+
+    def search(self, query: str, top_k: int = 5) -> List[Dict[str, Any]]:
+        """
+        Ranks sections by BM25. Units are OR-ed, except quoted phrases which
+        every returned section must contain.
+        """
+        self.refresh()
+        units = self.parse_query(query)
+        if not units:
+            return []
+
+        with self._lock:
+            n = len(self.sections)
+            if n == 0:
+                return []
+            avg_len = self.total_length / n
+
+            # Quoted phrases restrict the candidate set before any scoring happens
+            allowed = None
+            for tokens, required in units:
+                if required:
+                    matches = self._phrase_matches(tokens) if len(tokens) > 1 else set(self.postings.get(tokens[0], ()))
+                    allowed = matches if allowed is None else allowed & matches
+                    if not allowed:
+                        return []
+
+            scores: Dict[int, float] = {}
+            for tokens, _ in units:
+                # Multi-term units only score where the whole phrase occurs
+                within = self._phrase_matches(tokens) if len(tokens) > 1 else None
+                if allowed is not None:
+                    within = allowed if within is None else within & allowed
+                for term in set(tokens):
+                    post = self.postings.get(term)
+                    if not post:
+                        continue
+                    idf = math.log(1 + (n - len(post) + 0.5) / (len(post) + 0.5))
+                    if within is not None:
+                        items = ((sid, post[sid]) for sid in within if sid in post)
+                    else:
+                        items = post.items()
+                    for sid, positions in items:
+                        tf = len(positions)
+                        length = self.sections[sid]["length"]
+                        norm = tf + self.k1 * (1 - self.b + self.b * length / avg_len)
+                        scores[sid] = scores.get(sid, 0.0) + idf * tf * (self.k1 + 1) / norm
+
+            best = heapq.nlargest(top_k, scores.items(), key=lambda item: item[1])
+            return [self._result(sid, score, units) for sid, score in best]
+
+    def _result(self, sid: int, score: float, units: List[Tuple[List[str], bool]]) -> Dict[str, Any]:
+        section = self.sections[sid]
+        text = section["text"]
+        # Center the snippet on the first unit found in the section, quoted phrases first
+        idx = 0
+        for tokens, _ in sorted(units, key=lambda u: not u[1]):
+            match = re.search(r"\W*".join(map(re.escape, tokens)), text, re.IGNORECASE)
+            if match:
+                idx = match.start()
+                break
+        start = max(0, idx - 50)
+        end = min(len(text), idx + 200)
+        return {
+            "file": section["file"],
+            "header": section["header"],
+            "line": section["line"],
+            "score": round(score, 3),
+            "snippet": text[start:end].replace("\n", " "),
+        }
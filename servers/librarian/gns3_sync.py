@@ -0,0 +1,295 @@
+import hashlib
+import ipaddress
+import json
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+import yaml
+
+# Reads a GNS3 project (.gns3 file, or a JSON stand-in for the REST API with
+# top-level "nodes" and "links" as returned by /v2/projects/{id}/nodes and
+# /links) and works out what the Source of Truth is missing.
+
+ROUTER_TYPES = {"dynamips", "iou"}
+HOST_TYPES = {"docker", "vpcs", "qemu", "virtualbox", "vmware"}
+# Layer-2 boxes are not inventory devices: the devices behind one of them share a segment
+L2_TYPES = {"ethernet_switch", "ethernet_hub"}
+
+# Hostnames GNS3 reports when the console listens on every address
+ANY_HOST = {"", "0.0.0.0", "::", "0:0:0:0:0:0:0:0", "localhost", "127.0.0.1"}
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _port_name(node: Dict[str, Any], adapter: int, port: int) -> str:
+    """Interface name for a node's adapter/port, as the device itself names it."""
+    for entry in node.get("ports") or []:
+        # REST API nodes list their ports with the real names
+        if entry.get("adapter_number") == adapter and entry.get("port_number") == port:
+            return entry["name"]
+    node_type = node.get("node_type")
+    if node_type == "dynamips":
+        # Adapter = slot; the slot's module tells the interface type (PA-GE, PA-4E, NM-1FE-TX...)
+        slot = str((node.get("properties") or {}).get(f"slot{adapter}") or "")
+        if "GE" in slot:
+            kind = "GigabitEthernet"
+        elif slot.endswith("E") and "FE" not in slot:
+            kind = "Ethernet"
+        else:
+            kind = "FastEthernet"
+        return f"{kind}{adapter}/{port}"
+    if node_type == "iou":
+        return f"Ethernet{adapter}/{port}"
+    if node_type in HOST_TYPES:
+        return f"eth{adapter}"
+    return f"Ethernet{port}" if node_type in L2_TYPES else f"{adapter}/{port}"
+
+def parse_project(data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Nodes and links of a GNS3 project:
+    {"nodes": {name: {"node_type", "group", "hostname", "port", "console_type"}},
+     "links": [[{"device", "interface"}, ...]]}
+    Links through switches and hubs are merged into one multi-endpoint segment.
+    """
+    topology = data.get("topology", data)
+    by_id = {n["node_id"]: n for n in topology.get("nodes", [])}
+
+    nodes = {}
+    for node in by_id.values():
+        node_type = node.get("node_type")
+        if node_type in L2_TYPES:
+            continue
+        host = node.get("console_host") or ""
+        nodes[node["name"]] = {
+            "node_type": node_type,
+            "group": "cisco" if node_type in ROUTER_TYPES else "linux" if node_type in HOST_TYPES else None,
+            "hostname": "localhost" if host in ANY_HOST else host,
+            "port": node.get("console"),
+            "console_type": node.get("console_type"),
+        }
+
+    # Union-find over L2 nodes joined to each other, so a chain of switches is one segment
+    parent = {nid: nid for nid, n in by_id.items() if n.get("node_type") in L2_TYPES}
+
+    def find(nid):
+        while parent[nid] != nid:
+            parent[nid] = parent[parent[nid]]
+            nid = parent[nid]
+        return nid
+
+    direct, attached = [], []
+    for link in topology.get("links", []):
+        ends = [e for e in link.get("nodes", []) if e.get("node_id") in by_id]
+        if len(ends) != 2:
+            continue
+        l2 = [e for e in ends if e["node_id"] in parent]
+        if len(l2) == 2:
+            parent[find(l2[0]["node_id"])] = find(l2[1]["node_id"])
+        elif l2:
+            attached.append((l2[0]["node_id"], next(e for e in ends if e["node_id"] not in parent)))
+        else:
+            direct.append(ends)
+
+    def endpoint(end):
+        node = by_id[end["node_id"]]
+        return {"device": node["name"],
+                "interface": _port_name(node, end.get("adapter_number", 0), end.get("port_number", 0))}
+
+    links = [[endpoint(e) for e in ends] for ends in direct]
+    segments: Dict[str, List[Dict[str, str]]] = {}
+    for l2_id, end in attached:
+        segments.setdefault(find(l2_id), []).append(endpoint(end))
+    links += [ends for ends in segments.values() if len(ends) > 1]
+    return {"nodes": nodes, "links": links}
+
+def load_project(path: str) -> Dict[str, Any]:
+    with open(path, 'r') as f:
+        return parse_project(json.load(f))
+
+def _link_key(endpoints: List[Dict[str, str]]) -> frozenset:
+    return frozenset((e.get("device", "").lower(), e.get("interface", "")) for e in endpoints)
+
+def _interface_subnet(inventory: Dict[str, Any], endpoints: List[Dict[str, str]]) -> Optional[str]:
+    hosts = {name.lower(): h for name, h in inventory.get("hosts", {}).items()}
+    for end in endpoints:
+        data = (hosts.get(end["device"].lower()) or {}).get("data") or {}
+        ips = [i.get("ip") for i in data.get("interfaces") or [] if i.get("name") == end["interface"]]
+        if not ips and data.get("ip") and "/" in str(data["ip"]) and \
+                end["interface"] == (data.get("interface") or "eth0"):
+            ips = [data["ip"]]
+        for ip in ips:
+            try:
+                return str(ipaddress.ip_interface(str(ip)).network)
+            except ValueError:
+                continue
+    return None
+
+def plan_inventory(project: Dict[str, Any], inventory: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Entries to add or change so the inventory matches the project, as a
+    deep-merge update, plus the inventory devices the project no longer has.
+    Only console coordinates and missing interface names are managed; IPs,
+    roles and descriptions stay as they are. Routers get a data.interfaces
+    list; Linux hosts get data.interface (their first cabled port), the same
+    shape as hand-written hosts, ready for a later data.ip.
+    """
+    hosts = inventory.get("hosts", {})
+    existing = {name.lower(): name for name in hosts}
+    interfaces: Dict[str, List[str]] = {}
+    peers: Dict[Tuple[str, str], str] = {}
+    for ends in project["links"]:
+        for end in ends:
+            interfaces.setdefault(end["device"], [])
+            if end["interface"] not in interfaces[end["device"]]:
+                interfaces[end["device"]].append(end["interface"])
+            others = [f"{o['device']} ({o['interface']})" for o in ends if o is not end]
+            peers[(end["device"], end["interface"])] = ", ".join(others)
+
+    updates: Dict[str, Any] = {}
+    added, changed = [], {}
+    for name, node in project["nodes"].items():
+        if node["group"] is None:
+            continue
+        wanted = [{"name": i, "description": f"Link to {peers[(name, i)]}"} for i in interfaces.get(name, [])]
+        current_name = existing.get(name.lower())
+        if current_name is None:
+            if node["group"] == "linux":
+                data = {"interface": wanted[0]["name"]} if wanted else {}
+            else:
+                data = {"interfaces": wanted}
+            entry = {"hostname": node["hostname"], "port": node["port"], "groups": [node["group"]], "data": data}
+            updates[name] = entry
+            added.append(name)
+            continue
+        current = hosts[current_name]
+        entry, fields = {}, []
+        if node["port"] is not None and current.get("port") != node["port"]:
+            entry["port"] = node["port"]
+            fields.append("port")
+        current_host = current.get("hostname") or "localhost"
+        if node["hostname"] != "localhost" and current_host != node["hostname"]:
+            entry["hostname"] = node["hostname"]
+            fields.append("hostname")
+        data = current.get("data") or {}
+        if node["group"] == "linux":
+            # One primary interface, as on hand-written hosts; an existing one is kept
+            if wanted and not data.get("interface") and not data.get("interfaces"):
+                entry["data"] = {"interface": wanted[0]["name"]}
+                fields.append("interface")
+        else:
+            known = {i.get("name") for i in data.get("interfaces") or []}
+            missing = [i for i in wanted if i["name"] not in known]
+            if missing:
+                entry["data"] = {"interfaces": list(data.get("interfaces") or []) + missing}
+                fields.append("interfaces")
+        if entry:
+            updates[current_name] = entry
+            changed[current_name] = fields
+
+    in_project = {name.lower() for name, n in project["nodes"].items() if n["group"] is not None}
+    removed = [name for name, h in hosts.items()
+               if name.lower() not in in_project and {"cisco", "linux"} & set(h.get("groups") or [])]
+    return {"updates": {"hosts": updates} if updates else {}, "added": added, "changed": changed,
+            "removed": removed}
+
+def plan_links(project: Dict[str, Any], physical: Dict[str, Any], inventory: Dict[str, Any],
+               prune: bool = False) -> Dict[str, Any]:
+    """
+    New 'links' list for topology_physical.yaml: links still cabled keep their
+    entry (subnet, description), new ones get their subnet from the inventory.
+    Links the project no longer has are dropped only with `prune`.
+    """
+    current = physical.get("links") or []
+    current_keys = {_link_key(link.get("endpoints") or []) for link in current}
+    new_keys = {_link_key(ends): ends for ends in project["links"]}
+
+    kept = [link for link in current if _link_key(link.get("endpoints") or []) in new_keys]
+    stale = len(current) - len(kept)
+    links = kept if prune else list(current)
+    added = 0
+    for key, ends in new_keys.items():
+        if key in current_keys:
+            continue
+        entry: Dict[str, Any] = {"endpoints": ends}
+        subnet = _interface_subnet(inventory, ends)
+        if subnet:
+            entry["subnet"] = subnet
+        entry["description"] = "Synced from GNS3 project"
+        links.append(entry)
+        added += 1
+    return {"links": links, "added": added, "stale": stale, "removed": stale if prune else 0}
+
+TOP_LEVEL_KEY_RE = re.compile(r"^[A-Za-z_][\w-]*:")
+
+class _IndentedDumper(yaml.SafeDumper):
+    # Nested lists indented under their key, as in the hand-written file
+    def increase_indent(self, flow=False, indentless=False):
+        return super().increase_indent(flow, False)
+
+def insert_links_text(text: str, new_links: List[Dict[str, Any]]) -> Optional[str]:
+    """
+    topology_physical.yaml text with `new_links` added at the end of its
+    'links:' block, leaving every comment and other entry untouched. None if
+    the file has no block 'links:' list to extend.
+    """
+    lines = text.splitlines(keepends=True)
+    start = next((i for i, line in enumerate(lines) if line.rstrip() == "links:"), None)
+    if start is None:
+        return None
+    end = next((i for i in range(start + 1, len(lines)) if TOP_LEVEL_KEY_RE.match(lines[i])), len(lines))
+    # Comments and blank lines right above the next key belong to it
+    while end > start + 1 and (not lines[end - 1].strip() or lines[end - 1].startswith("#")):
+        end -= 1
+    dumped = yaml.dump(new_links, Dumper=_IndentedDumper, sort_keys=False, default_flow_style=False)
+    block = "".join(f"  {line}\n" if line else "\n" for line in dumped.splitlines())
+    if end > 0 and not lines[end - 1].endswith("\n"):
+        lines[end - 1] += "\n"
+    return "".join(lines[:end]) + block + "".join(lines[end:])
+
+def header_comments(text: str) -> str:
+    """The leading '---' and comment lines of a YAML file."""
+    header = []
+    for line in text.splitlines(keepends=True):
+        if line.startswith("#") or line.strip() in ("", "---"):
+            header.append(line)
+        else:
+            break
+    return "".join(header)
+
+class ProjectSync:
+    """
+    Remembers what was last applied from each project file. Unchanged files
+    (same size and mtime, else same content hash) are skipped as long as the
+    inventory and topology files were not edited since.
+    """
+
+    def __init__(self):
+        self._stats: Dict[str, Tuple[Tuple[int, int], str]] = {}
+        self._applied: Dict[str, Tuple[str, Any]] = {}
+
+    @staticmethod
+    def _stat(path: str) -> Tuple[int, int]:
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+
+    def digest(self, path: str) -> str:
+        stat = self._stat(path)
+        cached = self._stats.get(path)
+        if cached and cached[0] == stat:
+            return cached[1]
+        value = file_digest(path)
+        self._stats[path] = (stat, value)
+        return value
+
+    def is_current(self, path: str, digest: str, sot_state: Any) -> bool:
+        return self._applied.get(path) == (digest, sot_state)
+
+    def record(self, path: str, digest: str, sot_state: Any) -> None:
+        self._applied[path] = (digest, sot_state)
+
+project_sync = ProjectSync()
@@ -1,51 +1,66 @@
 from mcp.server.fastmcp import FastMCP, Context
 from typing import Dict, Any, List
+from collections import OrderedDict
+import hashlib
 import yaml
+import sys
 import os
+sys.path.append(os.path.join(os.path.dirname(__file__), "../../"))
+from shared.inventory_cache import inventory_cache, INVENTORY_PATH
+from shared.topology_graph import get_topology_graph, TOPOLOGY_PATH
+from shared.metrics import instrument_server, metrics
+from shared.responses import register_transcript_tool, transcripts, with_transcript
 
-mcp = FastMCP("Librarian Server")
+try:
+    from .doc_index import DocIndex
+    from .sot_query import QueryError, evaluate, paginate
+    from .gns3_sync import header_comments, insert_links_text, load_project, plan_inventory, plan_links, project_sync
+except ImportError:
+    # Running directly as a script
+    sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+    from doc_index import DocIndex
+    from sot_query import QueryError, evaluate, paginate
+    from gns3_sync import header_comments, insert_links_text, load_project, plan_inventory, plan_links, project_sync
 
-# Inventory Source
-INVENTORY_PATH = os.path.join(os.path.dirname(__file__), "../../shared/inventory.yaml")
+mcp = FastMCP("Librarian Server")
 
-def load_inventory() -> Dict:
+def load_inventory(copy_data: bool = False) -> Dict:
+    # Served from the process-wide cache; pass copy_data=True before mutating
     try:
-        with open(INVENTORY_PATH, 'r') as f:
-            return yaml.safe_load(f)
+        return inventory_cache.get(copy_data=copy_data)
     except Exception:
         return {"error": "Inventory not found"}
 
-import glob
-
 # Knowledge Base (RAG)
 DOCS_PATH = os.path.join(os.path.dirname(__file__), "../../shared/docs")
+# Persistent search index, updated incrementally as docs change
+DOCS_INDEX_DIR = os.environ.get("LIBRARIAN_INDEX_DIR", os.path.join(DOCS_PATH, ".search_index"))
+
+doc_index = DocIndex(DOCS_PATH, index_dir=DOCS_INDEX_DIR)
 
 @mcp.tool()
-def search_docs(query: str) -> List[str]:
-    """Search the knowledge base files for documentation."""
-    results = []
-    query = query.lower()
-    
+def search_docs(query: str, top_k: int = 5) -> List[str]:
+    """
+    Search the knowledge base files for documentation.
+
+    Args:
+        query: Search terms. Wrap exact phrases in double quotes,
+               e.g. '"physical wiring" FastEthernet'.
+        top_k: Maximum number of ranked snippets to return (default 5).
+
+    Returns:
+        list[str]: Best matching sections as '[file > section] (line N): ...snippet...'.
+    """
     if not os.path.exists(DOCS_PATH):
         return ["Documentation directory not found."]
 
-    md_files = glob.glob(os.path.join(DOCS_PATH, "*.md"))
-    
-    for file_path in md_files:
-        try:
-            with open(file_path, 'r') as f:
-                content = f.read()
-                if query in content.lower():
-                    filename = os.path.basename(file_path)
-                    # Extract a snippet context
-                    idx = content.lower().find(query)
-                    start = max(0, idx - 50)
-                    end = min(len(content), idx + 200)
-                    snippet = content[start:end].replace("\n", " ")
-                    results.append(f"[{filename}]: ...{snippet}...")
-        except Exception:
-            continue
-    
+    results = []
+    with metrics.span("docs.search"):
+        hits = doc_index.search(query, top_k=top_k)
+    for hit in hits:
+        location = f"{hit['file']} > {hit['header']}" if hit["header"] else hit["file"]
+        results.append(f"[{location}] (line {hit['line']}): ...{hit['snippet']}...")
+
     if not results:
         return ["No documents found matching query."]
     return results
@@ -74,19 +89,90 @@ def list_devices() -> List[str]:
 @mcp.resource("librarian://topology/definition")
 def get_topology() -> str:
     """Returns the defining network topology (Source of Truth)."""
-    inv = load_inventory()
-    return yaml.dump(inv)
+    global _topology_dump
+    try:
+        inv, revision = inventory_cache.snapshot()
+    except Exception:
+        return yaml.dump({"error": "Inventory not found"})
+    # Re-serialise only when inventory.yaml actually changed
+    if _topology_dump[0] != revision:
+        _topology_dump = (revision, yaml.dump(inv))
+    return _topology_dump[1]
+
+_topology_dump = (None, "")
 
 @mcp.resource("librarian://topology/physical")
 def get_physical_topology() -> str:
     """Returns the PHYSICAL cabling and connection map (Ground Truth)."""
-    topo_path = os.path.join(os.path.dirname(__file__), "../../shared/topology_physical.yaml")
     try:
-        with open(topo_path, 'r') as f:
+        with open(TOPOLOGY_PATH, 'r') as f:
             return f.read()
     except Exception:
         return "Physical topology file not found."
 
+# --- Topology Graph Queries ---
+# Answered from an in-memory graph of topology_physical.yaml + inventory
+# interfaces, so the agent gets only the slice it asked about.
+
+@mcp.tool()
+def get_neighbors(device: str) -> Dict[str, Any]:
+    """
+    Lists the devices directly connected to a device, with interfaces and link ids.
+
+    Args:
+        device: Device name (case-insensitive, e.g. 'R1' or 'pc3').
+    """
+    try:
+        graph = get_topology_graph()
+        return {"device": device, "neighbors": graph.neighbors(device)}
+    except KeyError as e:
+        return {"error": e.args[0]}
+
+@mcp.tool()
+def find_path(source: str, target: str) -> Dict[str, Any]:
+    """
+    Returns the shortest hop-by-hop physical path between two devices.
+
+    Args:
+        source: Device to start from.
+        target: Device to reach.
+    """
+    try:
+        hops = get_topology_graph().path(source, target)
+    except KeyError as e:
+        return {"error": e.args[0]}
+    if hops is None:
+        return {"source": source, "target": target, "reachable": False, "hops": []}
+    return {"source": source, "target": target, "reachable": True, "hop_count": len(hops), "hops": hops}
+
+@mcp.tool()
+def get_blast_radius(link: str) -> Dict[str, Any]:
+    """
+    Shows which devices lose reachability if a link fails.
+
+    Args:
+        link: A link id (e.g. 'L1'), its subnet (e.g. '20.0.0.0/24'),
+              or one of its endpoints as 'device:interface' (e.g. 'R1:FastEthernet2/0').
+    """
+    try:
+        return get_topology_graph().blast_radius(link)
+    except KeyError as e:
+        return {"error": e.args[0]}
+
+@mcp.tool()
+def get_links_for_subnet(subnet: str) -> Dict[str, Any]:
+    """
+    Lists the links whose subnet equals, contains, or falls inside the given prefix.
+
+    Args:
+        subnet: Prefix in CIDR notation (e.g. '10.0.0.0/8').
+    """
+    try:
+        links = get_topology_graph().links_for_subnet(subnet)
+    except ValueError:
+        return {"error": f"Invalid subnet {subnet}"}
+    return {"subnet": subnet, "links": links}
+
 # --- Source of Truth Management ---
 
 def deep_merge(base: Dict[str, Any], updates: Dict[str, Any]) -> Dict[str, Any]:
@@ -101,20 +187,132 @@ def deep_merge(base: Dict[str, Any], updates: Dict[str, Any]) -> Dict[str, Any]:
             base[key] = value
     return base
 
+# Device names listed in the get_source_of_truth summary
+SOT_SUMMARY_HOSTS = 200
+# (revision, transcript id) of the raw inventory last handed out
+_sot_transcript = (None, None)
+
 @mcp.tool()
-def get_source_of_truth() -> str:
+def get_source_of_truth() -> Dict[str, Any]:
     """
-    Returns the raw YAML content of the Source of Truth (inventory.yaml).
-    Use this to read the current network state.
+    Summarizes the Source of Truth (inventory.yaml): revision, device count
+    per group and device names. Use query_source_of_truth to read the part
+    you need; the raw YAML is available with get_transcript(transcript_id).
 
     Returns:
-        str: The raw YAML content of the inventory file.
+        dict: revision, size_bytes, devices, groups ({group: device count}),
+              hosts (names, the first SOT_SUMMARY_HOSTS), transcript_id.
     """
+    global _sot_transcript
     try:
-        with open(INVENTORY_PATH, 'r') as f:
-            return f.read()
+        doc, revision = inventory_cache.snapshot()
+        hosts = doc.get("hosts") or {}
+        groups: Dict[str, int] = {}
+        for data in hosts.values():
+            for group in (data or {}).get("groups") or []:
+                groups[group] = groups.get(group, 0) + 1
+        summary = {"revision": revision, "devices": len(hosts), "groups": groups,
+                   "hosts": list(hosts)[:SOT_SUMMARY_HOSTS]}
+        if len(hosts) > SOT_SUMMARY_HOSTS:
+            summary["hosts_truncated"] = True
+
+        ref = _sot_transcript[1] if _sot_transcript[0] == revision else None
+        entry = transcripts.get(ref) if ref else None
+        if entry is None:
+            # Only re-read the file when the revision changed or the store dropped it
+            with open(INVENTORY_PATH, 'r') as f:
+                with_transcript(summary, f.read(), "get_source_of_truth", scan_errors=False)
+            _sot_transcript = (revision, summary["transcript_id"])
+            entry = transcripts.get(summary["transcript_id"])
+        else:
+            summary.update(transcript_id=ref, transcript_lines=len(entry["lines"]))
+        summary["size_bytes"] = entry["bytes"]
+        return summary
     except Exception as e:
-        return f"Error reading Source of Truth: {str(e)}"
+        return {"error": f"Error reading Source of Truth: {str(e)}"}
+
+# Evaluated queries, keyed by (revision, query); entries for old revisions age out
+_query_cache: "OrderedDict[tuple, list]" = OrderedDict()
+QUERY_CACHE_SIZE = 128
+
+@mcp.tool()
+def query_source_of_truth(query: str = "", page: int = 1, page_size: int = 50, if_revision: str = "") -> Dict[str, Any]:
+    """
+    Returns only the part of the Source of Truth (inventory.yaml) selected by a
+    path expression, one page at a time. Prefer this over get_source_of_truth.
+
+    Args:
+        query: Dotted path with optional [selectors]. Empty selects the whole document.
+               - 'hosts.R1.data.interfaces'          one device's interfaces
+               - 'hosts[groups=cisco].data.interfaces' interfaces of every Cisco device
+               - 'hosts[data.role~distribution].port' console ports of distribution routers
+               - 'hosts.*.data.interfaces[0].ip'     first interface IP of every device
+               Selectors: [N] index, [*] all, [field=value], [field!=value], [field~substring].
+        page: 1-based page number.
+        page_size: Matches per page (default 50).
+        if_revision: The 'etag' returned by a previous call. If the inventory has
+                     not changed since and query, page and page_size are the same,
+                     only {'not_modified': True} is returned.
+
+    Returns:
+        dict: revision, etag, total, page, pages and items as [{'path', 'value'}].
+    """
+    try:
+        doc, revision = inventory_cache.snapshot()
+    except Exception as e:
+        return {"error": f"Error reading Source of Truth: {e}"}
+
+    # The inventory revision alone would answer "not modified" to a request for another page or query
+    etag = hashlib.sha1(f"{revision}\0{query.strip()}\0{page}\0{page_size}".encode()).hexdigest()[:12]
+    if if_revision and if_revision == etag:
+        return {"revision": revision, "etag": etag, "not_modified": True}
+    if page < 1 or page_size < 1:
+        return {"error": "page and page_size must be >= 1"}
+
+    key = (revision, query.strip())
+    matches = _query_cache.get(key)
+    if matches is None:
+        try:
+            matches = evaluate(doc, query)
+        except QueryError as e:
+            return {"error": str(e)}
+        _query_cache[key] = matches
+        if len(_query_cache) > QUERY_CACHE_SIZE:
+            _query_cache.popitem(last=False)
+    else:
+        _query_cache.move_to_end(key)
+
+    items, total = paginate(matches, page, page_size)
+    return {
+        "revision": revision,
+        "etag": etag,
+        "query": query,
+        "total": total,
+        "page": page,
+        "pages": (total + page_size - 1) // page_size,
+        "items": [{"path": path, "value": value} for path, value in items],
+    }
+
+def apply_source_of_truth_updates(update_dict: Dict[str, Any], remove_hosts: List[str] = ()) -> None:
+    """
+    Deep-merges updates into inventory.yaml (and drops `remove_hosts`) in one
+    write. Raises ValueError if the inventory cannot be loaded.
+    """
+    current_inv = load_inventory(copy_data=True)
+    if "error" in current_inv:
+        raise ValueError(f"Error loading current inventory: {current_inv['error']}")
+
+    merged_inv = deep_merge(current_inv, update_dict)
+    for name in remove_hosts:
+        merged_inv.get("hosts", {}).pop(name, None)
+
+    # Write-then-rename, like topology_physical.yaml, so readers never see a half-written file
+    tmp = f"{INVENTORY_PATH}.tmp"
+    with open(tmp, 'w') as f:
+        with metrics.span("inventory.dump"):
+            yaml.dump(merged_inv, f, sort_keys=False)
+    os.replace(tmp, INVENTORY_PATH)
+    inventory_cache.invalidate()
 
 @mcp.tool()
 def update_source_of_truth(updates: str) -> str:
@@ -149,18 +347,8 @@ def update_source_of_truth(updates: str) -> str:
         if not update_dict or not isinstance(update_dict, dict):
             return "Error: Updates must be a valid YAML dictionary."
 
-        # 2. Load current state
-        current_inv = load_inventory()
-        if "error" in current_inv:
-             return f"Error loading current inventory: {current_inv['error']}"
-
-        # 3. Deep Merge
-        merged_inv = deep_merge(current_inv, update_dict)
-
-        # 4. Save Back
-        # We manually dump to preserve block style if possible, but standard yaml.dump is used for now.
-        with open(INVENTORY_PATH, 'w') as f:
-            yaml.dump(merged_inv, f, sort_keys=False)
+        # 2-4. Load, deep merge, save back
+        apply_source_of_truth_updates(update_dict)
             
         return "Successfully updated Source of Truth (inventory.yaml)."
 
@@ -169,5 +357,141 @@ def update_source_of_truth(updates: str) -> str:
     except Exception as e:
         return f"Error updating Source of Truth: {e}"
 
+# --- GNS3 Project Sync ---
+
+# Default project for sync_from_gns3: a .gns3 file, or JSON saved from the
+# GNS3 REST API ({"nodes": [...], "links": [...]})
+GNS3_PROJECT_PATH = os.environ.get("GNS3_PROJECT_PATH", "")
+
+def _sot_state():
+    # A sync is skipped only if neither inventory.yaml nor the topology file was edited since
+    _, revision = inventory_cache.snapshot()
+    try:
+        st = os.stat(TOPOLOGY_PATH)
+        return (revision, st.st_mtime_ns, st.st_size)
+    except OSError:
+        return (revision, None, None)
+
+def _load_physical() -> Dict[str, Any]:
+    try:
+        with open(TOPOLOGY_PATH, 'r') as f:
+            docs = [d for d in yaml.safe_load_all(f) if d]
+            return docs[0] if docs else {}
+    except FileNotFoundError:
+        return {}
+
+def _write_links(physical: Dict[str, Any], link_plan: Dict[str, Any]) -> None:
+    try:
+        with open(TOPOLOGY_PATH, 'r') as f:
+            text = f.read()
+    except FileNotFoundError:
+        text = "---\n"
+    physical["links"] = link_plan["links"]
+    updated = None
+    if not link_plan["removed"]:
+        # Additions only: splice the new entries in so hand-written comments survive
+        updated = insert_links_text(text, link_plan["links"][-link_plan["added"]:])
+        if updated is not None and _first_document(updated).get("links") != physical["links"]:
+            updated = None
+    if updated is None:
+        updated = header_comments(text) or "---\n"
+        updated += yaml.dump(physical, sort_keys=False)
+    tmp = f"{TOPOLOGY_PATH}.tmp"
+    with open(tmp, 'w') as f:
+        f.write(updated)
+    os.replace(tmp, TOPOLOGY_PATH)
+
+def _first_document(text: str) -> Dict[str, Any]:
+    try:
+        docs = [d for d in yaml.safe_load_all(text) if d]
+    except yaml.YAMLError:
+        return {}
+    return docs[0] if docs and isinstance(docs[0], dict) else {}
+
+@mcp.tool()
+def sync_from_gns3(project_path: str = "", dry_run: bool = False, prune: bool = False,
+                   force: bool = False) -> Dict[str, Any]:
+    """
+    Brings inventory.yaml and topology_physical.yaml in line with a GNS3 project,
+    instead of editing them by hand after a topology change.
+
+    Nodes, console ports and links are read from the project; only entries that
+    differ are written, through the same deep-merge path as update_source_of_truth.
+    Interface IPs, roles and descriptions already in the inventory are kept.
+    Calling it again with an unchanged project file costs one stat() call.
+
+    topology_physical.yaml is replaced atomically. New links are inserted at the
+    end of its 'links:' list and the rest of the file, comments included, is left
+    as is; when links are pruned the file is regenerated and only its header
+    comments are kept.
+
+    Args:
+        project_path: Path to the .gns3 file or REST API export (default: GNS3_PROJECT_PATH).
+        dry_run: Report what would change without writing anything.
+        prune: Also remove inventory devices and physical links the project no longer has.
+        force: Re-read the project even if its hash did not change.
+
+    Returns:
+        Dict: {"status": applied|in_sync|unchanged|dry_run, "added": [...], "changed": {device: [fields]},
+               "removed": [...], "links_added", "links_removed", "links_stale", ...}
+    """
+    path = project_path or GNS3_PROJECT_PATH
+    if not path:
+        return {"error": "No project given (project_path or GNS3_PROJECT_PATH)."}
+    try:
+        digest = project_sync.digest(path)
+        if not force and not dry_run and project_sync.is_current(path, digest, _sot_state()):
+            return {"status": "unchanged", "project": path, "hash": digest[:12]}
+
+        with metrics.span("gns3.parse"):
+            project = load_project(path)
+        inventory = load_inventory()
+        if "error" in inventory:
+            return {"error": f"Error loading current inventory: {inventory['error']}"}
+        inv_plan = plan_inventory(project, inventory)
+        physical = _load_physical()
+        link_plan = plan_links(project, physical, inventory, prune=prune)
+
+        result = {
+            "status": "dry_run" if dry_run else "applied",
+            "project": path,
+            "hash": digest[:12],
+            "nodes": len(project["nodes"]),
+            "links": len(project["links"]),
+            "added": inv_plan["added"],
+            "changed": inv_plan["changed"],
+            "removed": inv_plan["removed"],
+            "pruned": prune,
+            "links_added": link_plan["added"],
+            "links_removed": link_plan["removed"],
+            "links_stale": link_plan["stale"],
+        }
+        if dry_run:
+            return result
+
+        remove = inv_plan["removed"] if prune else []
+        if inv_plan["updates"] or remove:
+            try:
+                apply_source_of_truth_updates(inv_plan["updates"], remove_hosts=remove)
+            except ValueError as e:
+                # Not the project's fault: the current inventory could not be loaded
+                return {"error": str(e)}
+        if link_plan["added"] or link_plan["removed"]:
+            _write_links(physical, link_plan)
+        if not (inv_plan["updates"] or remove or link_plan["added"] or link_plan["removed"]):
+            result["status"] = "in_sync"
+        project_sync.record(path, digest, _sot_state())
+        return result
+
+    except FileNotFoundError:
+        return {"error": f"Project file not found: {path}"}
+    except ValueError as e:
+        return {"error": f"Invalid project file: {e}"}
+    except Exception as e:
+        return {"error": f"Error syncing from GNS3: {e}"}
+
+register_transcript_tool(mcp)
+instrument_server(mcp, "librarian")
+
 if __name__ == "__main__":
     mcp.run()
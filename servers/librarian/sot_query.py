@@ -0,0 +1,138 @@
+import re
+from functools import lru_cache
+from typing import Any, List, Tuple
+
+# Path expressions over the Source of Truth, e.g.
+#   hosts.R1.data.interfaces
+#   hosts[groups=cisco].data.interfaces
+#   hosts[data.role~distribution].port
+#   hosts.*.data.interfaces[0].ip
+#
+# Segments are separated by '.', each optionally followed by [...] selectors:
+#   [N]            list index
+#   [*]            every child
+#   [field=value]  children whose field equals value (for lists: contains value)
+#   [field!=value] children whose field differs (for lists: does not contain value)
+#   [field~value]  children whose field contains the substring value
+# A name applied to a list is applied to every item of the list.
+
+SELECTOR_RE = re.compile(r"\[([^\]]*)\]")
+FILTER_RE = re.compile(r"^\s*([\w.\-]+)\s*(!=|=|~)\s*(.*?)\s*$")
+
+class QueryError(ValueError):
+    pass
+
+def _split_segments(expr: str) -> List[str]:
+    segments, depth, current = [], 0, ""
+    for ch in expr:
+        if ch == "[":
+            depth += 1
+        elif ch == "]":
+            depth -= 1
+        if ch == "." and depth == 0:
+            segments.append(current)
+            current = ""
+        else:
+            current += ch
+    if depth != 0:
+        raise QueryError(f"Unbalanced brackets in '{expr}'")
+    segments.append(current)
+    return [s for s in segments if s.strip()]
+
+def _parse_segment(segment: str) -> Tuple[str, List[Tuple[str, Any]]]:
+    name_end = segment.find("[")
+    name = (segment if name_end < 0 else segment[:name_end]).strip()
+    selectors = []
+    rest = "" if name_end < 0 else segment[name_end:]
+    for match in SELECTOR_RE.finditer(rest):
+        body = match.group(1).strip()
+        if body == "*":
+            selectors.append(("all", None))
+        elif re.fullmatch(r"-?\d+", body):
+            selectors.append(("index", int(body)))
+        else:
+            f = FILTER_RE.match(body)
+            if not f:
+                raise QueryError(f"Invalid selector '[{body}]'")
+            selectors.append(("filter", (f.group(1), f.group(2), f.group(3).strip("'\""))))
+    if SELECTOR_RE.sub("", rest).strip():
+        raise QueryError(f"Invalid segment '{segment}'")
+    return name, selectors
+
+@lru_cache(maxsize=256)
+def compile_query(expr: str) -> Tuple[Tuple[str, Tuple[Tuple[str, Any], ...]], ...]:
+    return tuple((name, tuple(sel)) for name, sel in map(_parse_segment, _split_segments(expr)))
+
+def _children(path: str, node: Any):
+    if isinstance(node, dict):
+        for key, value in node.items():
+            yield f"{path}.{key}" if path else str(key), value
+    elif isinstance(node, list):
+        for i, value in enumerate(node):
+            yield f"{path}[{i}]", value
+
+def _field(node: Any, field: str) -> Any:
+    for part in field.split("."):
+        if not isinstance(node, dict):
+            return None
+        node = node.get(part)
+    return node
+
+def _matches(node: Any, field: str, op: str, expected: str) -> bool:
+    value = _field(node, field)
+    values = value if isinstance(value, list) else [value]
+    strings = [str(v) for v in values if v is not None]
+    if op == "=":
+        return expected in strings
+    if op == "!=":
+        return expected not in strings
+    return any(expected.lower() in s.lower() for s in strings)
+
+def _step_name(path: str, node: Any, name: str):
+    if name == "*":
+        yield from _children(path, node)
+    elif isinstance(node, dict):
+        if name in node:
+            yield (f"{path}.{name}" if path else name), node[name]
+        else:
+            # Device names are often typed in a different case (r1 vs R1)
+            for key, value in node.items():
+                if str(key).lower() == name.lower():
+                    yield (f"{path}.{key}" if path else str(key)), value
+                    break
+    elif isinstance(node, list):
+        for item_path, item in _children(path, node):
+            yield from _step_name(item_path, item, name)
+
+def evaluate(doc: Any, expr: str) -> List[Tuple[str, Any]]:
+    """
+    Returns the (path, value) pairs selected by `expr`. An empty expression
+    selects the whole document.
+    """
+    nodes = [("", doc)]
+    for name, selectors in compile_query(expr.strip()):
+        if name:
+            nodes = [hit for path, node in nodes for hit in _step_name(path, node, name)]
+        for kind, arg in selectors:
+            selected = []
+            for path, node in nodes:
+                if kind == "index":
+                    if isinstance(node, list) and -len(node) <= arg < len(node):
+                        selected.append((f"{path}[{arg % len(node)}]", node[arg]))
+                elif kind == "all":
+                    selected.extend(_children(path, node))
+                else:
+                    selected.extend(c for c in _children(path, node) if _matches(c[1], *arg))
+            nodes = selected
+    return nodes
+
+def paginate(matches: List[Tuple[str, Any]], page: int, page_size: int) -> Tuple[List[Tuple[str, Any]], int]:
+    """
+    Pages over the matches. A single container match is expanded into its
+    children so that large subtrees (e.g. 'hosts') are paged too.
+    """
+    if len(matches) == 1 and isinstance(matches[0][1], (dict, list)):
+        matches = list(_children(*matches[0]))
+    total = len(matches)
+    start = (page - 1) * page_size
+    return matches[start:start + page_size], total
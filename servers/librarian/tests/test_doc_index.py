@@ -0,0 +1,151 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../../../"))
+from servers.librarian.doc_index import DocIndex, split_sections, tokenize
+
+def write(root, rel, text, mtime=None):
+    path = root / rel
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(text)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+
+def files(hits):
+    return [hit["file"] for hit in hits]
+
+FILLER = " ".join(f"filler{chr(97 + i % 26)}" for i in range(40))
+
+# --- Tokenizing and sections ---
+
+def test_tokenize_splits_letters_from_digits():
+    assert tokenize("FastEthernet0/0 has 10.0.12.1") == ["fastethernet", "0", "0", "has", "10", "0", "12", "1"]
+
+def test_sections_keep_header_trails_and_line_numbers():
+    sections = split_sections("intro\n# Topology\ntext\n## Wiring\nR1 Fa0/0\n## Addressing\nx\n# Runbooks\ny")
+    assert [(s["header"], s["line"]) for s in sections] == [
+        ("", 1), ("Topology", 2), ("Topology > Wiring", 4), ("Topology > Addressing", 6), ("Runbooks", 8)]
+
+def test_headers_inside_code_fences_are_text():
+    sections = split_sections("# Config\n```\n# not a header\ninterface Fa0/0\n```\n# Next")
+    assert [s["header"] for s in sections] == ["Config", "Next"]
+    assert "# not a header" in sections[0]["text"]
+
+def test_parse_query_units():
+    assert DocIndex.parse_query('ospf "area 0" 10.0.12.1 ...') == [
+        (["ospf"], False), (["area", "0"], True), (["10", "0", "12", "1"], False)]
+
+# --- BM25 ranking ---
+
+def test_higher_term_frequency_ranks_first(tmp_path):
+    write(tmp_path, "once.md", f"# A\nospf {FILLER}")
+    write(tmp_path, "thrice.md", f"# B\nospf ospf ospf {FILLER}")
+    assert files(DocIndex(str(tmp_path)).search("ospf")) == ["thrice.md", "once.md"]
+
+def test_shorter_section_ranks_first_at_equal_frequency(tmp_path):
+    write(tmp_path, "long.md", f"# A\nospf {FILLER} {FILLER}")
+    write(tmp_path, "short.md", "# B\nospf neighbours")
+    assert files(DocIndex(str(tmp_path)).search("ospf")) == ["short.md", "long.md"]
+
+def test_rarer_term_weighs_more(tmp_path):
+    for i in range(5):
+        write(tmp_path, f"common{i}.md", f"# C{i}\nrouter notes {FILLER}")
+    write(tmp_path, "rare.md", f"# R\nbgp notes {FILLER}")
+    write(tmp_path, "both.md", f"# B\nrouter only {FILLER}")
+    hits = DocIndex(str(tmp_path)).search("router bgp", top_k=10)
+    assert hits[0]["file"] == "rare.md"
+    assert hits[0]["score"] > hits[1]["score"]
+
+def test_no_match_and_empty_query(tmp_path):
+    write(tmp_path, "a.md", "# A\nospf")
+    index = DocIndex(str(tmp_path))
+    assert index.search("eigrp") == []
+    assert index.search("  ... ") == []
+    assert DocIndex(str(tmp_path / "missing")).search("ospf") == []
+
+def test_top_k_limits_results(tmp_path):
+    for i in range(6):
+        write(tmp_path, f"{i}.md", f"# S{i}\nvlan {i}")
+    assert len(DocIndex(str(tmp_path)).search("vlan", top_k=3)) == 3
+
+# --- Phrases ---
+
+def test_quoted_phrase_is_required(tmp_path):
+    write(tmp_path, "phrase.md", "# P\nospf area 0 is the backbone")
+    write(tmp_path, "scattered.md", "# S\narea ospf ospf ospf 0")
+    index = DocIndex(str(tmp_path))
+    assert files(index.search('ospf "area 0"')) == ["phrase.md"]
+    assert index.search('"area 51"') == []
+
+def test_ip_address_matches_only_as_a_phrase(tmp_path):
+    write(tmp_path, "r1.md", "# R1\nFa0/0 is 10.0.12.1")
+    write(tmp_path, "r2.md", "# R2\nFa0/0 is 10.0.21.1 and 12.0.10.1")
+    hits = DocIndex(str(tmp_path)).search("10.0.12.1")
+    assert files(hits) == ["r1.md"]
+    assert "10.0.12.1" in hits[0]["snippet"]
+
+def test_results_point_at_the_section(tmp_path):
+    write(tmp_path, "runbook.md", "# Runbook\nintro\n## Recovery\nreload the router\n## Other\nnothing")
+    hit = DocIndex(str(tmp_path)).search("reload")[0]
+    assert (hit["file"], hit["header"], hit["line"]) == ("runbook.md", "Runbook > Recovery", 3)
+
+# --- Incremental refresh and persistence ---
+
+def test_refresh_picks_up_edits_additions_and_deletions(tmp_path):
+    docs = tmp_path / "docs"
+    write(docs, "a.md", "# A\nospf", mtime=1000)
+    write(docs, "b.md", "# B\nbgp", mtime=1000)
+    index = DocIndex(str(docs), refresh_interval=3600)
+    assert index.refresh(force=True) == 2
+    assert index.refresh(force=True) == 0
+
+    write(docs, "a.md", "# A\neigrp", mtime=2000)
+    os.remove(docs / "b.md")
+    write(docs, "sub/c.md", "# C\nospf")
+    assert index.refresh(force=True) == 3
+    assert files(index.search("ospf")) == [os.path.join("sub", "c.md")]
+    assert files(index.search("eigrp")) == ["a.md"]
+    assert index.search("bgp") == []
+    # Postings of removed sections are gone, not just unreachable
+    assert "bgp" not in index.postings
+    assert index.total_length == sum(s["length"] for s in index.sections.values())
+
+def test_refresh_is_throttled(tmp_path):
+    write(tmp_path, "a.md", "# A\nospf")
+    index = DocIndex(str(tmp_path), refresh_interval=3600)
+    assert index.refresh() == 1
+    write(tmp_path, "b.md", "# B\nbgp")
+    assert index.refresh() == 0
+    assert index.refresh(force=True) == 1
+
+def test_index_dir_is_reloaded_without_reindexing(tmp_path):
+    docs, store = tmp_path / "docs", tmp_path / "index"
+    write(docs, "a.md", "# A\nospf area 0", mtime=1000)
+    write(docs, "b.md", "# B\nbgp", mtime=1000)
+    first = DocIndex(str(docs), index_dir=str(store))
+    expected = first.search('"area 0"')
+    assert expected
+
+    second = DocIndex(str(docs), index_dir=str(store))
+    assert second.refresh(force=True) == 0
+    assert second.search('"area 0"') == expected
+
+    os.remove(docs / "b.md")
+    assert second.refresh(force=True) == 1
+    third = DocIndex(str(docs), index_dir=str(store))
+    assert set(third.files) == {"a.md"}
+    assert third.refresh(force=True) == 0
+
+def test_unreadable_shard_is_reindexed(tmp_path):
+    docs, store = tmp_path / "docs", tmp_path / "index"
+    write(docs, "a.md", "# A\nospf", mtime=1000)
+    index = DocIndex(str(docs), index_dir=str(store))
+    index.refresh(force=True)
+    with open(index._shard_path("a.md"), "w") as f:
+        f.write("{not json")
+    reloaded = DocIndex(str(docs), index_dir=str(store))
+    assert reloaded.files == {}
+    assert reloaded.refresh(force=True) == 1
+    assert files(reloaded.search("ospf")) == ["a.md"]
@@ -0,0 +1,83 @@
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../../../"))
+from servers.librarian.sot_query import QueryError, evaluate, paginate
+
+INVENTORY = {
+    "hosts": {
+        "R1": {"groups": ["cisco", "core"], "port": 5000,
+               "data": {"role": "Distribution", "interfaces": [
+                   {"name": "FastEthernet0/0", "ip": "10.0.0.1/24"},
+                   {"name": "FastEthernet0/1", "ip": "20.0.0.1/24"}]}},
+        "R2": {"groups": ["cisco"], "port": 5001,
+               "data": {"role": "access", "interfaces": [{"name": "FastEthernet0/0", "ip": "10.0.0.2/24"}]}},
+        "pc1": {"groups": ["linux"], "port": 5002, "data": {"ip": "20.0.0.10/24"}},
+    }
+}
+
+def paths(expr):
+    return [path for path, _ in evaluate(INVENTORY, expr)]
+
+def test_empty_expression_selects_the_document():
+    assert evaluate(INVENTORY, "  ") == [("", INVENTORY)]
+
+def test_dotted_path():
+    assert evaluate(INVENTORY, "hosts.R2.port") == [("hosts.R2.port", 5001)]
+
+def test_names_fall_back_to_case_insensitive_match():
+    assert evaluate(INVENTORY, "hosts.r1.port") == [("hosts.R1.port", 5000)]
+    assert evaluate(INVENTORY, "hosts.PC1.port") == [("hosts.pc1.port", 5002)]
+
+def test_missing_name_selects_nothing():
+    assert evaluate(INVENTORY, "hosts.R9.port") == []
+    assert evaluate(INVENTORY, "hosts.R1.port.value") == []
+
+def test_wildcard_and_name_over_a_list():
+    assert paths("hosts.*.data.interfaces.ip") == [
+        "hosts.R1.data.interfaces[0].ip", "hosts.R1.data.interfaces[1].ip", "hosts.R2.data.interfaces[0].ip"]
+    assert paths("hosts[*].port") == ["hosts.R1.port", "hosts.R2.port", "hosts.pc1.port"]
+
+@pytest.mark.parametrize("expr, expected", [
+    ("hosts.R1.data.interfaces[0].ip", [("hosts.R1.data.interfaces[0].ip", "10.0.0.1/24")]),
+    ("hosts.R1.data.interfaces[-1].ip", [("hosts.R1.data.interfaces[1].ip", "20.0.0.1/24")]),
+    ("hosts.R1.data.interfaces[2]", []),
+    ("hosts.R1.data.interfaces[-3]", []),
+    ("hosts.R1.port[0]", []),
+])
+def test_index(expr, expected):
+    assert evaluate(INVENTORY, expr) == expected
+
+@pytest.mark.parametrize("expr, expected", [
+    ("hosts[groups=cisco].port", ["hosts.R1.port", "hosts.R2.port"]),
+    ("hosts[groups=core].port", ["hosts.R1.port"]),
+    ("hosts[groups!=cisco].port", ["hosts.pc1.port"]),
+    ("hosts[groups='linux'].port", ["hosts.pc1.port"]),
+    ("hosts[data.role~DISTRIB].port", ["hosts.R1.port"]),
+    ("hosts[data.role=distribution].port", []),
+    ("hosts[port=5001]", ["hosts.R2"]),
+    ("hosts[data.missing!=x].port", ["hosts.R1.port", "hosts.R2.port", "hosts.pc1.port"]),
+    ("hosts.*.data.interfaces[ip~20.0.0.].name", ["hosts.R1.data.interfaces[1].name"]),
+])
+def test_filters(expr, expected):
+    assert paths(expr) == expected
+
+@pytest.mark.parametrize("expr", ["hosts[groups=cisco", "hosts]groups[", "hosts[???]", "hosts[0]x"])
+def test_invalid_queries(expr):
+    with pytest.raises(QueryError):
+        evaluate(INVENTORY, expr)
+
+def test_paginate_expands_a_single_container():
+    page, total = paginate(evaluate(INVENTORY, "hosts"), page=1, page_size=2)
+    assert total == 3
+    assert [path for path, _ in page] == ["hosts.R1", "hosts.R2"]
+    page, _ = paginate(evaluate(INVENTORY, "hosts"), page=2, page_size=2)
+    assert [path for path, _ in page] == ["hosts.pc1"]
+    assert paginate(evaluate(INVENTORY, "hosts"), page=3, page_size=2) == ([], 3)
+
+def test_paginate_keeps_a_single_scalar_and_several_matches():
+    assert paginate(evaluate(INVENTORY, "hosts.R1.port"), 1, 10) == ([("hosts.R1.port", 5000)], 1)
+    page, total = paginate(evaluate(INVENTORY, "hosts.*.data"), 1, 10)
+    assert total == 3 and [path for path, _ in page] == ["hosts.R1.data", "hosts.R2.data", "hosts.pc1.data"]
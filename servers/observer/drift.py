@@ -0,0 +1,224 @@
+import asyncio
+import hashlib
+import ipaddress
+import json
+import os
+import time
+from typing import Any, Dict, List, Optional
+
+from shared.console_pool import console_pool, console_address, spread_by_host
+from shared.gns3_utils import LINUX_STATE_CMD
+
+# IPAM allocations are compared too; the observer only ever reads this file
+IPAM_DB_PATH = os.environ.get(
+    "IPAM_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "../ipam/ipam_db.json")
+)
+
+def fingerprint(data: Any) -> str:
+    return hashlib.sha1(json.dumps(data, sort_keys=True, default=str).encode()).hexdigest()[:16]
+
+def _platform(host_data: Dict[str, Any]) -> str:
+    return "linux" if "linux" in host_data.get("groups", []) else "cisco_ios"
+
+def _address(ip: Optional[str]) -> Optional[str]:
+    """'40.0.0.99/24' -> '40.0.0.99'; anything unparsable -> None."""
+    if not ip:
+        return None
+    try:
+        return str(ipaddress.ip_interface(str(ip)).ip)
+    except ValueError:
+        return None
+
+def load_ipam_allocations() -> Dict[str, str]:
+    try:
+        with open(IPAM_DB_PATH, 'r') as f:
+            return json.load(f).get("allocations", {})
+    except (OSError, ValueError):
+        return {}
+
+def expected_state(host_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    What the inventory says a device should look like:
+    {"interfaces": {name: ip-or-None}, "connected": [prefix...], "default_gateway": ip-or-None}
+    """
+    data = host_data.get("data") or {}
+    interfaces = {}
+    connected = []
+    for iface in data.get("interfaces") or []:
+        interfaces[iface.get("name")] = iface.get("ip")
+        if iface.get("ip") and "/" in str(iface["ip"]):
+            try:
+                connected.append(str(ipaddress.ip_interface(iface["ip"]).network))
+            except ValueError:
+                pass
+    if data.get("ip"):
+        interfaces[data.get("interface") or "eth0"] = data["ip"]
+    return {"interfaces": interfaces, "connected": connected, "default_gateway": data.get("gateway")}
+
+async def collect_state(host_data: Dict[str, Any], ttl: Optional[float] = None) -> Dict[str, Any]:
+    """Collects interfaces and routes from one device over its console (ttl: console read cache)."""
+    platform = _platform(host_data)
+    hostname, port = console_address(host_data)
+    if platform == "linux":
+        # Addresses, links and routes in one round trip
+        state = await console_pool.read(hostname, port, LINUX_STATE_CMD,
+                                        lambda console: console.get_linux_state(), platform=platform, ttl=ttl)
+        return {"interfaces": state["interfaces"], "routes": state["routes"]}
+    interfaces = await console_pool.read(hostname, port, "show ip interface brief",
+                                         lambda console: console.get_interfaces(), platform=platform, ttl=ttl)
+    routes = await console_pool.read(hostname, port, "routes", lambda console: console.get_routes(),
+                                     platform=platform, ttl=ttl)
+    return {"interfaces": interfaces, "routes": routes}
+
+def diff_device(device: str, host_data: Dict[str, Any], state: Dict[str, Any],
+                allocations: Dict[str, str]) -> List[Dict[str, Any]]:
+    """Compares collected state with the inventory entry and IPAM allocations."""
+    expected = expected_state(host_data)
+    items = []
+
+    def add(kind, **details):
+        items.append({"device": device, "kind": kind, **details})
+
+    live = {i["name"]: i for i in state.get("interfaces", [])}
+    live_addrs = {_address(i.get("ip")) for i in live.values()} - {None}
+
+    for name, ip in expected["interfaces"].items():
+        iface = live.get(name)
+        want = _address(ip)
+        if iface is None:
+            if want and want in live_addrs:
+                # e.g. inventory says eth0 but the host names it differently
+                continue
+            add("interface_missing", interface=name, expected_ip=ip)
+            continue
+        have = _address(iface.get("ip"))
+        if want and have != want:
+            add("ip_mismatch", interface=name, expected_ip=ip, live_ip=iface.get("ip"))
+        status = iface.get("status")
+        if status and status != "up":
+            add("interface_admin_down" if "admin" in status else "interface_down",
+                interface=name, status=status, protocol=iface.get("protocol"))
+        elif iface.get("protocol") and iface["protocol"] != "up":
+            add("protocol_down", interface=name, protocol=iface["protocol"])
+
+    expected_addrs = {_address(ip) for ip in expected["interfaces"].values()} - {None}
+    for name, iface in live.items():
+        have = _address(iface.get("ip"))
+        if name in expected["interfaces"]:
+            continue  # already reported as ip_mismatch
+        if have and have not in expected_addrs and not ipaddress.ip_address(have).is_loopback:
+            add("unexpected_ip", interface=name, live_ip=iface.get("ip"))
+
+    routes = state.get("routes", [])
+    prefixes = {r["prefix"] for r in routes}
+    for prefix in expected["connected"]:
+        if prefix not in prefixes:
+            add("missing_connected_route", prefix=prefix)
+    gateway = expected["default_gateway"]
+    if gateway:
+        defaults = [r for r in routes if r["prefix"] == "0.0.0.0/0"]
+        if not defaults:
+            add("missing_default_route", expected_gateway=gateway)
+        elif gateway not in {r.get("next_hop") for r in defaults}:
+            add("default_route_mismatch", expected_gateway=gateway,
+                live_gateways=sorted({r.get("next_hop") or "" for r in defaults}))
+
+    for addr in sorted(live_addrs):
+        if not ipaddress.ip_address(addr).is_loopback and addr not in allocations:
+            add("not_in_ipam", ip=addr)
+
+    return items
+
+class DriftEngine:
+    """
+    Fleet drift detection with per-device caching.
+
+    A device's console is only visited when its inventory entry changed, it
+    was reconfigured through the console pool, or its cached state is older
+    than `max_age`. The diff itself is only recomputed when the inventory,
+    state or IPAM fingerprint changed, so a repeat run over an unchanged
+    fleet costs no console traffic and almost no CPU.
+    """
+
+    def __init__(self, concurrency: int = 32):
+        # Consoles polled at once on each GNS3 compute host (the pool's per-host cap still applies)
+        self.concurrency = concurrency
+        self._cache: Dict[str, Dict[str, Any]] = {}
+
+    @staticmethod
+    def _console_key(host_data: Dict[str, Any]):
+        return console_address(host_data)
+
+    def _needs_collect(self, device: str, host_data: Dict[str, Any], max_age: float) -> bool:
+        entry = self._cache.get(device)
+        if entry is None:
+            return True
+        return (entry["inventory_fp"] != fingerprint(host_data)
+                or entry["generation"] != console_pool.generation(*self._console_key(host_data))
+                or time.monotonic() - entry["collected_at"] >= max_age)
+
+    async def _collect(self, device: str, host_data: Dict[str, Any], sem: asyncio.Semaphore,
+                       ttl: Optional[float] = None) -> None:
+        async with sem:
+            generation = console_pool.generation(*self._console_key(host_data))
+            state = await collect_state(host_data, ttl=ttl)
+        previous = self._cache.get(device, {})
+        self._cache[device] = {
+            "inventory_fp": fingerprint(host_data),
+            "state_fp": fingerprint(state),
+            "state": state,
+            "generation": generation,
+            "collected_at": time.monotonic(),
+            # Keep the previous diff; it is reused if nothing it depends on changed
+            "diff_key": previous.get("diff_key"),
+            "drift": previous.get("drift", []),
+        }
+
+    async def run(self, hosts: Dict[str, Dict[str, Any]], devices: Optional[List[str]] = None,
+                  full: bool = False, max_age: float = 600.0) -> Dict[str, Any]:
+        selected = {name: data for name, data in hosts.items() if not devices or name in devices}
+        errors = {name: "No console port in inventory" for name, data in selected.items() if not data.get("port")}
+        to_collect = spread_by_host([name for name, data in selected.items()
+                                     if name not in errors and (full or self._needs_collect(name, data, max_age))],
+                                    selected)
+
+        sem = asyncio.Semaphore(console_pool.fleet_limit(
+            (self._console_key(selected[name])[0] for name in to_collect), self.concurrency))
+        results = await asyncio.gather(
+            *(self._collect(name, selected[name], sem, ttl=0 if full else None) for name in to_collect),
+            return_exceptions=True
+        )
+        for name, res in zip(to_collect, results):
+            if isinstance(res, Exception):
+                errors[name] = str(res) or type(res).__name__
+
+        allocations = load_ipam_allocations()
+        ipam_fp = fingerprint(allocations)
+        drift = []
+        rediffed = 0
+        for name, data in selected.items():
+            entry = self._cache.get(name)
+            if entry is None or name in errors:
+                continue
+            diff_key = (entry["inventory_fp"], entry["state_fp"], ipam_fp)
+            if entry["diff_key"] != diff_key:
+                entry["drift"] = diff_device(name, data, entry["state"], allocations)
+                entry["diff_key"] = diff_key
+                rediffed += 1
+            drift.extend(entry["drift"])
+
+        return {
+            "summary": {
+                "devices": len(selected),
+                "collected": len([n for n in to_collect if n not in errors]),
+                "reused": len([n for n in selected if n not in to_collect and n not in errors]),
+                "rediffed": rediffed,
+                "errors": len(errors),
+                "with_drift": len({item["device"] for item in drift}),
+                "items": len(drift),
+            },
+            "drift": drift,
+            "errors": errors,
+        }
+
+drift_engine = DriftEngine()
@@ -0,0 +1,259 @@
+import asyncio
+import ipaddress
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from shared.console_pool import console_pool, console_address, spread_by_host
+from shared.gns3_utils import LINUX_STATE_CMD
+
+try:
+    from .drift import expected_state, fingerprint, _platform
+except ImportError:
+    from drift import expected_state, fingerprint, _platform
+
+class _Node:
+    __slots__ = ("key", "length", "children", "routes")
+
+    def __init__(self, key: int, length: int, routes: Optional[List[Dict[str, Any]]] = None):
+        self.key = key
+        self.length = length
+        self.children: List[Optional["_Node"]] = [None, None]
+        self.routes = routes
+
+class PrefixTrie:
+    """
+    Path-compressed binary trie (Patricia) over one address family.
+
+    Only prefixes and the branching points between them get a node, so a
+    table of n routes has fewer than 2n nodes and a longest-prefix match
+    visits at most one node per distinct prefix length on the path.
+    """
+
+    def __init__(self, width: int):
+        self.width = width
+        self.root = _Node(0, 0)
+        self.size = 0
+
+    def _bit(self, key: int, index: int) -> int:
+        return (key >> (self.width - 1 - index)) & 1
+
+    def _mask(self, key: int, length: int) -> int:
+        shift = self.width - length
+        return (key >> shift) << shift if length else 0
+
+    def insert(self, network: ipaddress._BaseNetwork, route: Dict[str, Any]) -> None:
+        """Adds a route; routes for the same prefix (ECMP) accumulate."""
+        key, length = int(network.network_address), network.prefixlen
+        node = self.root
+        while True:
+            if node.length == length:
+                if node.routes is None:
+                    node.routes = []
+                    self.size += 1
+                node.routes.append(route)
+                return
+            bit = self._bit(key, node.length)
+            child = node.children[bit]
+            if child is None:
+                node.children[bit] = _Node(key, length, [route])
+                self.size += 1
+                return
+            common = min(length, child.length, self.width - (key ^ child.key).bit_length())
+            if common == child.length:
+                node = child
+                continue
+            # Split the edge at the first differing bit
+            branch = _Node(self._mask(key, common), common)
+            branch.children[self._bit(child.key, common)] = child
+            node.children[bit] = branch
+            if common == length:
+                branch.routes = [route]
+            else:
+                branch.children[self._bit(key, common)] = _Node(key, length, [route])
+            self.size += 1
+            return
+
+    def lookup(self, address: int) -> Tuple[Optional[int], Optional[List[Dict[str, Any]]]]:
+        """Longest-prefix match: (prefix length, routes), or (None, None) without a match."""
+        node = self.root
+        best: Tuple[Optional[int], Optional[List[Dict[str, Any]]]] = (None, None)
+        while node is not None:
+            if node.length and (address ^ node.key) >> (self.width - node.length):
+                break
+            if node.routes:
+                best = (node.length, node.routes)
+            if node.length == self.width:
+                break
+            node = node.children[self._bit(address, node.length)]
+        return best
+
+class RouteTable:
+    """One device's routing table, indexed for longest-prefix match per address family."""
+
+    def __init__(self, routes: List[Dict[str, Any]]):
+        self.tries = {4: PrefixTrie(32), 6: PrefixTrie(128)}
+        self.invalid = 0
+        for route in routes:
+            try:
+                network = ipaddress.ip_network(route["prefix"], strict=False)
+            except (KeyError, ValueError):
+                self.invalid += 1
+                continue
+            self.tries[network.version].insert(network, route)
+
+    def __len__(self) -> int:
+        return sum(t.size for t in self.tries.values())
+
+    def lookup(self, destination: str) -> Optional[Dict[str, Any]]:
+        address = ipaddress.ip_address(destination)
+        length, routes = self.tries[address.version].lookup(int(address))
+        if routes is None:
+            return None
+        return {"prefix": routes[0]["prefix"], "prefixlen": length, "routes": routes}
+
+async def collect_routes(host_data: Dict[str, Any], ttl: Optional[float] = None) -> List[Dict[str, Any]]:
+    """Fetches the routing table of one device over its console (ttl: console read cache)."""
+    platform = _platform(host_data)
+    hostname = console_address(host_data)[0]
+    if platform == "linux":
+        # Same read as drift detection and interface health, so they share the cache
+        state = await console_pool.read(hostname, host_data.get("port"), LINUX_STATE_CMD,
+                                        lambda console: console.get_linux_state(), platform=platform, ttl=ttl)
+        return state["routes"]
+    return await console_pool.read(hostname, host_data.get("port"), "routes",
+                                   lambda console: console.get_routes(), platform=platform, ttl=ttl)
+
+def _owners(hosts: Dict[str, Dict[str, Any]]) -> Dict[str, str]:
+    """Address -> device name, from the inventory interfaces."""
+    owners = {}
+    for name, data in hosts.items():
+        for ip in expected_state(data)["interfaces"].values():
+            if not ip:
+                continue
+            try:
+                owners[str(ipaddress.ip_interface(str(ip)).ip)] = name
+            except ValueError:
+                continue
+    return owners
+
+class RouteSnapshot:
+    """
+    Per-device routing tables fetched concurrently and kept as prefix tries.
+
+    A table is re-fetched when it is older than `max_age`, when the device's
+    inventory entry changed, or when the device was reconfigured through the
+    console pool (deploy_config bumps its generation). Lookups and path traces
+    then run entirely in memory.
+    """
+
+    def __init__(self, concurrency: int = 32):
+        # Consoles polled at once on each GNS3 compute host (the pool's per-host cap still applies)
+        self.concurrency = concurrency
+        self._cache: Dict[str, Dict[str, Any]] = {}
+
+    @staticmethod
+    def _console_key(host_data: Dict[str, Any]):
+        return console_address(host_data)
+
+    def _is_fresh(self, device: str, host_data: Dict[str, Any], max_age: float) -> bool:
+        entry = self._cache.get(device)
+        return (entry is not None
+                and entry["inventory_fp"] == fingerprint(host_data)
+                and entry["generation"] == console_pool.generation(*self._console_key(host_data))
+                and time.monotonic() - entry["fetched_at"] < max_age)
+
+    async def _fetch(self, device: str, host_data: Dict[str, Any], sem: asyncio.Semaphore,
+                     ttl: Optional[float] = None) -> None:
+        async with sem:
+            generation = console_pool.generation(*self._console_key(host_data))
+            routes = await collect_routes(host_data, ttl=ttl)
+        self._cache[device] = {
+            "inventory_fp": fingerprint(host_data),
+            "generation": generation,
+            "fetched_at": time.monotonic(),
+            "table": RouteTable(routes),
+        }
+
+    async def refresh(self, hosts: Dict[str, Dict[str, Any]], devices: Optional[List[str]] = None,
+                      full: bool = False, max_age: float = 60.0) -> Dict[str, Any]:
+        """Fetches every selected table that is missing or stale; returns {"fetched": [...], "errors": {...}}."""
+        selected = {name: data for name, data in hosts.items() if not devices or name in devices}
+        errors = {name: "No console port in inventory" for name, data in selected.items() if not data.get("port")}
+        to_fetch = spread_by_host([name for name, data in selected.items()
+                                   if name not in errors and (full or not self._is_fresh(name, data, max_age))],
+                                  selected)
+        sem = asyncio.Semaphore(console_pool.fleet_limit(
+            (self._console_key(selected[name])[0] for name in to_fetch), self.concurrency))
+        results = await asyncio.gather(
+            *(self._fetch(name, selected[name], sem, ttl=0 if full else None) for name in to_fetch),
+            return_exceptions=True
+        )
+        for name, res in zip(to_fetch, results):
+            if isinstance(res, Exception):
+                errors[name] = str(res) or type(res).__name__
+        return {"fetched": [n for n in to_fetch if n not in errors], "errors": errors}
+
+    def table(self, device: str) -> Optional[RouteTable]:
+        entry = self._cache.get(device)
+        return entry["table"] if entry else None
+
+    def age(self, device: str) -> Optional[float]:
+        entry = self._cache.get(device)
+        return round(time.monotonic() - entry["fetched_at"], 3) if entry else None
+
+    def summary(self, devices: List[str]) -> Dict[str, Any]:
+        out = {}
+        for name in devices:
+            entry = self._cache.get(name)
+            if entry:
+                table = entry["table"]
+                out[name] = {"routes": len(table), "ipv4": table.tries[4].size, "ipv6": table.tries[6].size,
+                             "unparsed": table.invalid, "age_s": self.age(name)}
+        return out
+
+    def trace(self, hosts: Dict[str, Dict[str, Any]], source: str, destination: str,
+              max_hops: int = 32) -> Dict[str, Any]:
+        """
+        Follows the forwarding decision of each device from `source` towards
+        `destination`, using cached tables only. With ECMP the first next hop
+        is followed and the alternatives are listed on the hop.
+        """
+        owners = _owners(hosts)
+        target_owner = owners.get(destination)
+        hops = []
+        visited = set()
+        device = source
+        while True:
+            if device == target_owner:
+                return {"result": "delivered", "hops": hops}
+            if device in visited:
+                return {"result": "loop", "hops": hops, "loop_at": device}
+            if len(hops) >= max_hops:
+                return {"result": "max_hops", "hops": hops}
+            visited.add(device)
+            table = self.table(device)
+            if table is None:
+                return {"result": "no_table", "hops": hops, "device": device}
+            match = table.lookup(destination)
+            if match is None:
+                hops.append({"device": device, "prefix": None})
+                return {"result": "no_route", "hops": hops}
+            route = match["routes"][0]
+            hop = {"device": device, "prefix": match["prefix"], "protocol": route.get("protocol"),
+                   "next_hop": route.get("next_hop"), "interface": route.get("interface")}
+            if len(match["routes"]) > 1:
+                hop["ecmp"] = [r.get("next_hop") for r in match["routes"][1:]]
+            hops.append(hop)
+            next_hop = route.get("next_hop")
+            if not next_hop:
+                # Directly connected: hand over to the owner of the destination, if known
+                if target_owner is None:
+                    return {"result": "delivered", "hops": hops, "note": "destination not in inventory"}
+                device = target_owner
+                continue
+            next_device = owners.get(next_hop)
+            if next_device is None:
+                return {"result": "unresolved_next_hop", "hops": hops}
+            device = next_device
+
+route_snapshot = RouteSnapshot()
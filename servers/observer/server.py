@@ -1,14 +1,27 @@
 from mcp.server.fastmcp import FastMCP
 from typing import Dict, Any, List, Optional
+import asyncio
+import ipaddress
 import sys
 import os
 sys.path.append(os.path.join(os.path.dirname(__file__), "../../"))
-from shared.gns3_utils import GNS3Console, load_inventory
+from shared.gns3_utils import load_inventory, LINUX_STATE_CMD
+from shared.console_pool import console_pool, console_address
+from shared.metrics import instrument_server
+from shared.responses import parse_ping, register_transcript_tool, with_transcript
+
+try:
+    from .drift import drift_engine
+    from .routing import route_snapshot
+except ImportError:
+    sys.path.append(os.path.dirname(__file__))
+    from drift import drift_engine
+    from routing import route_snapshot
 
 mcp = FastMCP("Observer Server")
 
 @mcp.tool()
-def check_reachability(source_device: str, target_ip: str) -> str:
+async def check_reachability(source_device: str, target_ip: str) -> Dict[str, Any]:
     """
     Checks ping reachability from a source device to a target IP.
     
@@ -17,38 +30,34 @@ def check_reachability(source_device: str, target_ip: str) -> str:
         target_ip: IP address to ping TO.
         
     Returns:
-        str: SUCCESS or FAILURE message with raw ping output.
+        Dict: {"status": reachable|unreachable, "source", "target", "sent", "received",
+               "loss_percent", "rtt_ms": {"min", "avg", "max"}, "transcript_id"}.
+               The raw ping output is fetched with get_transcript(transcript_id).
     """
     try:
         inv = load_inventory()
         host_data = inv.get("hosts", {}).get(source_device)
         if not host_data:
-            return f"Error: Device {source_device} not in inventory."
+            return {"error": f"Device {source_device} not in inventory."}
             
-        port = host_data.get("port")
+        hostname, port = console_address(host_data)
         groups = host_data.get("groups", [])
         platform = "linux" if "linux" in groups else "cisco_ios"
         
-        console = GNS3Console("localhost", port, platform=platform)
-        console.connect()
-        output = console.ping(target_ip)
-        console.close()
+        # Identical pings already running are shared, never cached
+        output = await console_pool.read(hostname, port, f"ping {target_ip}",
+                                         lambda console: console.ping(target_ip), platform=platform, ttl=0)
         
-        # Analyze output
-        success = False
-        if "!!!!" in output or "bytes from" in output or "0% packet loss" in output:
-             success = True
-             
-        if success:
-            return f"SUCCESS: {output}"
-        else:
-            return f"FAILURE: {output}"
+        ping = parse_ping(output)
+        summary = {"status": "reachable" if ping.pop("reachable") else "unreachable",
+                   "source": source_device, "target": target_ip, **ping}
+        return with_transcript(summary, output, "check_reachability", source_device)
 
     except Exception as e:
-        return f"Error running ping: {str(e)}"
+        return {"error": f"Error running ping: {str(e)}"}
 
 @mcp.tool()
-def get_interface_health(device: str, interface: str) -> str:
+async def get_interface_health(device: str, interface: str) -> str:
     """
     Retrieves the operational status and protocol status of an interface.
     
@@ -65,22 +74,22 @@ def get_interface_health(device: str, interface: str) -> str:
         if not host_data:
             return f"Error: Device {device} not found in inventory."
             
-        port = host_data.get("port")
+        hostname, port = console_address(host_data)
         groups = host_data.get("groups", [])
         platform = "linux" if "linux" in groups else "cisco_ios"
         
-        console = GNS3Console("localhost", port, platform=platform)
-        console.connect()
-        
         # Get real interfaces
-        real_interfaces = console.get_interfaces()
-        console.close()
+        if platform == "linux":
+            # Addresses, links and routes in one round trip, shared with drift/route snapshots
+            state = await console_pool.read(hostname, port, LINUX_STATE_CMD,
+                                            lambda console: console.get_linux_state(), platform=platform)
+            real_interfaces = state["interfaces"]
+        else:
+            real_interfaces = await console_pool.read(hostname, port, "show ip interface brief",
+                                                      lambda console: console.get_interfaces(), platform=platform)
         
         if not real_interfaces:
-            # Fallback for Linux or if parsing failed
-            if platform == "linux":
-                return "Linux interface health check not implemented yet (use ping)."
-            return "Error: Could not retrieve interfaces from Router."
+            return "Error: Could not retrieve interfaces from device."
 
         # Find requested interface
         # Try exact match first
@@ -98,7 +107,7 @@ def get_interface_health(device: str, interface: str) -> str:
         return f"Error connecting to device: {str(e)}"
 
 @mcp.tool()
-def detect_link_failures() -> List[str]:
+async def detect_link_failures() -> List[str]:
     """
     Compares live state against inventory.
     """
@@ -107,15 +116,21 @@ def detect_link_failures() -> List[str]:
         inv = load_inventory()
         hosts = inv.get("hosts", {})
         
-        for dev_name, data in hosts.items():
+        # Cisco routers and Linux hosts both report interface state
+        checks = {}
+        for name, data in hosts.items():
             groups = data.get("groups", [])
-            # Only check Cisco routers for now as they support get_interfaces
-            if "cisco" not in groups:
-                 continue
+            if "cisco" in groups:
+                checks[name] = "Ethernet0/0"
+            elif "linux" in groups:
+                checks[name] = (data.get("data") or {}).get("interface") or "eth0"
 
-            res = get_interface_health(dev_name, "Ethernet0/0") # Basic check for main interface?
-            # Ideally we check ALL interfaces expected to be up. 
-            # This is a simplification.
+        # Poll every device concurrently instead of one console at a time
+        # Basic check for main interface? Ideally we check ALL interfaces expected to be up.
+        # This is a simplification.
+        results = await asyncio.gather(*(get_interface_health(name, iface) for name, iface in checks.items()))
+
+        for dev_name, res in zip(checks, results):
             if "Error" in res or "down" in res.lower():
                  failures.append(f"Issue on {dev_name}: {res}")
                  
@@ -126,14 +141,165 @@ def detect_link_failures() -> List[str]:
         return ["All monitored devices appear reachable/healthy."]
     return failures
 
+@mcp.tool()
+def get_console_hosts() -> Dict[str, Any]:
+    """
+    GNS3 compute hosts the consoles are spread over: devices per host, the
+    per-host session cap, sessions in use and connection health. A host that
+    keeps refusing connections is skipped until its retry delay expires.
+
+    Returns:
+        Dict: {hostname: {"devices", "limit", "active", "healthy", "consecutive_failures",
+                          "retry_in_seconds", "last_error"}}
+    """
+    try:
+        hosts = load_inventory().get("hosts", {})
+        devices: Dict[str, int] = {}
+        for data in hosts.values():
+            if data.get("port"):
+                hostname = console_address(data)[0]
+                devices[hostname] = devices.get(hostname, 0) + 1
+        status = console_pool.host_status()
+        return {hostname: {"devices": devices.get(hostname, 0), **(status.get(hostname)
+                           or console_pool.compute_host(hostname).status())}
+                for hostname in sorted(set(devices) | set(status))}
+    except Exception as e:
+        return {"error": f"Error reading console hosts: {str(e)}"}
+
+@mcp.tool()
+async def detect_drift(devices: Optional[List[str]] = None, full: bool = False,
+                       max_age_seconds: int = 600) -> Dict[str, Any]:
+    """
+    Compares live interfaces, addresses and routes against the Source of Truth
+    (inventory) and the IPAM allocations, for every device at once.
+
+    Consoles are polled concurrently. Devices whose inventory entry is unchanged,
+    that were not reconfigured by the deployer and whose cached state is younger
+    than `max_age_seconds` are not re-polled.
+
+    Args:
+        devices: Optional list of device names to check (default: all).
+        full: Ignore the cache and poll every selected device.
+        max_age_seconds: Maximum age of cached live state before a device is re-polled.
+
+    Returns:
+        Dict: {"summary": {...}, "drift": [{"device", "kind", ...}], "errors": {device: message}}
+    """
+    try:
+        hosts = load_inventory().get("hosts", {})
+        unknown = [d for d in devices or [] if d not in hosts]
+        if unknown:
+            return {"error": f"Devices not in inventory: {', '.join(unknown)}"}
+        return await drift_engine.run(hosts, devices=devices, full=full, max_age=max_age_seconds)
+    except Exception as e:
+        return {"error": f"Error running drift detection: {str(e)}"}
+
+@mcp.tool()
+async def get_route_snapshot(devices: Optional[List[str]] = None, full: bool = False,
+                             max_age_seconds: int = 60) -> Dict[str, Any]:
+    """
+    Fetches routing tables (show ip route / ip route) from the devices concurrently
+    and keeps them in memory as prefix tries for lookup_route and trace_forwarding_path.
+
+    Tables younger than `max_age_seconds` are reused unless the device was
+    reconfigured or its inventory entry changed.
+
+    Args:
+        devices: Optional list of device names (default: all).
+        full: Re-fetch every selected table.
+        max_age_seconds: Maximum age of a cached table.
+
+    Returns:
+        Dict: {"fetched": [...], "tables": {device: {"routes", "age_s", ...}}, "errors": {device: message}}
+    """
+    try:
+        hosts = load_inventory().get("hosts", {})
+        unknown = [d for d in devices or [] if d not in hosts]
+        if unknown:
+            return {"error": f"Devices not in inventory: {', '.join(unknown)}"}
+        result = await route_snapshot.refresh(hosts, devices=devices, full=full, max_age=max_age_seconds)
+        result["tables"] = route_snapshot.summary([n for n in hosts if not devices or n in devices])
+        return result
+    except Exception as e:
+        return {"error": f"Error fetching routing tables: {str(e)}"}
+
+@mcp.tool()
+async def lookup_route(device: str, destination: str, max_age_seconds: int = 60) -> Dict[str, Any]:
+    """
+    Longest-prefix match of a destination in a device's routing table
+    ("how does R2 forward 10.0.13.5?").
+
+    Args:
+        device: Hostname in inventory.
+        destination: IPv4 or IPv6 address.
+        max_age_seconds: Maximum age of the cached table before it is re-fetched.
+
+    Returns:
+        Dict: {"device", "destination", "prefix", "prefixlen", "routes": [...], "age_s"} or {"error": ...}
+    """
+    try:
+        hosts = load_inventory().get("hosts", {})
+        if device not in hosts:
+            return {"error": f"Device {device} not in inventory."}
+        result = await route_snapshot.refresh(hosts, devices=[device], max_age=max_age_seconds)
+        if device in result["errors"]:
+            return {"error": f"Could not fetch routes from {device}: {result['errors'][device]}"}
+        match = route_snapshot.table(device).lookup(destination)
+        if match is None:
+            return {"device": device, "destination": destination, "prefix": None, "routes": [],
+                    "age_s": route_snapshot.age(device)}
+        return {"device": device, "destination": destination, **match, "age_s": route_snapshot.age(device)}
+    except ValueError as e:
+        return {"error": f"Invalid destination: {str(e)}"}
+    except Exception as e:
+        return {"error": f"Error looking up route: {str(e)}"}
+
+@mcp.tool()
+async def trace_forwarding_path(source_device: str, destination: str, max_hops: int = 32,
+                                max_age_seconds: int = 60) -> Dict[str, Any]:
+    """
+    Hop-by-hop forwarding path from a device to a destination, computed from
+    the routing tables alone (no pings). Next hops are mapped to devices with
+    the inventory interface addresses.
+
+    Args:
+        source_device: Hostname in inventory to start from.
+        destination: IPv4 or IPv6 address.
+        max_hops: Stop after this many hops.
+        max_age_seconds: Maximum age of cached tables before they are re-fetched.
+
+    Returns:
+        Dict: {"result": delivered|no_route|loop|unresolved_next_hop|no_table|max_hops,
+               "hops": [{"device", "prefix", "protocol", "next_hop", "interface"}], "errors": {...}}
+    """
+    try:
+        hosts = load_inventory().get("hosts", {})
+        if source_device not in hosts:
+            return {"error": f"Device {source_device} not in inventory."}
+        destination = str(ipaddress.ip_address(destination))
+        # Every stale table is fetched in one concurrent pass; the walk itself is in memory
+        refreshed = await route_snapshot.refresh(hosts, max_age=max_age_seconds)
+        result = route_snapshot.trace(hosts, source_device, destination, max_hops=max_hops)
+        result["errors"] = refreshed["errors"]
+        return result
+    except ValueError as e:
+        return {"error": f"Invalid destination: {str(e)}"}
+    except Exception as e:
+        return {"error": f"Error tracing path: {str(e)}"}
+
 @mcp.prompt()
 def monitor_critical_links() -> str:
     """Workflow: Monitor network health."""
     return """
 1. Call `librarian` to get `topology/definition`.
 2. Call `detect_link_failures`.
-3. If failures found, Plan fix.
+3. Call `detect_drift` to compare live state with the Source of Truth.
+4. For path questions, use `trace_forwarding_path` / `lookup_route` instead of repeated pings.
+5. If failures or drift found, Plan fix.
     """
 
+register_transcript_tool(mcp)
+instrument_server(mcp, "observer")
+
 if __name__ == "__main__":
     mcp.run()
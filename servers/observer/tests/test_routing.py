@@ -0,0 +1,109 @@
+import functools
+import ipaddress
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../../../"))
+from servers.observer.routing import PrefixTrie, RouteTable
+
+network = functools.lru_cache(maxsize=None)(lambda prefix: ipaddress.ip_network(prefix, strict=False))
+
+def brute_force(routes, destination):
+    """Longest-prefix match by scanning every route."""
+    address = ipaddress.ip_address(destination)
+    matching = [r for r in routes if network(r["prefix"]).version == address.version
+                and address in network(r["prefix"])]
+    if not matching:
+        return None
+    best = max(network(r["prefix"]).prefixlen for r in matching)
+    return [r for r in matching if network(r["prefix"]).prefixlen == best]
+
+def route(prefix, next_hop=None):
+    return {"prefix": prefix, "next_hop": next_hop}
+
+def test_empty_table_has_no_match():
+    assert RouteTable([]).lookup("10.0.0.1") is None
+
+def test_default_route_matches_everything():
+    table = RouteTable([route("0.0.0.0/0", "192.0.2.1")])
+    for destination in ("0.0.0.0", "10.1.2.3", "255.255.255.255"):
+        match = table.lookup(destination)
+        assert match["prefixlen"] == 0
+        assert match["routes"][0]["next_hop"] == "192.0.2.1"
+
+def test_host_route_wins_over_covering_prefixes():
+    table = RouteTable([route("0.0.0.0/0", "a"), route("10.0.0.0/8", "b"),
+                        route("10.0.0.0/24", "c"), route("10.0.0.5/32", "d")])
+    assert table.lookup("10.0.0.5")["routes"][0]["next_hop"] == "d"
+    assert table.lookup("10.0.0.6")["routes"][0]["next_hop"] == "c"
+    assert table.lookup("10.9.0.1")["routes"][0]["next_hop"] == "b"
+    assert table.lookup("11.0.0.1")["routes"][0]["next_hop"] == "a"
+
+def test_host_route_at_the_end_of_the_address_space():
+    table = RouteTable([route("255.255.255.255/32", "x"), route("255.255.255.254/31", "y")])
+    assert table.lookup("255.255.255.255")["prefixlen"] == 32
+    assert table.lookup("255.255.255.254")["prefixlen"] == 31
+    assert table.lookup("255.255.255.253") is None
+
+def test_overlapping_prefixes_inserted_in_any_order():
+    prefixes = ["10.0.0.0/8", "10.128.0.0/9", "10.0.0.0/16", "10.0.128.0/17", "10.0.0.0/24", "10.0.0.128/25"]
+    probes = ["10.0.0.1", "10.0.0.200", "10.0.200.1", "10.200.0.1", "10.1.0.1", "10.127.255.255"]
+    for order in (prefixes, prefixes[::-1], sorted(prefixes, key=lambda p: p[-2:])):
+        routes = [route(p, p) for p in order]
+        table = RouteTable(routes)
+        for probe in probes:
+            assert table.lookup(probe)["routes"] == brute_force(routes, probe)
+
+def test_ecmp_routes_accumulate_on_one_prefix():
+    table = RouteTable([route("10.0.0.0/24", "a"), route("10.0.0.0/24", "b")])
+    assert len(table) == 1
+    assert [r["next_hop"] for r in table.lookup("10.0.0.9")["routes"]] == ["a", "b"]
+
+def test_non_canonical_prefix_is_masked():
+    table = RouteTable([route("10.0.0.77/24", "a")])
+    assert table.lookup("10.0.0.1")["prefixlen"] == 24
+
+def test_invalid_routes_are_counted_not_inserted():
+    table = RouteTable([route("not-a-prefix"), {"next_hop": "x"}, route("10.0.0.0/24")])
+    assert table.invalid == 2
+    assert len(table) == 1
+
+def test_address_families_are_separate():
+    table = RouteTable([route("::/0", "v6"), route("2001:db8::/32", "doc"), route("10.0.0.0/8", "v4")])
+    assert table.lookup("2001:db8::1")["routes"][0]["next_hop"] == "doc"
+    assert table.lookup("2001:db9::1")["prefixlen"] == 0
+    assert table.lookup("10.1.1.1")["routes"][0]["next_hop"] == "v4"
+    assert table.lookup("192.0.2.1") is None
+
+def test_ipv6_host_route():
+    table = RouteTable([route("2001:db8::1/128", "host"), route("2001:db8::/64", "lan")])
+    assert table.lookup("2001:db8::1")["prefixlen"] == 128
+    assert table.lookup("2001:db8::2")["prefixlen"] == 64
+
+def test_trie_size_counts_distinct_prefixes():
+    trie = PrefixTrie(32)
+    for prefix in ("10.0.0.0/8", "10.0.0.0/8", "10.0.0.0/24", "0.0.0.0/0"):
+        trie.insert(ipaddress.ip_network(prefix), route(prefix))
+    assert trie.size == 3
+
+@pytest.mark.parametrize("seed", range(5))
+def test_random_tables_match_brute_force(seed):
+    rng = random.Random(seed)
+    routes = []
+    for _ in range(300):
+        length = rng.choice([0, 8, 12, 16, 20, 24, 28, 30, 31, 32])
+        address = ipaddress.ip_address(rng.getrandbits(8) << 24 | rng.getrandbits(24) & 0x00FF00FF)
+        routes.append(route(str(ipaddress.ip_network(f"{address}/{length}", strict=False)), len(routes)))
+    table = RouteTable(routes)
+    for _ in range(500):
+        probe = str(ipaddress.ip_address(rng.getrandbits(32)))
+        if rng.random() < 0.5:
+            # Probe inside a known prefix so deep matches are exercised too
+            net = network(rng.choice(routes)["prefix"])
+            probe = str(net.network_address + rng.randrange(net.num_addresses))
+        expected = brute_force(routes, probe)
+        match = table.lookup(probe)
+        assert (match["routes"] if match else None) == expected
@@ -0,0 +1,70 @@
+from mcp.server.fastmcp import FastMCP
+from typing import Dict, List, Optional
+import importlib
+import logging
+import sys
+import os
+sys.path.append(os.path.join(os.path.dirname(__file__), "../../"))
+from shared.metrics import instrument_server
+
+logger = logging.getLogger(__name__)
+
+# Every tool set the toolbox can host, in mount order.
+SERVER_MODULES: Dict[str, str] = {
+    "librarian": "servers.librarian.server",
+    "ipam": "servers.ipam.server",
+    "verifier": "servers.verifier.src.server",
+    "deployer": "servers.deployer.server",
+    "observer": "servers.observer.server",
+    "auditor": "servers.auditor.server",
+    "traffic_gen": "servers.traffic_gen.server",
+}
+
+def mount(host: FastMCP, server: FastMCP) -> None:
+    """
+    Copies the tools, resources and prompts registered on `server` onto `host`.
+    The underlying functions are shared, so module-level state (inventory cache,
+    console pool, IPAM DB path...) is the same object for every mounted server.
+    """
+    for tool in server._tool_manager.list_tools():
+        if host._tool_manager.get_tool(tool.name) is not None:
+            # Shared tools (configure_profiling, list_profiles, get_transcript) are mounted once
+            continue
+        host.add_tool(
+            tool.fn,
+            name=tool.name,
+            title=tool.title,
+            description=tool.description,
+            annotations=tool.annotations,
+        )
+    for resource in server._resource_manager.list_resources():
+        host.add_resource(resource)
+    for template in server._resource_manager.list_templates():
+        host._resource_manager._templates[template.uri_template] = template
+    for prompt in server._prompt_manager.list_prompts():
+        host.add_prompt(prompt)
+
+def build_toolbox(names: Optional[List[str]] = None) -> FastMCP:
+    """
+    Builds a single FastMCP server exposing the selected tool sets.
+
+    Args:
+        names: Server names from SERVER_MODULES (default: all of them).
+    """
+    host = FastMCP("Network Toolbox")
+    for name in names or SERVER_MODULES:
+        if name not in SERVER_MODULES:
+            raise ValueError(f"Unknown server '{name}'. Available: {', '.join(SERVER_MODULES)}")
+        module = importlib.import_module(SERVER_MODULES[name])
+        mount(host, module.mcp)
+        logger.debug("Mounted %s", name)
+    # Mounted tools are already timed; this adds metrics://toolbox over all of them
+    instrument_server(host, "toolbox")
+    return host
+
+# MCP_TOOLBOX_SERVERS=librarian,ipam restricts the toolbox to a subset
+_selected = [n.strip() for n in os.environ.get("MCP_TOOLBOX_SERVERS", "").split(",") if n.strip()]
+mcp = build_toolbox(_selected or None)
+
+if __name__ == "__main__":
+    mcp.run()
@@ -1,24 +1,52 @@
 from mcp.server.fastmcp import FastMCP
 from typing import Dict, Any
+import re
 import time
 import sys
 import os
 import threading
 
 sys.path.append(os.path.join(os.path.dirname(__file__), "../../"))
-from shared.gns3_utils import GNS3Console, load_inventory
+from shared.gns3_utils import load_inventory
+from shared.console_pool import console_pool, console_address
+from shared.metrics import instrument_server
+from shared.responses import register_transcript_tool, with_transcript
 
 mcp = FastMCP("TrafficGen Server")
 
+# iperf3 end-of-test lines: "[  5]   0.00-5.00   sec  5.96 MBytes  10.0 Mbits/sec    0   sender"
+# (per stream, then [SUM] with -P; the last line for each role wins)
+IPERF_SUMMARY_RE = re.compile(
+    r"^\[\s*(?:\d+|SUM)\]\s+[\d.]+-([\d.]+)\s+sec\s+([\d.]+)\s+([KMGT]?)Bytes\s+([\d.]+)\s+([KMGT]?)bits/sec"
+    r"(?:\s+(\d+))?.*?\b(sender|receiver)\s*$",
+    re.MULTILINE,
+)
+# iperf3 prints Bytes in powers of 1024 and bits/sec in powers of 1000
+MBYTES = {"": 1 / 2**20, "K": 1 / 1024, "M": 1, "G": 1024, "T": 1024**2}
+MBITS = {"": 1e-6, "K": 1e-3, "M": 1, "G": 1e3, "T": 1e6}
+
+def parse_iperf3(output: str) -> Dict[str, Any]:
+    """iperf3 client output -> seconds, megabytes sent and Mbit/s at both ends, retransmits."""
+    summary: Dict[str, Any] = {}
+    for m in IPERF_SUMMARY_RE.finditer(output):
+        seconds, size, size_unit, rate, rate_unit, retransmits, role = m.groups()
+        summary[f"{role}_mbps"] = round(float(rate) * MBITS[rate_unit], 3)
+        if role == "sender":
+            summary["seconds"] = float(seconds)
+            summary["transfer_mbytes"] = round(float(size) * MBYTES[size_unit], 3)
+            if retransmits is not None:
+                summary["retransmits"] = int(retransmits)
+    return summary
+
 def get_device_connection_info(device_name):
     inv = load_inventory()
     host_data = inv.get("hosts", {}).get(device_name)
     if not host_data:
         raise ValueError(f"Device {device_name} not found in inventory")
-    return host_data.get("hostname", "localhost"), host_data.get("port"), host_data.get("groups", [])
+    return (*console_address(host_data), host_data.get("groups", []))
 
 @mcp.tool()
-def start_traffic_server(host: str, port: int = 5201) -> str:
+async def start_traffic_server(host: str, port: int = 5201) -> str:
     """
     Starts an iperf3 server daemon on the specified host.
     
@@ -34,17 +62,15 @@ def start_traffic_server(host: str, port: int = 5201) -> str:
         if "linux" not in groups:
             return f"Error: {host} is not a Linux device. Cannot run iperf3."
             
-        console = GNS3Console(hostname, console_port, platform="linux")
-        console.connect()
-        # Run in background/daemon mode
-        console.send_command(f"iperf3 -s -p {port} -D") 
-        console.close()
+        async with console_pool.session(hostname, console_port, platform="linux") as console:
+            # Run in background/daemon mode
+            await console.send_command(f"iperf3 -s -p {port} -D")
         return f"Started iperf3 server on {host} (Port {port}) via daemon."
     except Exception as e:
         return f"Error starting server on {host}: {str(e)}"
 
 @mcp.tool()
-def run_traffic_test(client: str, server_ip: str, duration: int = 5, bandwidth: str = "10M") -> str:
+async def run_traffic_test(client: str, server_ip: str, duration: int = 5, bandwidth: str = "10M") -> Dict[str, Any]:
     """
     Runs an iperf3 client traffic test from a client device to a server IP.
     
@@ -55,25 +81,30 @@ def run_traffic_test(client: str, server_ip: str, duration: int = 5, bandwidth:
         bandwidth: Target bandwidth with unit (e.g., '10M', '1G').
         
     Returns:
-        str: The raw iperf3 output.
+        Dict: {"status": success|failed, "client", "server", "seconds", "transfer_mbytes",
+               "sender_mbps", "receiver_mbps", "retransmits", "transcript_id", "error"}.
+               The raw iperf3 output is fetched with get_transcript(transcript_id).
     """
     try:
         hostname, console_port, groups = get_device_connection_info(client)
         if "linux" not in groups:
-            return f"Error: {client} is not a Linux device."
+            return {"error": f"{client} is not a Linux device."}
             
-        console = GNS3Console(hostname, console_port, platform="linux")
-        console.connect()
-        
         # Build command
         # iperf3 -c <server> -t <duration> -b <bandwidth>
         cmd = f"iperf3 -c {server_ip} -t {duration} -b {bandwidth}"
-        output = console.send_command(cmd, wait_time=duration + 2)
-        console.close()
-        
-        return f"Traffic Test Result:\n{output}"
+        async with console_pool.session(hostname, console_port, platform="linux") as console:
+            output = await console.send_command(cmd, wait_time=duration + 2)
+
+        summary = {"status": "success", "client": client, "server": server_ip, **parse_iperf3(output)}
+        if "sender_mbps" not in summary:
+            # "iperf3: error - unable to connect to server", "iperf3: not found"...
+            reason = next((line.strip() for line in output.splitlines() if "iperf3:" in line),
+                          "no iperf3 summary in output")
+            summary.update(status="failed", error=reason)
+        return with_transcript(summary, output, "run_traffic_test", client)
     except Exception as e:
-        return f"Error running test on {client}: {str(e)}"
+        return {"error": f"Error running test on {client}: {str(e)}"}
 
 @mcp.resource("traffic://last_test_result")
 def get_last_result() -> str:
@@ -90,5 +121,8 @@ def stress_test_link() -> str:
 4. Validate bandwidth matches expectation.
 """
 
+register_transcript_tool(mcp)
+instrument_server(mcp, "traffic_gen")
+
 if __name__ == "__main__":
     mcp.run()
@@ -1,20 +1,95 @@
+import importlib
 import logging
 import tempfile
+import threading
+import time
 import os
 import shutil
 from typing import List, Dict, Any, Optional
-from pybatfish.client.session import Session
-# from pybatfish.datamodel import Answer
-from pybatfish.datamodel.flow import HeaderConstraints
 
 # Configure logging
 logging.getLogger("pybatfish").setLevel(logging.WARN)
+logger = logging.getLogger(__name__)
 
 class BatfishConnector:
-    def __init__(self, host: str = "localhost", ssl: bool = False):
+    """
+    Lazily-connected Batfish client.
+
+    The pybatfish Session (and pybatfish/pandas themselves) are only created
+    when a query first needs them. A session that has been idle for longer
+    than `health_check_interval`, or that failed its last query, is pinged
+    before reuse and rebuilt if Batfish went away in the meantime.
+
+    init_snapshot also switches the session's current snapshot, so uploads
+    hold `snapshot_lock` and questions name their snapshot explicitly.
+    """
+
+    def __init__(self, host: str = "localhost", port: int = 9996, ssl: bool = False,
+                 health_check_interval: float = 30.0):
         self.host = host
+        self.port = port
         self.ssl = ssl
-        self.bf = Session(host=host, ssl=ssl)
+        self.health_check_interval = health_check_interval
+        self._bf = None
+        self._last_ok = 0.0
+        self._lock = threading.Lock()
+        # Shared with DifferentialAnalyzer: one init_snapshot at a time per session
+        self.snapshot_lock = threading.Lock()
+
+    def _create_session(self):
+        # BATFISH_SESSION_FACTORY="module:callable" swaps in another Session
+        # implementation, e.g. the benchmark stand-in.
+        factory = os.environ.get("BATFISH_SESSION_FACTORY")
+        if factory:
+            module_name, _, attr = factory.partition(":")
+            Session = getattr(importlib.import_module(module_name), attr or "Session")
+        else:
+            # pybatfish pulls in pandas and friends; import it only here so
+            # host-only tools never pay for it.
+            from pybatfish.client.session import Session
+        return Session(host=self.host, port_v2=self.port, ssl=self.ssl)
+
+    def _is_healthy(self) -> bool:
+        try:
+            self._bf.get_component_versions()
+            return True
+        except Exception as e:
+            logger.warning("Batfish at %s:%s failed health check: %s", self.host, self.port, e)
+            return False
+
+    @property
+    def bf(self):
+        """The Batfish Session, connecting or reconnecting as needed."""
+        with self._lock:
+            now = time.monotonic()
+            if self._bf is not None and now - self._last_ok > self.health_check_interval:
+                if not self._is_healthy():
+                    self._bf = None
+            if self._bf is None:
+                self._bf = self._create_session()
+            self._last_ok = now
+            return self._bf
+
+    @property
+    def connected(self) -> bool:
+        return self._bf is not None
+
+    def mark_unhealthy(self) -> None:
+        """Forces a health check before the session is used again."""
+        self._last_ok = 0.0
+
+    def warm_up(self) -> threading.Thread:
+        """Connects to Batfish in a background thread so the first query doesn't wait for it."""
+        def _run():
+            try:
+                self.bf
+                logger.info("Batfish session to %s:%s ready", self.host, self.port)
+            except Exception as e:
+                logger.warning("Batfish warm-up failed (will retry on first use): %s", e)
+
+        thread = threading.Thread(target=_run, name="batfish-warmup", daemon=True)
+        thread.start()
+        return thread
 
     def verify_config(self, config_content: str, filename: str = "config.cfg", platform: str = "cisco") -> Dict[str, Any]:
         """
@@ -33,14 +108,16 @@ class BatfishConnector:
             # Initialize snapshot
             snapshot_name = f"snap_{os.urandom(4).hex()}"
             try:
-                self.bf.init_snapshot(temp_dir, name=snapshot_name, overwrite=True)
+                bf = self.bf
+                with self.snapshot_lock:
+                    bf.init_snapshot(temp_dir, name=snapshot_name, overwrite=True)
                 
                 # Get init issues (parsing errors, warnings)
                 # Parse warning status
-                parse_status = self.bf.q.fileParseStatus().answer().frame()
+                parse_status = bf.q.fileParseStatus().answer(snapshot=snapshot_name).frame()
                 
                 # Get specific parsing issues if any
-                init_issues = self.bf.q.initIssues().answer().frame()
+                init_issues = bf.q.initIssues().answer(snapshot=snapshot_name).frame()
                 
                 # Simplify results for consumption
                 results = {
@@ -53,6 +130,7 @@ class BatfishConnector:
                 return results
 
             except Exception as e:
+                self.mark_unhealthy()
                 return {
                     "status": "error",
                     "message": str(e)
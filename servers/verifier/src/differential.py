@@ -0,0 +1,218 @@
+import asyncio
+import hashlib
+import logging
+import os
+import tempfile
+import threading
+from collections import Counter, OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from shared.console_pool import console_pool, console_address, spread_by_host
+
+logger = logging.getLogger(__name__)
+
+# Candidate snapshots kept in Batfish; older ones are deleted
+CANDIDATE_KEEP = int(os.environ.get("BATFISH_CANDIDATE_KEEP", "4"))
+
+# Dispositions under which a flow reaches its destination (or leaves the network)
+SUCCESS_DISPOSITIONS = {"ACCEPTED", "DELIVERED_TO_SUBNET", "EXITS_NETWORK"}
+
+def fingerprint(configs: Dict[str, str]) -> str:
+    digest = hashlib.sha1()
+    for device in sorted(configs):
+        digest.update(device.encode() + b"\0" + configs[device].encode() + b"\0")
+    return digest.hexdigest()[:12]
+
+def apply_changes(base: Dict[str, str], changes: Dict[str, str], mode: str = "merge") -> Dict[str, str]:
+    """
+    Candidate configs: with mode 'merge' each change is appended to the device's
+    current config (IOS applies later lines on top, like pasting them in
+    config mode); with 'replace' it is the device's full new config.
+    """
+    candidate = dict(base)
+    for device, change in changes.items():
+        if mode == "merge" and device in base:
+            current = base[device].rstrip()
+            if current.endswith("\nend"):
+                # Nothing after 'end' belongs to the running config
+                current = current[:-4].rstrip()
+            candidate[device] = f"{current}\n!\n{change.strip()}\nend\n"
+        else:
+            candidate[device] = change
+    return candidate
+
+def _field(obj: Any, name: str) -> Any:
+    # Answer rows hold pybatfish objects, or plain dicts when read as JSON
+    return obj.get(name) if isinstance(obj, dict) else getattr(obj, name, None)
+
+def _dispositions(traces: Any) -> List[str]:
+    return sorted({str(_field(t, "disposition")) for t in traces or []})
+
+def summarize_flow(row: Dict[str, Any]) -> Dict[str, Any]:
+    """One differentialReachability row -> compact flow with before/after dispositions."""
+    flow = row.get("Flow")
+    before = _dispositions(row.get("Reference_Traces"))
+    after = _dispositions(row.get("Snapshot_Traces"))
+    was_ok = bool(SUCCESS_DISPOSITIONS.intersection(before))
+    is_ok = bool(SUCCESS_DISPOSITIONS.intersection(after))
+    summary = {
+        "ingress": _field(flow, "ingressNode"),
+        "src": _field(flow, "srcIp"),
+        "dst": _field(flow, "dstIp"),
+        "protocol": _field(flow, "ipProtocol"),
+        "before": before,
+        "after": after,
+        "change": "broken" if was_ok and not is_ok else "fixed" if is_ok and not was_ok else "changed",
+    }
+    if _field(flow, "dstPort"):
+        summary["dst_port"] = _field(flow, "dstPort")
+    return summary
+
+def summarize_filter_change(row: Dict[str, Any]) -> Dict[str, Any]:
+    """One compareFilters row -> the filter line whose decision differs between snapshots."""
+    return {
+        "node": row.get("Node"),
+        "filter": row.get("Filter_Name"),
+        "line": row.get("Line_Content"),
+        "action": row.get("Line_Action"),
+        "reference_line": row.get("Reference_Line_Content"),
+    }
+
+async def collect_running_configs(hosts: Dict[str, Dict[str, Any]], devices: Optional[List[str]] = None,
+                                  max_age: float = 300.0, concurrency: int = 32) -> Tuple[Dict[str, str], Dict[str, str]]:
+    """
+    Running configs of the IOS devices in the inventory, fetched concurrently
+    (up to `concurrency` consoles per GNS3 compute host).
+    Results are kept by the console pool for `max_age` seconds and dropped as
+    soon as the deployer reconfigures a device. Returns (configs, errors).
+    """
+    selected = {name: data for name, data in hosts.items()
+                if "linux" not in data.get("groups", []) and (not devices or name in devices)}
+    errors = {name: "No console port in inventory" for name, data in selected.items() if not data.get("port")}
+    names = spread_by_host([name for name in selected if name not in errors], selected)
+    sem = asyncio.Semaphore(console_pool.fleet_limit((console_address(selected[n])[0] for n in names), concurrency))
+
+    async def fetch(name):
+        async with sem:
+            return await console_pool.read(*console_address(selected[name]), "show running-config",
+                                           lambda console: console.get_running_config(), ttl=max_age)
+
+    results = await asyncio.gather(*(fetch(name) for name in names), return_exceptions=True)
+    configs = {}
+    for name, res in zip(names, results):
+        if isinstance(res, Exception):
+            errors[name] = str(res) or type(res).__name__
+        else:
+            configs[name] = res
+    return configs, errors
+
+class DifferentialAnalyzer:
+    """
+    Base/candidate snapshot pair for "what does this change break?" questions.
+
+    The base snapshot is uploaded once per distinct set of current configs and
+    reused while they stay the same; each candidate is the base with the
+    proposed changes applied, also keyed by content so a repeated question
+    costs no upload. Snapshots are forgotten when the Batfish session is rebuilt.
+    """
+
+    def __init__(self, connector, keep: int = CANDIDATE_KEEP):
+        self.connector = connector
+        self.keep = keep
+        self._lock = threading.Lock()
+        self._session_id = None
+        self._base: Optional[Tuple[str, str]] = None
+        self._candidates: "OrderedDict[str, str]" = OrderedDict()
+
+    def _check_session(self, bf) -> None:
+        if id(bf) != self._session_id:
+            self._session_id = id(bf)
+            self._base = None
+            self._candidates.clear()
+
+    def _upload(self, bf, configs: Dict[str, str], name: str) -> None:
+        with tempfile.TemporaryDirectory() as temp_dir:
+            configs_dir = os.path.join(temp_dir, "configs")
+            os.makedirs(configs_dir)
+            for device, text in configs.items():
+                with open(os.path.join(configs_dir, f"{device}.cfg"), "w") as f:
+                    f.write(text)
+            with self.connector.snapshot_lock:
+                bf.init_snapshot(temp_dir, name=name, overwrite=True)
+
+    def _delete(self, bf, name: str) -> None:
+        try:
+            bf.delete_snapshot(name)
+        except Exception as e:
+            logger.debug("Could not delete Batfish snapshot %s: %s", name, e)
+
+    def _base_snapshot(self, bf, configs: Dict[str, str]) -> Tuple[str, bool]:
+        fp = fingerprint(configs)
+        if self._base and self._base[0] == fp:
+            return self._base[1], True
+        name = f"base_{fp}"
+        self._upload(bf, configs, name)
+        if self._base:
+            self._delete(bf, self._base[1])
+        self._base = (fp, name)
+        return name, False
+
+    def _candidate_snapshot(self, bf, configs: Dict[str, str]) -> Tuple[str, bool]:
+        fp = fingerprint(configs)
+        if fp in self._candidates:
+            self._candidates.move_to_end(fp)
+            return self._candidates[fp], True
+        name = f"candidate_{fp}"
+        self._upload(bf, configs, name)
+        self._candidates[fp] = name
+        while len(self._candidates) > self.keep:
+            _, old = self._candidates.popitem(last=False)
+            self._delete(bf, old)
+        return name, False
+
+    def analyze(self, base_configs: Dict[str, str], changes: Dict[str, str], mode: str = "merge",
+                headers: Optional[Dict[str, str]] = None, compare_acls: bool = True,
+                max_flows: int = 50) -> Dict[str, Any]:
+        """
+        Runs differentialReachability (and compareFilters) between the base and
+        the candidate. Blocking; call it from a worker thread.
+        """
+        with self._lock:
+            try:
+                bf = self.connector.bf
+                self._check_session(bf)
+                base, base_reused = self._base_snapshot(bf, base_configs)
+                candidate, candidate_reused = self._candidate_snapshot(bf, apply_changes(base_configs, changes, mode))
+
+                changed_files = {f"{device}.cfg" for device in changes}
+                parse = bf.q.fileParseStatus().answer(snapshot=candidate).frame().to_dict(orient="records")
+                parse_errors = [{"file": r.get("File_Name"), "status": r.get("Status")} for r in parse
+                                if r.get("Status") != "PASSED"
+                                and os.path.basename(str(r.get("File_Name"))) in changed_files]
+
+                question = bf.q.differentialReachability(headers=headers) if headers \
+                    else bf.q.differentialReachability()
+                rows = question.answer(snapshot=candidate, reference_snapshot=base).frame().to_dict(orient="records")
+                flows = [summarize_flow(r) for r in rows]
+
+                acl_changes = []
+                if compare_acls:
+                    rows = bf.q.compareFilters().answer(snapshot=candidate, reference_snapshot=base) \
+                        .frame().to_dict(orient="records")
+                    acl_changes = [summarize_filter_change(r) for r in rows]
+
+                # Broken flows first: they are what the caller is asking about
+                flows.sort(key=lambda f: {"broken": 0, "changed": 1, "fixed": 2}[f["change"]])
+                return {
+                    "status": "success",
+                    "snapshots": {"base": base, "candidate": candidate,
+                                  "base_reused": base_reused, "candidate_reused": candidate_reused},
+                    "parse_errors": parse_errors,
+                    "flow_counts": dict(Counter(f["change"] for f in flows)),
+                    "flows": flows[:max_flows],
+                    "acl_changes": acl_changes[:max_flows],
+                    "truncated": len(flows) > max_flows or len(acl_changes) > max_flows,
+                }
+            except Exception as e:
+                self.connector.mark_unhealthy()
+                return {"status": "error", "message": str(e)}
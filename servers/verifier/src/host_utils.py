@@ -1,26 +1,71 @@
 import yaml
 import re
-from typing import Dict, Any, List
+import ipaddress
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Any, List, Optional, Tuple
+
+# libyaml is several times faster when available
+_YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# "<address>/<prefix>" with a numeric prefix; the address itself is checked by ipaddress
+CIDR_RE = re.compile(r"^([0-9A-Fa-f.:]+)/([0-9]{1,3})$")
+
+# Batches at least this large are validated in a process pool (one file takes
+# ~0.2 ms with libyaml, so smaller batches are cheaper than the pool round trip)
+PROCESS_POOL_THRESHOLD = int(os.environ.get("HOST_VERIFY_POOL_THRESHOLD", "256"))
+_pool: Optional[ProcessPoolExecutor] = None
+
+def parse_cidr(value: Any) -> Optional[ipaddress._BaseAddress]:
+    """'10.0.0.5/24' -> IPv4Interface; None for anything else (bare address, bad prefix...)."""
+    if not CIDR_RE.match(str(value)):
+        return None
+    try:
+        return ipaddress.ip_interface(str(value))
+    except ValueError:
+        return None
+
+def _parse_address(value: Any) -> Optional[ipaddress._BaseAddress]:
+    try:
+        return ipaddress.ip_address(str(value))
+    except ValueError:
+        return None
+
+def _check_gateways(addresses: List[Dict[str, Any]], gateways: List[Dict[str, Any]], errors: List[str]) -> None:
+    """A gateway must sit inside a subnet of its interface (or of the host, when the interface is unknown)."""
+    for gw in gateways:
+        gateway = ipaddress.ip_address(gw["gateway"])
+        candidates = [ipaddress.ip_interface(a["address"]) for a in addresses
+                      if gw["interface"] is None or a["interface"] == gw["interface"]]
+        candidates = [c for c in candidates if c.version == gateway.version]
+        if candidates and not any(gateway in c.network for c in candidates):
+            subnets = ", ".join(sorted({str(c.network) for c in candidates}))
+            errors.append(f"Interface {gw['interface'] or '?'}: gateway {gateway} is outside its subnet ({subnets})")
 
 def validate_netplan(config_content: str) -> Dict[str, Any]:
     """
     Validates a Netplan YAML configuration for basic structure and common errors.
+    Also returns the addresses and gateways found, for cross-file checks.
     """
     try:
-        data = yaml.safe_load(config_content)
+        data = yaml.load(config_content, Loader=_YAML_LOADER)
     except yaml.YAMLError as e:
         return {"valid": False, "errors": [f"YAML syntax error: {str(e)}"]}
 
     if not isinstance(data, dict) or 'network' not in data:
         return {"valid": False, "errors": ["Missing top-level 'network' key"]}
 
-    network = data.get('network', {})
+    network = data.get('network') or {}
+    if not isinstance(network, dict):
+        return {"valid": False, "errors": ["'network' must be a mapping"]}
     version = network.get('version')
-    
+
     errors = []
+    addresses: List[Dict[str, Any]] = []
+    gateways: List[Dict[str, Any]] = []
     if version not in [2]:
         errors.append(f"Unsupported or missing network version: {version}. Expected 2.")
-    
+
     # Check for known renderer
     renderer = network.get('renderer')
     if renderer and renderer not in ['networkd', 'NetworkManager']:
@@ -28,27 +73,53 @@ def validate_netplan(config_content: str) -> Dict[str, Any]:
 
     # Check ethernets
     ethernets = network.get('ethernets', {})
-    if ethernets:
+    if ethernets and not isinstance(ethernets, dict):
+        errors.append("'ethernets' must be a mapping of interface names")
+    elif ethernets:
         for name, cfg in ethernets.items():
             if not isinstance(cfg, dict):
                  errors.append(f"Invalid configuration for interface {name}")
                  continue
-            
+
             # Check addresses
-            addresses = cfg.get('addresses', [])
-            if addresses:
-                if not isinstance(addresses, list):
+            iface_addresses = cfg.get('addresses', [])
+            if iface_addresses:
+                if not isinstance(iface_addresses, list):
                      errors.append(f"Interface {name}: addresses must be a list")
                 else:
-                    for addr in addresses:
-                        # Basic CIDR regex check
-                        if not re.match(r'^([0-9]{1,3}\.){3}[0-9]{1,3}/[0-9]{1,2}$', str(addr)) and not re.match(r'^[a-fA-F0-9:]+/[0-9]{1,3}$', str(addr)):
-                             # weak check for v6
-                             errors.append(f"Interface {name}: Invalid IP address format '{addr}'")
+                    for addr in iface_addresses:
+                        parsed = parse_cidr(addr)
+                        if parsed is None:
+                            errors.append(f"Interface {name}: Invalid IP address format '{addr}'")
+                        else:
+                            addresses.append({"interface": name, "address": str(parsed)})
 
+            for key in ('gateway4', 'gateway6'):
+                if key in cfg:
+                    gateway = _parse_address(cfg[key])
+                    if gateway is None:
+                        errors.append(f"Interface {name}: Invalid {key} '{cfg[key]}'")
+                    else:
+                        gateways.append({"interface": name, "gateway": str(gateway)})
+            routes = cfg.get('routes') or []
+            if not isinstance(routes, list):
+                errors.append(f"Interface {name}: routes must be a list")
+                routes = []
+            for route in routes:
+                if not isinstance(route, dict) or 'via' not in route:
+                    continue
+                gateway = _parse_address(route['via'])
+                if gateway is None:
+                    errors.append(f"Interface {name}: Invalid route via '{route['via']}'")
+                elif route.get('on-link') is not True:
+                    gateways.append({"interface": name, "gateway": str(gateway)})
+
+    _check_gateways(addresses, gateways, errors)
     return {
         "valid": len(errors) == 0,
-        "errors": errors
+        "errors": errors,
+        "addresses": addresses,
+        "gateways": gateways,
     }
 
 def validate_interfaces_file(config_content: str) -> Dict[str, Any]:
@@ -56,37 +127,135 @@ def validate_interfaces_file(config_content: str) -> Dict[str, Any]:
     Basic check for /etc/network/interfaces style syntax
     """
     errors = []
+    addresses: List[Dict[str, Any]] = []
+    gateways: List[Dict[str, Any]] = []
     lines = config_content.splitlines()
     has_auto = False
     has_iface = False
-    
+    # Current "iface" stanza: [name, method, address line, netmask line]
+    stanza: Optional[List[Any]] = None
+
+    def close_stanza():
+        if stanza is None:
+            return
+        name, method, address, netmask = stanza
+        if method == "static" and address is None:
+            errors.append(f"Interface {name}: static method without an address")
+        if address is None:
+            return
+        value = address if "/" in address or netmask is None else f"{address}/{netmask}"
+        try:
+            parsed = ipaddress.ip_interface(value)
+        except ValueError:
+            errors.append(f"Interface {name}: Invalid address '{value}'")
+            return
+        if "/" not in address and netmask is None and parsed.version == 4:
+            errors.append(f"Interface {name}: address {address} has no prefix length or netmask")
+            return
+        addresses.append({"interface": name, "address": str(parsed)})
+
     for i, line in enumerate(lines):
         line = line.strip()
         if not line or line.startswith('#'):
             continue
-        
+
         parts = line.split()
         if parts[0] == 'auto':
             has_auto = True
         elif parts[0] == 'iface':
             has_iface = True
+            close_stanza()
+            stanza = None
             if len(parts) < 4:
                 errors.append(f"Line {i+1}: Incomplete iface definition")
             elif parts[2] not in ['inet', 'inet6']:
                  errors.append(f"Line {i+1}: Invalid address family '{parts[2]}'")
-    
+            else:
+                stanza = [parts[1], parts[3], None, None]
+        elif stanza is not None and len(parts) >= 2:
+            if parts[0] == 'address':
+                stanza[2] = parts[1]
+            elif parts[0] == 'netmask':
+                stanza[3] = parts[1]
+            elif parts[0] == 'gateway':
+                gateway = _parse_address(parts[1])
+                if gateway is None:
+                    errors.append(f"Line {i+1}: Invalid gateway '{parts[1]}'")
+                else:
+                    gateways.append({"interface": stanza[0], "gateway": str(gateway)})
+    close_stanza()
+
     if not has_auto and not has_iface:
         errors.append("File does not appear to contain valid interface definitions")
 
+    _check_gateways(addresses, gateways, errors)
     return {
         "valid": len(errors) == 0,
-        "errors": errors
+        "errors": errors,
+        "addresses": addresses,
+        "gateways": gateways,
     }
 
+def detect_config_type(config_content: str) -> str:
+    """'netplan' for YAML with a top-level network key, 'interfaces' otherwise."""
+    for line in config_content.splitlines():
+        stripped = line.strip()
+        if not stripped or stripped.startswith('#'):
+            continue
+        return "netplan" if stripped.startswith("network:") else "interfaces"
+    return "interfaces"
+
 def verify_host_config(config_content: str, config_type: str = "netplan") -> Dict[str, Any]:
+    if config_type.lower() == "auto":
+        config_type = detect_config_type(config_content)
     if config_type.lower() == "netplan":
         return validate_netplan(config_content)
     elif config_type.lower() in ["interfaces", "debian"]:
         return validate_interfaces_file(config_content)
     else:
         return {"valid": False, "errors": [f"Unknown config type: {config_type}"]}
+
+def _verify_one(content: str, config_type: str) -> Dict[str, Any]:
+    # One unexpected file shape must not lose the results of the rest of the batch
+    try:
+        return verify_host_config(content, config_type)
+    except Exception as e:
+        return {"valid": False, "errors": [f"Could not validate file: {type(e).__name__}: {e}"]}
+
+def _verify_chunk(items: List[Tuple[str, str, str]]) -> List[Tuple[str, Dict[str, Any]]]:
+    # Module-level so it can be sent to worker processes
+    return [(name, _verify_one(content, config_type)) for name, content, config_type in items]
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=os.cpu_count() or 2)
+    return _pool
+
+def verify_many(configs: Dict[str, str], config_type: str = "auto",
+                executor: Optional[Any] = None) -> Dict[str, Dict[str, Any]]:
+    """
+    Validates many files; large batches are split into chunks across the
+    process pool (or `executor`), one chunk per worker round trip.
+    """
+    items = [(name, content, config_type) for name, content in configs.items()]
+    if executor is None and (len(items) < PROCESS_POOL_THRESHOLD or (os.cpu_count() or 1) < 2):
+        return dict(_verify_chunk(items))
+    pool = executor or _get_pool()
+    workers = getattr(pool, "_max_workers", None) or os.cpu_count() or 2
+    size = max(1, -(-len(items) // (workers * 4)))
+    chunks = [items[i:i + size] for i in range(0, len(items), size)]
+    results: Dict[str, Dict[str, Any]] = {}
+    for chunk in pool.map(_verify_chunk, chunks):
+        results.update(chunk)
+    return results
+
+def cross_file_checks(results: Dict[str, Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """Addresses used more than once across the batch (or twice in one file)."""
+    owners: Dict[str, List[str]] = {}
+    for name, result in results.items():
+        for entry in result.get("addresses", []):
+            ip = str(ipaddress.ip_interface(entry["address"]).ip)
+            owners.setdefault(ip, []).append(f"{name}:{entry['interface']}")
+    return [{"kind": "duplicate_address", "address": ip, "used_by": users}
+            for ip, users in sorted(owners.items()) if len(users) > 1]
@@ -1,30 +1,43 @@
 from mcp.server.fastmcp import FastMCP
 from typing import Dict, Any, Optional
+import asyncio
 import logging
+import os
+import sys
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "../../../"))
+from shared.metrics import instrument_server, metrics
+from shared.gns3_utils import load_inventory
 
 # Relative imports if running as package, but for direct script execution we might need path hacks
 # or just assume running from root with `python -m src.server`
 try:
     from .batfish_utils import BatfishConnector
-    from .host_utils import verify_host_config as verify_host
+    from .differential import DifferentialAnalyzer, collect_running_configs
+    from .host_utils import verify_host_config as verify_host, verify_many, cross_file_checks
 except ImportError:
     # Fallback for when running directly or if package structure varies
     import sys
     import os
     sys.path.append(os.path.dirname(os.path.abspath(__file__)))
     from batfish_utils import BatfishConnector
-    from host_utils import verify_host_config as verify_host
+    from differential import DifferentialAnalyzer, collect_running_configs
+    from host_utils import verify_host_config as verify_host, verify_many, cross_file_checks
 
 # Initialize FastMCP
 mcp = FastMCP("Network Verifier")
 
-# Initialize Batfish Connector
-# TODO: Get host from environment variable
-BATFISH_HOST = "localhost"
-bf_connector = BatfishConnector(host=BATFISH_HOST)
+# Batfish Connector. No network I/O happens here: the session is created on
+# the first Batfish query, so host checks work even when Batfish is down.
+BATFISH_HOST = os.environ.get("BATFISH_HOST", "localhost")
+BATFISH_PORT = int(os.environ.get("BATFISH_PORT", "9996"))
+# Set BATFISH_WARMUP=1 to connect in the background as soon as the server starts
+BATFISH_WARMUP = os.environ.get("BATFISH_WARMUP", "0").lower() in ("1", "true", "yes")
+
+bf_connector = BatfishConnector(host=BATFISH_HOST, port=BATFISH_PORT)
+differential = DifferentialAnalyzer(bf_connector)
 
 @mcp.tool()
-def verify_device_config(config_content: str, hostname: str = "device1", platform: str = "cisco_ios") -> str:
+async def verify_device_config(config_content: str, hostname: str = "device1", platform: str = "cisco_ios") -> str:
     """
     Verifies a network device configuration using Batfish.
     
@@ -49,7 +62,11 @@ def verify_device_config(config_content: str, hostname: str = "device1", platfor
         
         filename = f"{hostname}{ext}"
         
-        results = bf_connector.verify_config(config_content, filename=filename, platform=platform)
+        # Batfish calls block; keep them off the event loop so host checks stay responsive
+        with metrics.span("batfish.verify"):
+            results = await asyncio.to_thread(
+                bf_connector.verify_config, config_content, filename=filename, platform=platform
+            )
         
         # Format output for the user
         if results["status"] == "error":
@@ -96,6 +113,7 @@ def verify_host_config(config_content: str, config_type: str = "netplan") -> str
         config_type: The format of the configuration. 
                      - 'netplan': For YAML netplan files.
                      - 'interfaces': For /etc/network/interfaces style.
+                     - 'auto': Detect from the content.
     
     Returns:
         str: 'Configuration is VALID' or specific syntax error details.
@@ -108,5 +126,106 @@ def verify_host_config(config_content: str, config_type: str = "netplan") -> str
         errors = "\n".join([f"- {e}" for e in result["errors"]])
         return f"Configuration ({config_type}) is INVALID:\n{errors}"
 
+@mcp.tool()
+async def verify_host_configs(configs: Dict[str, str], config_type: str = "auto") -> Dict[str, Any]:
+    """
+    Verifies many host network configurations in one call and checks them
+    against each other.
+
+    Large batches are validated in a process pool off the event loop. On top
+    of the per-file checks, addresses configured on more than one host are
+    reported, and every gateway must lie inside a subnet of its interface.
+
+    Args:
+        configs: Mapping of host (or file) name -> configuration text.
+        config_type: 'netplan', 'interfaces' or 'auto' (detected per file).
+
+    Returns:
+        Dict: {"summary": {"files", "valid", "invalid", "duplicate_addresses"},
+               "invalid": {name: [errors]}, "cross_file": [{"kind", "address", "used_by"}]}
+    """
+    try:
+        with metrics.span("host.verify_bulk"):
+            results = await asyncio.to_thread(verify_many, configs, config_type)
+            cross = cross_file_checks(results)
+        invalid = {name: r["errors"] for name, r in results.items() if not r["valid"]}
+        return {
+            "summary": {
+                "files": len(results),
+                "valid": len(results) - len(invalid),
+                "invalid": len(invalid),
+                "duplicate_addresses": len(cross),
+            },
+            "invalid": invalid,
+            "cross_file": cross,
+        }
+    except Exception as e:
+        return {"error": f"Unexpected error during verification: {str(e)}"}
+
+@mcp.tool()
+async def analyze_change_impact(changes: Dict[str, str], base_configs: Optional[Dict[str, str]] = None,
+                                mode: str = "merge", src_ips: str = "", dst_ips: str = "",
+                                applications: str = "", compare_acls: bool = True, max_flows: int = 50,
+                                max_age_seconds: int = 300) -> Dict[str, Any]:
+    """
+    Predicts which traffic a change breaks (or fixes) before it is deployed,
+    by comparing the current network with a candidate in Batfish
+    (differentialReachability, plus compareFilters for ACL decisions).
+
+    The current configs are the devices' running configs, fetched over their
+    consoles and reused for `max_age_seconds` (or until the deployer changes
+    a device). The matching Batfish base snapshot is uploaded only when
+    they change.
+
+    Args:
+        changes: Device name -> proposed config (IOS lines).
+        base_configs: Optional device name -> current config, instead of fetching running configs.
+        mode: 'merge' appends each change to the device's current config; 'replace' uses it as the full config.
+        src_ips: Optional source IP/prefix constraint for the flows, e.g. '10.0.1.0/24'.
+        dst_ips: Optional destination IP/prefix constraint.
+        applications: Optional application constraint, e.g. 'ssh' or 'tcp/80'.
+        compare_acls: Also report ACL lines whose decision differs.
+        max_flows: Maximum flows (and ACL lines) returned.
+        max_age_seconds: Maximum age of the fetched running configs.
+
+    Returns:
+        Dict: {"status", "flow_counts": {"broken", "fixed", "changed"}, "flows": [{"ingress", "src", "dst",
+               "protocol", "before", "after", "change"}], "acl_changes": [...], "parse_errors": [...], "errors": {...}}
+    """
+    if mode not in ("merge", "replace"):
+        return {"error": f"Unknown mode '{mode}'. Use 'merge' or 'replace'."}
+    if not changes:
+        return {"error": "No changes given."}
+    try:
+        errors: Dict[str, str] = {}
+        if base_configs is None:
+            hosts = load_inventory().get("hosts", {})
+            unknown = [d for d in changes if d not in hosts]
+            if unknown:
+                return {"error": f"Devices not in inventory: {', '.join(unknown)}"}
+            with metrics.span("differential.collect"):
+                base_configs, errors = await collect_running_configs(hosts, max_age=max_age_seconds)
+            missing = [d for d in changes if d in errors]
+            if missing and mode == "merge":
+                return {"error": f"Could not fetch running config of {', '.join(missing)}", "errors": errors}
+
+        headers = {key: value for key, value in
+                   (("srcIps", src_ips), ("dstIps", dst_ips), ("applications", applications)) if value}
+        with metrics.span("batfish.differential"):
+            result = await asyncio.to_thread(differential.analyze, base_configs, changes, mode=mode,
+                                             headers=headers or None, compare_acls=compare_acls,
+                                             max_flows=max_flows)
+        if result["status"] == "error":
+            return {"error": f"Error connecting to Batfish or initializing snapshots: {result['message']}"}
+        result["errors"] = errors
+        return result
+    except Exception as e:
+        return {"error": f"Unexpected error during impact analysis: {str(e)}"}
+
+if BATFISH_WARMUP:
+    bf_connector.warm_up()
+
+instrument_server(mcp, "verifier")
+
 if __name__ == "__main__":
     mcp.run()
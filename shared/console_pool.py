@@ -0,0 +1,241 @@
+import asyncio
+import itertools
+import os
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Iterable, List, Tuple
+
+from shared.gns3_utils import AsyncGNS3Console
+from shared.metrics import metrics
+
+# Seconds a read-only command result is reused (0: only coalesce concurrent calls)
+READ_CACHE_TTL = float(os.environ.get("CONSOLE_READ_TTL", "5"))
+
+# Console connections kept open to one GNS3 compute host, and commands run on
+# it at once; per-host overrides as "gns3-a=8,gns3-b=64"
+HOST_CONCURRENCY = int(os.environ.get("GNS3_HOST_CONCURRENCY", "32"))
+HOST_LIMITS = {name.strip(): int(limit) for name, _, limit in
+               (item.partition("=") for item in os.environ.get("GNS3_HOST_LIMITS", "").split(",") if "=" in item)}
+
+# Consecutive failed connections after which a compute host is skipped, and for how many seconds
+HOST_FAILURE_THRESHOLD = int(os.environ.get("GNS3_HOST_FAILURES", "3"))
+HOST_COOLDOWN = float(os.environ.get("GNS3_HOST_COOLDOWN", "30"))
+
+def console_address(host_data: Dict[str, Any]) -> Tuple[str, Any]:
+    """(compute host, console port) of an inventory entry; devices without a hostname live on localhost."""
+    return host_data.get("hostname") or "localhost", host_data.get("port")
+
+def spread_by_host(names: Iterable[str], hosts: Dict[str, Dict[str, Any]]) -> List[str]:
+    """
+    Orders devices round-robin over their compute hosts, so a bounded sweep
+    starts on every host at once instead of draining one host's queue first.
+    """
+    queues: Dict[str, List[str]] = {}
+    for name in names:
+        queues.setdefault(console_address(hosts[name])[0], []).append(name)
+    return [name for batch in itertools.zip_longest(*queues.values()) for name in batch if name is not None]
+
+class ComputeHost:
+    """
+    Console traffic to one GNS3 compute host: a cap on consoles in use and on
+    connections kept open (least recently used idle ones are closed beyond
+    it), and connection health.
+    """
+
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = max(1, limit)
+        self.slots = asyncio.Semaphore(self.limit)
+        self.active = 0
+        # Console keys with an open connection, least recently used first
+        self.open: "OrderedDict[Tuple[str, int], None]" = OrderedDict()
+        self.failures = 0
+        self.down_until = 0.0
+        self.last_error = None
+
+    def check(self) -> None:
+        remaining = self.down_until - time.monotonic()
+        if remaining > 0:
+            raise ConnectionError(f"GNS3 host {self.name} is marked down after {self.failures} failed "
+                                  f"connections ({self.last_error}); retrying in {remaining:.0f}s")
+
+    def failed(self, error: BaseException) -> None:
+        self.failures += 1
+        self.last_error = str(error) or type(error).__name__
+        metrics.inc("console_host_failures_total", host=self.name)
+        if self.failures >= HOST_FAILURE_THRESHOLD:
+            # Past the cooldown one connection is let through; another failure re-arms it
+            self.down_until = time.monotonic() + HOST_COOLDOWN
+
+    def succeeded(self) -> None:
+        self.failures = 0
+        self.down_until = 0.0
+        self.last_error = None
+
+    def status(self) -> Dict[str, Any]:
+        down_for = max(0.0, self.down_until - time.monotonic())
+        return {"healthy": down_for == 0, "limit": self.limit, "active": self.active, "open": len(self.open),
+                "consecutive_failures": self.failures, "retry_in_seconds": round(down_for, 1),
+                "last_error": self.last_error}
+
+class ConsolePool:
+    """
+    Keeps one open AsyncGNS3Console per device console and hands it out to
+    tool calls one at a time.
+
+    A GNS3 console port is a single shared serial line, so commands for the
+    same device are serialised behind a per-console lock while different
+    devices proceed concurrently. Connections stay open between calls; a
+    console that raises is closed and reconnected on next use.
+
+    Read-only commands can go through `read`, which shares one execution
+    between concurrent identical calls and reuses the result for a short TTL.
+    Cached reads belong to the device's generation, so `mark_changed` (called
+    after every deploy) invalidates them.
+
+    Consoles are reached on the compute host named in the inventory. Each
+    host has its own cap on open sessions, and a host whose connections keep
+    failing is skipped for a cooldown so sweeps fail fast on its devices
+    instead of waiting out one connect timeout per console.
+    """
+
+    def __init__(self):
+        self._hosts: Dict[str, ComputeHost] = {}
+        self._consoles = {}
+        self._locks = {}
+        self._generations = {}
+        self._reads = {}
+        self._flights = {}
+
+    def _key(self, hostname, port):
+        return (hostname, int(port))
+
+    def compute_host(self, hostname) -> ComputeHost:
+        host = self._hosts.get(hostname)
+        if host is None:
+            host = ComputeHost(hostname, HOST_LIMITS.get(hostname, HOST_CONCURRENCY))
+            self._hosts[hostname] = host
+        return host
+
+    def fleet_limit(self, hostnames: Iterable[str], per_host: int) -> int:
+        """Concurrency for a sweep over these hosts: up to `per_host` on each, within each host's cap."""
+        return max(1, sum(min(per_host, self.compute_host(h).limit) for h in set(hostnames)))
+
+    def host_status(self) -> Dict[str, Dict[str, Any]]:
+        return {name: host.status() for name, host in sorted(self._hosts.items())}
+
+    def mark_changed(self, hostname, port):
+        """Records that a device was reconfigured, invalidating state cached elsewhere."""
+        key = self._key(hostname, port)
+        self._generations[key] = self._generations.get(key, 0) + 1
+        for cache_key in [k for k in self._reads if k[0] == key]:
+            del self._reads[cache_key]
+
+    def generation(self, hostname, port):
+        return self._generations.get(self._key(hostname, port), 0)
+
+    async def read(self, hostname, port, command, fetch, platform="cisco_ios", ttl=None):
+        """
+        Runs a read-only command through the cache.
+
+        Args:
+            command: Cache key for the read (usually the CLI command it sends).
+            fetch: `async fetch(console)` doing the actual read.
+            ttl: Seconds the result stays valid (default CONSOLE_READ_TTL).
+
+        The returned value is shared between callers and must not be mutated.
+        """
+        ttl = READ_CACHE_TTL if ttl is None else ttl
+        key = self._key(hostname, port)
+        generation = self._generations.get(key, 0)
+        cache_key = (key, platform, command)
+        entry = self._reads.get(cache_key)
+        if ttl > 0 and entry is not None and entry[0] == generation and entry[1] > time.monotonic():
+            metrics.inc("console_read_cache_total", result="hit")
+            return entry[2]
+
+        flight_key = (cache_key, generation)
+        task = self._flights.get(flight_key)
+        if task is None:
+            metrics.inc("console_read_cache_total", result="miss")
+            task = asyncio.ensure_future(self._fetch(hostname, port, platform, fetch, cache_key, generation, ttl))
+            self._flights[flight_key] = task
+            task.add_done_callback(lambda t: self._flight_done(flight_key, t))
+        else:
+            metrics.inc("console_read_cache_total", result="coalesced")
+        # One caller giving up must not cancel the read the others are waiting on
+        return await asyncio.shield(task)
+
+    def _flight_done(self, flight_key, task):
+        self._flights.pop(flight_key, None)
+        if not task.cancelled():
+            # Mark the exception retrieved even if every caller was cancelled meanwhile
+            task.exception()
+
+    async def _fetch(self, hostname, port, platform, fetch, cache_key, generation, ttl):
+        async with self.session(hostname, port, platform=platform) as console:
+            value = await fetch(console)
+        if ttl > 0:
+            self._reads[cache_key] = (generation, time.monotonic() + ttl, value)
+        return value
+
+    @asynccontextmanager
+    async def session(self, hostname, port, platform="cisco_ios"):
+        key = self._key(hostname, port)
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        host = self.compute_host(hostname)
+        # Device lock first: callers queued on a busy console do not hold a host slot
+        async with lock, host.slots:
+            host.active += 1
+            console = self._consoles.get(key)
+            if console is None or console.platform != platform:
+                if console is not None:
+                    # Release the device's console line before opening it for the other platform
+                    await console.close()
+                console = AsyncGNS3Console(hostname, port, platform=platform)
+                self._consoles[key] = console
+            try:
+                if not console.connected:
+                    host.check()
+                    try:
+                        await console.connect()
+                    except (OSError, asyncio.TimeoutError) as e:
+                        host.failed(e)
+                        raise
+                    host.succeeded()
+                host.open[key] = None
+                host.open.move_to_end(key)
+                yield console
+            except BaseException:
+                # Unknown line state (half-read output, dropped socket): start fresh next time
+                await console.close()
+                self._consoles.pop(key, None)
+                host.open.pop(key, None)
+                raise
+            finally:
+                host.active -= 1
+        if len(host.open) > host.limit:
+            await self._close_idle(host)
+
+    async def _close_idle(self, host: ComputeHost) -> None:
+        """Closes least recently used idle consoles until the host is back within its cap."""
+        idle = [k for k in host.open if not self._locks[k].locked()]
+        excess = idle[:len(host.open) - host.limit]
+        consoles = []
+        for key in excess:
+            # Unlisted before awaiting, so a caller arriving meanwhile opens a fresh connection
+            host.open.pop(key, None)
+            consoles.append(self._consoles.pop(key, None))
+        for console in consoles:
+            if console is not None:
+                await console.close()
+
+    async def close_all(self):
+        for console in list(self._consoles.values()):
+            await console.close()
+        self._consoles.clear()
+        for host in self._hosts.values():
+            host.open.clear()
+
+console_pool = ConsolePool()
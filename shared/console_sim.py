@@ -0,0 +1,956 @@
+"""
+Telnet console simulator for offline testing and benchmarking.
+
+Emulates GNS3 console ports of Cisco IOS routers and Linux hosts well enough
+for every console-touching tool (prompts, enable/config modes, interface and
+route state, show output with --More-- paging, ping), records real console
+sessions through a transparent proxy, and replays recordings with their
+original or a configured latency. One asyncio loop serves hundreds of
+devices, each on its own port.
+
+    # Every device in shared/inventory.yaml, on its inventory port
+    python shared/console_sim.py serve --inventory shared/inventory.yaml
+
+    # 200 routers + 800 hosts from port 20000, 50 ms per command
+    python shared/console_sim.py serve --routers 200 --hosts 800 --base-port 20000 \\
+        --latency 0.05 --write-inventory /tmp/sim_inventory.yaml
+
+    # Record a live session, then replay it
+    python shared/console_sim.py record --listen 6008 --upstream localhost:5008 --out r1.json
+    python shared/console_sim.py replay r1.json --port 6008
+"""
+import abc
+import argparse
+import asyncio
+import ipaddress
+import json
+import logging
+import random
+import re
+import time
+import zlib
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+IOS_PAGE_LENGTH = 24
+IOS_INTERFACE_TYPES = ["Ethernet", "FastEthernet", "GigabitEthernet", "Loopback", "Serial",
+                       "Tunnel", "Vlan", "TenGigabitEthernet", "Port-channel"]
+COMMAND_SPLIT_RE = re.compile(r"\s*(?:;|&&)\s*")
+
+def _words_match(words: List[str], pattern: str) -> bool:
+    """IOS-style abbreviation: 'sh ip int br' matches 'show ip interface brief'."""
+    expected = pattern.split()
+    return len(words) >= len(expected) and all(
+        w and e.startswith(w.lower()) for w, e in zip(words, expected)
+    )
+
+def normalize_interface(name: str) -> str:
+    """'f0/0', 'fa 0/0', 'FastEthernet0/0' -> 'FastEthernet0/0'."""
+    match = re.match(r"^([A-Za-z\-]+)\s*(\S*)$", name.strip())
+    if not match:
+        return name.strip()
+    kind, unit = match.groups()
+    for full in IOS_INTERFACE_TYPES:
+        if full.lower().startswith(kind.lower()):
+            return f"{full}{unit}"
+    return f"{kind}{unit}"
+
+
+class SimDevice(abc.ABC):
+    """
+    Base class of simulated consoles. respond() turns one input line into
+    output pages (more than one page means --More-- paging) and the latency
+    to apply before the first byte is sent.
+    """
+
+    platform = "generic"
+
+    def __init__(self, name: str, latency: float = 0.0, jitter: float = 0.0,
+                 command_latency: Optional[Dict[str, float]] = None, seed: Optional[int] = None):
+        self.name = name
+        self.latency = latency
+        self.jitter = jitter
+        # Command prefix -> latency override, e.g. {"ping": 2.0, "show ip route": 0.3}
+        self.command_latency = command_latency or {}
+        self.reachable: Callable[[str], bool] = lambda ip: True
+        self._random = random.Random(seed)
+        self.commands_seen = 0
+
+    def banner(self) -> str:
+        return ""
+
+    @abc.abstractmethod
+    def prompt(self) -> str:
+        """The prompt sent after each command's output."""
+
+    @abc.abstractmethod
+    def execute(self, command: str) -> str:
+        """Output of one command, without its echo or the next prompt."""
+
+    def page_length(self) -> int:
+        return 0
+
+    def command_delay(self, command: str) -> float:
+        if not command:
+            return 0.0
+        delay = self.latency
+        for prefix, value in self.command_latency.items():
+            if command.startswith(prefix):
+                delay = value
+                break
+        if self.jitter:
+            delay += self._random.uniform(0, self.jitter)
+        return delay
+
+    def respond(self, line: str) -> Tuple[List[str], float]:
+        command = line.strip()
+        self.commands_seen += 1
+        body = self.execute(command) if command else ""
+        text = f"{line}\r\n" + (body.replace("\r\n", "\n").replace("\n", "\r\n") + "\r\n" if body else "")
+        pages = self._paginate(text)
+        pages[-1] += self.prompt()
+        return pages, self.command_delay(command)
+
+    def _paginate(self, text: str) -> List[str]:
+        length = self.page_length()
+        lines = text.split("\r\n")
+        if length <= 0 or len(lines) <= length:
+            return [text]
+        page = length - 1
+        return ["\r\n".join(lines[i:i + page]) + ("\r\n" if i + page < len(lines) else "")
+                for i in range(0, len(lines), page)]
+
+
+class IOSDevice(SimDevice):
+    """A Cisco IOS router: user/enable/config modes, interfaces, static routes."""
+
+    platform = "cisco_ios"
+
+    def __init__(self, name: str, interfaces: Optional[List[Dict[str, Any]]] = None,
+                 routes: Optional[List[Dict[str, Any]]] = None, **kwargs):
+        super().__init__(name, **kwargs)
+        self.hostname = name
+        self.mode = "enable"
+        self.context = None          # interface being configured
+        self.terminal_length = IOS_PAGE_LENGTH
+        self.interfaces: Dict[str, Dict[str, Any]] = {}
+        self.static_routes: List[Tuple[str, str]] = []
+        # Routes learned "dynamically", e.g. to model a large OSPF table
+        self.learned_routes = list(routes or [])
+        self.extra_config: List[str] = []
+        for iface in interfaces or []:
+            entry = self._interface(normalize_interface(iface["name"]))
+            entry["description"] = iface.get("description")
+            if iface.get("ip"):
+                entry["ip"] = ipaddress.ip_interface(iface["ip"] if "/" in str(iface["ip"]) else f"{iface['ip']}/24")
+            entry["shutdown"] = bool(iface.get("shutdown", False))
+
+    def _interface(self, name: str) -> Dict[str, Any]:
+        return self.interfaces.setdefault(name, {"ip": None, "shutdown": True, "description": None})
+
+    def addresses(self) -> List[str]:
+        return [str(i["ip"].ip) for i in self.interfaces.values() if i["ip"] is not None]
+
+    def prompt(self) -> str:
+        suffix = {"user": ">", "enable": "#", "config": "(config)#"}.get(self.mode, f"({self.mode})#")
+        return f"{self.hostname}{suffix}"
+
+    def page_length(self) -> int:
+        return self.terminal_length
+
+    def execute(self, command: str) -> str:
+        words = command.split()
+        if self.mode in ("user", "enable"):
+            return self._exec(words, command)
+        if _words_match(words, "do"):
+            return self._exec(words[1:], " ".join(words[1:]))
+        return self._config(words, command)
+
+    def _invalid(self, command: str) -> str:
+        return f"{' ' * len(self.prompt())}^\n% Invalid input detected at '^' marker.\n"
+
+    # --- EXEC mode ---
+
+    def _exec(self, words: List[str], command: str) -> str:
+        if _words_match(words, "enable"):
+            self.mode = "enable"
+            return ""
+        if _words_match(words, "disable"):
+            self.mode = "user"
+            return ""
+        if _words_match(words, "terminal length") and len(words) >= 3 and words[2].isdigit():
+            self.terminal_length = int(words[2])
+            return ""
+        if _words_match(words, "ping") and len(words) >= 2:
+            return self._ping(words[1])
+        if _words_match(words, "show ip interface brief"):
+            return self._show_ip_interface_brief()
+        if _words_match(words, "show ip route"):
+            return self._show_ip_route()
+        if _words_match(words, "show running-config") or _words_match(words, "show startup-config"):
+            return self._show_running_config()
+        if _words_match(words, "show version"):
+            return (f"Cisco IOS Software, 7200 Software (C7200-ADVENTERPRISEK9-M), Version 15.2(4)S5\n"
+                    f"{self.hostname} uptime is 1 hour, 2 minutes\n")
+        if words and words[0].lower() in ("exit", "logout", "quit"):
+            return f"\n{self.hostname} con0 is now available\n\nPress RETURN to get started.\n"
+        if self.mode == "user":
+            return self._invalid(command)
+        if _words_match(words, "configure terminal") or (len(words) == 1 and _words_match(words, "configure")):
+            self.mode = "config"
+            return "Enter configuration commands, one per line.  End with CNTL/Z."
+        if _words_match(words, "write memory") or _words_match(words, "copy running-config startup-config"):
+            return "Building configuration...\n[OK]"
+        if _words_match(words, "clear"):
+            return ""
+        return self._invalid(command)
+
+    def _ping(self, target: str) -> str:
+        head = ("Type escape sequence to abort.\n"
+                f"Sending 5, 100-byte ICMP Echos to {target}, timeout is 2 seconds:\n")
+        try:
+            ipaddress.ip_address(target)
+        except ValueError:
+            return f"% Unrecognized host or address, or protocol not running.\n"
+        if self.reachable(target):
+            return head + "!!!!!\nSuccess rate is 100 percent (5/5), round-trip min/avg/max = 1/2/4 ms"
+        return head + ".....\nSuccess rate is 0 percent (0/5)"
+
+    def _show_ip_interface_brief(self) -> str:
+        lines = [f"{'Interface':<27}{'IP-Address':<16}OK? Method Status                Protocol"]
+        for name, iface in sorted(self.interfaces.items()):
+            ip = str(iface["ip"].ip) if iface["ip"] is not None else "unassigned"
+            method = "manual" if iface["ip"] is not None else "unset"
+            status = "administratively down" if iface["shutdown"] else "up"
+            protocol = "down" if iface["shutdown"] else "up"
+            lines.append(f"{name:<27}{ip:<16}YES {method:<7}{status:<22}{protocol}")
+        return "\n".join(lines)
+
+    def _route_entries(self) -> List[Tuple[ipaddress.IPv4Network, str]]:
+        entries = []
+        for name, iface in self.interfaces.items():
+            if iface["ip"] is not None and not iface["shutdown"]:
+                entries.append((iface["ip"].network, f"C        {iface['ip'].network} is directly connected, {name}"))
+        for prefix, next_hop in self.static_routes:
+            code = "S*" if prefix == "0.0.0.0/0" else "S "
+            entries.append((ipaddress.ip_network(prefix), f"{code}       {prefix} [1/0] via {next_hop}"))
+        for route in self.learned_routes:
+            code = route.get("protocol", "O")
+            entries.append((ipaddress.ip_network(route["prefix"]),
+                            f"{code:<9}{route['prefix']} [110/{route.get('metric', 20)}] via {route['next_hop']}, "
+                            f"00:10:00, {route.get('interface', 'FastEthernet0/0')}"))
+        entries.sort(key=lambda e: (int(e[0].network_address), e[0].prefixlen))
+        return entries
+
+    def _show_ip_route(self) -> str:
+        default = next((nh for p, nh in self.static_routes if p == "0.0.0.0/0"), None)
+        lines = [
+            "Codes: L - local, C - connected, S - static, R - RIP, M - mobile, B - BGP",
+            "       D - EIGRP, EX - EIGRP external, O - OSPF, IA - OSPF inter area",
+            "       * - candidate default, U - per-user static route, o - ODR",
+            "",
+            f"Gateway of last resort is {default} to network 0.0.0.0" if default else "Gateway of last resort is not set",
+            "",
+        ]
+        lines.extend(line for _, line in self._route_entries())
+        return "\n".join(lines)
+
+    def _show_running_config(self) -> str:
+        lines = ["Building configuration...", "", "Current configuration:", "!", f"hostname {self.hostname}", "!"]
+        for name, iface in sorted(self.interfaces.items()):
+            lines.append(f"interface {name}")
+            if iface["description"]:
+                lines.append(f" description {iface['description']}")
+            if iface["ip"] is not None:
+                lines.append(f" ip address {iface['ip'].ip} {iface['ip'].netmask}")
+            else:
+                lines.append(" no ip address")
+            if iface["shutdown"]:
+                lines.append(" shutdown")
+            lines.append("!")
+        for prefix, next_hop in self.static_routes:
+            net = ipaddress.ip_network(prefix)
+            lines.append(f"ip route {net.network_address} {net.netmask} {next_hop}")
+        lines.extend(self.extra_config)
+        lines.append("end")
+        return "\n".join(lines)
+
+    # --- Configuration mode ---
+
+    def _config(self, words: List[str], command: str) -> str:
+        if not words:
+            return ""
+        negate = words[0].lower() == "no"
+        args = words[1:] if negate else words
+        if _words_match(words, "end"):
+            self.mode, self.context = "enable", None
+            return ""
+        if _words_match(words, "exit"):
+            if self.mode == "config":
+                self.mode = "enable"
+            else:
+                self.mode, self.context = "config", None
+            return ""
+        if _words_match(args, "interface") and len(args) >= 2:
+            self.context = normalize_interface(" ".join(args[1:]))
+            self._interface(self.context)
+            self.mode = "config-if"
+            return ""
+        if _words_match(args, "hostname") and len(args) >= 2 and not negate:
+            self.hostname = args[1]
+            return ""
+        if _words_match(args, "ip route") and len(args) >= 5:
+            try:
+                prefix = str(ipaddress.ip_network(f"{args[2]}/{args[3]}"))
+            except ValueError:
+                return self._invalid(command)
+            route = (prefix, args[4])
+            if negate:
+                self.static_routes = [r for r in self.static_routes if r[0] != prefix]
+            elif route not in self.static_routes:
+                self.static_routes.append(route)
+            return ""
+        if self.mode == "config-if" and self.context:
+            iface = self.interfaces[self.context]
+            if _words_match(args, "ip address"):
+                if negate:
+                    iface["ip"] = None
+                    return ""
+                try:
+                    iface["ip"] = ipaddress.ip_interface(f"{args[2]}/{args[3]}")
+                except (IndexError, ValueError):
+                    return self._invalid(command)
+                return ""
+            if _words_match(args, "shutdown"):
+                iface["shutdown"] = not negate
+                return ""
+            if _words_match(args, "description"):
+                iface["description"] = None if negate else " ".join(args[1:])
+                return ""
+        if _words_match(args, "router") and len(args) >= 2:
+            self.mode = "config-router"
+        # Everything else is accepted and kept, like a permissive lab image
+        self.extra_config.append(command)
+        return ""
+
+
+class LinuxDevice(SimDevice):
+    """A Linux host speaking the iproute2 subset the tools use."""
+
+    platform = "linux"
+
+    def __init__(self, name: str, interface: str = "eth0", ip: Optional[str] = None,
+                 gateway: Optional[str] = None, **kwargs):
+        super().__init__(name, **kwargs)
+        self.hostname = name
+        self.links: Dict[str, Dict[str, Any]] = {
+            "lo": {"index": 1, "up": True, "addrs": [ipaddress.ip_interface("127.0.0.1/8")],
+                   "mac": "00:00:00:00:00:00"},
+        }
+        self._link(interface)
+        if ip:
+            self.links[interface]["addrs"].append(ipaddress.ip_interface(ip if "/" in str(ip) else f"{ip}/24"))
+        self.routes: List[Dict[str, Any]] = []
+        if gateway:
+            self.routes.append({"dst": "default", "gateway": gateway, "dev": interface})
+
+    def _link(self, name: str) -> Dict[str, Any]:
+        if name not in self.links:
+            index = len(self.links) + 1
+            self.links[name] = {"index": index, "up": True, "addrs": [],
+                                "mac": f"02:42:ac:{index:02x}:{zlib.crc32(self.name.encode()) % 256:02x}:01"}
+        return self.links[name]
+
+    def addresses(self) -> List[str]:
+        return [str(a.ip) for name, link in self.links.items() if name != "lo" for a in link["addrs"]]
+
+    def prompt(self) -> str:
+        return f"root@{self.hostname}:~# "
+
+    def execute(self, command: str) -> str:
+        outputs = []
+        for part in COMMAND_SPLIT_RE.split(command):
+            if part:
+                out = self._run(part.split())
+                if out:
+                    outputs.append(out)
+        return "\n".join(outputs)
+
+    def _run(self, argv: List[str]) -> str:
+        cmd = argv[0]
+        if cmd == "ip":
+            return self._ip(argv[1:])
+        if cmd == "ping":
+            return self._ping(argv[1:])
+        if cmd == "hostname":
+            if len(argv) > 1:
+                self.hostname = argv[1]
+                return ""
+            return self.hostname
+        if cmd == "echo":
+            return " ".join(argv[1:])
+        if cmd in ("true", "sleep", "sync", "clear"):
+            return ""
+        if cmd == "cat" and argv[1:] == ["/etc/hostname"]:
+            return self.hostname
+        return f"sh: {cmd}: not found"
+
+    def _ip(self, args: List[str]) -> str:
+        options = set()
+        while args and args[0].startswith("-"):
+            options.add(args[0])
+            args = args[1:]
+        if not args:
+            return "Usage: ip [ OPTIONS ] OBJECT { COMMAND | help }"
+        obj, rest = args[0], args[1:]
+        as_json = "-j" in options or "-json" in options
+        if "addr".startswith(obj) or obj == "address":
+            return self._ip_addr(rest, oneline="-o" in options, as_json=as_json,
+                                 only_v4="-4" in options)
+        if "route".startswith(obj):
+            return self._ip_route(rest, as_json=as_json)
+        if "link".startswith(obj):
+            return self._ip_link(rest, as_json=as_json)
+        return f'Object "{obj}" is unknown, try "ip help".'
+
+    @staticmethod
+    def _opt(args: List[str], key: str) -> Optional[str]:
+        if key in args and args.index(key) + 1 < len(args):
+            return args[args.index(key) + 1]
+        return None
+
+    def _ip_addr(self, args: List[str], oneline: bool, as_json: bool, only_v4: bool) -> str:
+        action = args[0] if args else "show"
+        if action in ("add", "del", "delete", "flush"):
+            dev = self._opt(args, "dev")
+            if not dev or dev not in self.links:
+                return f'Cannot find device "{dev}"'
+            link = self.links[dev]
+            if action == "flush":
+                link["addrs"] = []
+                return ""
+            try:
+                addr = ipaddress.ip_interface(args[1])
+            except (IndexError, ValueError):
+                return "Error: any valid prefix is expected rather than \"{}\".".format(args[1] if len(args) > 1 else "")
+            if action == "add":
+                if addr in link["addrs"]:
+                    return "RTNETLINK answers: File exists"
+                link["addrs"].append(addr)
+            elif addr in link["addrs"]:
+                link["addrs"].remove(addr)
+            else:
+                return "RTNETLINK answers: Cannot assign requested address"
+            return ""
+
+        dev = self._opt(args, "dev") or (args[1] if len(args) > 1 and action in ("show", "list") else None)
+        links = {n: l for n, l in self.links.items() if dev is None or n == dev}
+        if as_json:
+            return json.dumps([{
+                "ifindex": l["index"], "ifname": n, "flags": self._flags(n, l), "mtu": 1500,
+                "operstate": "UP" if l["up"] else "DOWN", "address": l["mac"],
+                "addr_info": [{"family": "inet", "local": str(a.ip), "prefixlen": a.network.prefixlen,
+                               "scope": "host" if a.ip.is_loopback else "global"} for a in l["addrs"]],
+            } for n, l in links.items()])
+        lines = []
+        for name, link in links.items():
+            state = "UP" if link["up"] else "DOWN"
+            if not oneline:
+                lines.append(f"{link['index']}: {name}: <BROADCAST,MULTICAST,{state}> mtu 1500 state {state}")
+                lines.append(f"    link/ether {link['mac']} brd ff:ff:ff:ff:ff:ff")
+            for addr in link["addrs"]:
+                scope = "host" if addr.ip.is_loopback else "global"
+                brd = "" if addr.ip.is_loopback else f" brd {addr.network.broadcast_address}"
+                if oneline:
+                    lines.append(f"{link['index']}: {name}    inet {addr}{brd} scope {scope} {name}\\"
+                                 f"       valid_lft forever preferred_lft forever")
+                else:
+                    lines.append(f"    inet {addr}{brd} scope {scope} {name}")
+                    lines.append("       valid_lft forever preferred_lft forever")
+        return "\n".join(lines)
+
+    @staticmethod
+    def _flags(name: str, link: Dict[str, Any]) -> List[str]:
+        flags = ["LOOPBACK"] if name == "lo" else ["BROADCAST", "MULTICAST"]
+        return flags + (["UP", "LOWER_UP"] if link["up"] else [])
+
+    def _connected(self) -> List[Dict[str, Any]]:
+        return [{"dst": str(a.network), "dev": name, "protocol": "kernel", "scope": "link", "prefsrc": str(a.ip)}
+                for name, link in self.links.items() if name != "lo" and link["up"] for a in link["addrs"]]
+
+    def _ip_route(self, args: List[str], as_json: bool) -> str:
+        action = args[0] if args else "show"
+        if action in ("add", "del", "delete", "replace"):
+            if len(args) < 2:
+                return "Error: ip route needs a destination."
+            dst = args[1]
+            if dst != "default":
+                try:
+                    dst = str(ipaddress.ip_network(dst, strict=False))
+                except ValueError:
+                    return f'Error: inet prefix is expected rather than "{dst}".'
+            existing = [r for r in self.routes if r["dst"] == dst]
+            if action in ("del", "delete"):
+                if not existing:
+                    return "RTNETLINK answers: No such process"
+                self.routes = [r for r in self.routes if r["dst"] != dst]
+                return ""
+            if existing and action == "add":
+                return "RTNETLINK answers: File exists"
+            gateway = self._opt(args, "via")
+            dev = self._opt(args, "dev")
+            if gateway and not dev:
+                gw = ipaddress.ip_address(gateway)
+                dev = next((n for n, l in self.links.items() if any(gw in a.network for a in l["addrs"])), None)
+                if dev is None:
+                    return "Error: Nexthop has invalid gateway."
+            self.routes = [r for r in self.routes if r["dst"] != dst]
+            self.routes.append({"dst": dst, "gateway": gateway, "dev": dev})
+            return ""
+
+        routes = self.routes + self._connected()
+        if as_json:
+            return json.dumps([{k: v for k, v in r.items() if v is not None} for r in routes])
+        lines = []
+        for r in routes:
+            if r.get("protocol") == "kernel":
+                lines.append(f"{r['dst']} dev {r['dev']} proto kernel scope link src {r['prefsrc']}")
+            else:
+                via = f" via {r['gateway']}" if r.get("gateway") else ""
+                lines.append(f"{r['dst']}{via} dev {r['dev']}")
+        return "\n".join(lines)
+
+    def _ip_link(self, args: List[str], as_json: bool) -> str:
+        if args and args[0] == "set" and len(args) >= 3:
+            dev = args[2] if args[1] == "dev" else args[1]
+            if dev not in self.links:
+                return f'Cannot find device "{dev}"'
+            if "up" in args:
+                self.links[dev]["up"] = True
+            elif "down" in args:
+                self.links[dev]["up"] = False
+            return ""
+        if as_json:
+            return json.dumps([{"ifindex": l["index"], "ifname": n, "flags": self._flags(n, l),
+                                "operstate": "UP" if l["up"] else "DOWN",
+                                "mtu": 1500, "address": l["mac"]} for n, l in self.links.items()])
+        lines = []
+        for name, link in self.links.items():
+            state = "UP" if link["up"] else "DOWN"
+            lines.append(f"{link['index']}: {name}: <BROADCAST,MULTICAST,{state}> mtu 1500 state {state}")
+            lines.append(f"    link/ether {link['mac']} brd ff:ff:ff:ff:ff:ff")
+        return "\n".join(lines)
+
+    def _ping(self, args: List[str]) -> str:
+        count = 4
+        target = None
+        it = iter(args)
+        for arg in it:
+            if arg == "-c":
+                count = int(next(it, "4"))
+            elif not arg.startswith("-"):
+                target = arg
+        if target is None:
+            return "ping: usage error: Destination address required"
+        try:
+            ipaddress.ip_address(target)
+        except ValueError:
+            return f"ping: {target}: Name or service not known"
+        lines = [f"PING {target} ({target}) 56(84) bytes of data."]
+        ok = self.reachable(target)
+        if ok:
+            lines += [f"64 bytes from {target}: icmp_seq={i + 1} ttl=64 time=0.{i + 1} ms" for i in range(count)]
+        lines += ["", f"--- {target} ping statistics ---",
+                  f"{count} packets transmitted, {count if ok else 0} received, {0 if ok else 100}% packet loss, time {count}ms"]
+        return "\n".join(lines)
+
+
+class ReplayDevice(SimDevice):
+    """
+    Replays a recorded session. Each command returns its recorded output
+    (echo, body and prompt as captured); repeated commands step through
+    their recordings in order and then stick to the last one. Commands that
+    were never recorded go to `fallback` if given.
+    """
+
+    def __init__(self, recording: Dict[str, Any], fallback: Optional[SimDevice] = None,
+                 use_recorded_latency: bool = True, **kwargs):
+        super().__init__(recording.get("device", "replay"), **kwargs)
+        self.platform = recording.get("platform", "generic")
+        self.fallback = fallback
+        self.use_recorded_latency = use_recorded_latency
+        self._banner = recording.get("banner", "")
+        self._last_prompt = recording.get("prompt", "")
+        self._exchanges: Dict[str, List[Dict[str, Any]]] = {}
+        self._cursor: Dict[str, int] = {}
+        for exchange in recording.get("exchanges", []):
+            self._exchanges.setdefault(" ".join(exchange["command"].split()), []).append(exchange)
+
+    @classmethod
+    def load(cls, path: str, **kwargs) -> "ReplayDevice":
+        with open(path, 'r') as f:
+            return cls(json.load(f), **kwargs)
+
+    def banner(self) -> str:
+        return self._banner
+
+    def prompt(self) -> str:
+        return self.fallback.prompt() if self.fallback else self._last_prompt
+
+    def execute(self, command: str) -> str:
+        # Recorded commands never get here: respond() replays their captured output
+        return f"% Not in recording: {' '.join(command.split())}"
+
+    def respond(self, line: str) -> Tuple[List[str], float]:
+        key = " ".join(line.split())
+        recorded = self._exchanges.get(key)
+        if not recorded:
+            if self.fallback:
+                return self.fallback.respond(line)
+            return super().respond(line)
+        index = self._cursor.get(key, 0)
+        self._cursor[key] = min(index + 1, len(recorded) - 1)
+        exchange = recorded[index]
+        self.commands_seen += 1
+        delay = exchange.get("latency", 0.0) if self.use_recorded_latency else self.command_delay(key)
+        return [exchange["output"]], delay
+
+
+class ConsoleSimulator:
+    """
+    Serves simulated devices, one TCP port each, on the running event loop.
+
+    Ping reachability is fleet-wide: a device answers pings to any address
+    configured on any simulated device, unless listed in `unreachable`.
+    """
+
+    def __init__(self, host: str = "127.0.0.1"):
+        self.host = host
+        self.devices: Dict[int, SimDevice] = {}
+        self.unreachable: set = set()
+        self._servers: Dict[int, asyncio.AbstractServer] = {}
+        self._locks: Dict[int, asyncio.Lock] = {}
+        self._connections: Dict[asyncio.StreamWriter, asyncio.Task] = {}
+        self.bytes_sent = 0
+
+    def is_reachable(self, ip: str) -> bool:
+        if ip in self.unreachable:
+            return False
+        return any(ip in getattr(d, "addresses", lambda: [])() for d in self.devices.values())
+
+    async def add_device(self, device: SimDevice, port: int = 0) -> int:
+        """Starts serving `device`; port 0 picks a free port. Returns the port."""
+        device.reachable = self.is_reachable
+        server = await asyncio.start_server(
+            lambda r, w, d=device: self._handle(d, r, w), self.host, port
+        )
+        port = server.sockets[0].getsockname()[1]
+        self.devices[port] = device
+        self._servers[port] = server
+        return port
+
+    async def _handle(self, device: SimDevice, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        lock = self._locks.setdefault(id(device), asyncio.Lock())
+        buffer = b""
+        trailing_cr = False
+        self._connections[writer] = asyncio.current_task()
+        try:
+            if device.banner():
+                await self._write(writer, device.banner())
+            while True:
+                data = await reader.read(4096)
+                if not data:
+                    break
+                buffer += data
+                if trailing_cr and buffer[:1] in (b"\n", b"\0"):
+                    # Second half of a \r\n (or telnet \r\0) split across reads
+                    buffer = buffer[1:]
+                trailing_cr = False
+                while True:
+                    match = re.search(rb"\r\n|\r\0|\r|\n", buffer)
+                    if not match:
+                        break
+                    line, buffer = buffer[:match.start()], buffer[match.end():]
+                    trailing_cr = match.group() == b"\r" and not buffer
+                    async with lock:
+                        pages, delay = device.respond(line.decode('utf-8', errors='ignore'))
+                        if delay > 0:
+                            await asyncio.sleep(delay)
+                        buffer = await self._send_pages(writer, reader, pages, buffer)
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self._connections.pop(writer, None)
+            writer.close()
+
+    async def _send_pages(self, writer, reader, pages: List[str], buffer: bytes) -> bytes:
+        """Writes paged output, waiting for a key at each --More--. Returns unconsumed input."""
+        for i, page in enumerate(pages):
+            await self._write(writer, page)
+            if i == len(pages) - 1:
+                break
+            await self._write(writer, " --More-- ")
+            if not buffer:
+                buffer = await reader.read(4096)
+                if not buffer:
+                    raise ConnectionError("client went away at --More--")
+            key, buffer = buffer[:1], buffer[1:]
+            # Erase the --More-- marker like IOS does
+            await self._write(writer, "\b" * 9 + " " * 9 + "\b" * 9)
+            if key not in (b" ", b"\r", b"\n"):
+                # Any other key aborts the listing; the prompt is still printed
+                await self._write(writer, "\r\n" + pages[-1][pages[-1].rfind("\r\n") + 2:])
+                break
+        return buffer
+
+    async def _write(self, writer: asyncio.StreamWriter, text: str) -> None:
+        data = text.encode('utf-8')
+        self.bytes_sent += len(data)
+        writer.write(data)
+        await writer.drain()
+
+    async def stop(self) -> None:
+        for server in self._servers.values():
+            server.close()
+        # Closing the transports ends each handler's read loop cleanly
+        tasks = list(self._connections.values())
+        for writer in list(self._connections):
+            writer.close()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        for server in self._servers.values():
+            await server.wait_closed()
+        self._servers.clear()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.stop()
+
+    @classmethod
+    async def from_inventory(cls, inventory: Dict[str, Any], host: str = "127.0.0.1",
+                             any_port: bool = False, **device_options) -> "ConsoleSimulator":
+        """
+        Serves every inventory host on its console port (or on free ports
+        with any_port=True, updating each host's 'port' in place).
+        """
+        sim = cls(host)
+        for name, host_data in (inventory.get("hosts") or {}).items():
+            device = device_from_inventory(name, host_data, **device_options)
+            port = await sim.add_device(device, 0 if any_port else int(host_data["port"]))
+            host_data["port"] = port
+            host_data["hostname"] = host
+        return sim
+
+
+def device_from_inventory(name: str, host_data: Dict[str, Any], **device_options) -> SimDevice:
+    data = host_data.get("data") or {}
+    if "linux" in host_data.get("groups", []):
+        return LinuxDevice(name, interface=data.get("interface") or "eth0", ip=data.get("ip"),
+                           gateway=data.get("gateway"), **device_options)
+    interfaces = [{"name": i["name"], "ip": i.get("ip"), "description": i.get("description")}
+                  for i in data.get("interfaces") or []]
+    return IOSDevice(name, interfaces=interfaces, **device_options)
+
+
+def synthetic_inventory(routers: int, hosts: int, base_port: int = 20000,
+                        hostname: str = "localhost") -> Dict[str, Any]:
+    """
+    Builds an inventory of `routers` routers chained by /24 transit links and
+    `hosts` Linux hosts spread over the routers' LAN segments.
+    """
+    inventory = {
+        "groups": {"cisco": {"platform": "cisco_ios", "connection_type": "telnet"},
+                   "linux": {"platform": "linux", "connection_type": "telnet"}},
+        "hosts": {},
+    }
+    port = base_port
+    routers = max(routers, 1)
+    for r in range(routers):
+        interfaces = [{"name": "FastEthernet0/0", "ip": f"172.{16 + r // 256}.{r % 256}.1/24",
+                       "description": "LAN"}]
+        if r > 0:
+            interfaces.append({"name": "FastEthernet1/0", "ip": f"10.{(r - 1) // 256}.{(r - 1) % 256}.2/24",
+                               "description": f"Link to SR{r - 1}"})
+        if r < routers - 1:
+            interfaces.append({"name": "FastEthernet2/0", "ip": f"10.{r // 256}.{r % 256}.1/24",
+                               "description": f"Link to SR{r + 1}"})
+        inventory["hosts"][f"SR{r}"] = {"hostname": hostname, "port": port, "groups": ["cisco"],
+                                        "data": {"role": "sim_router", "interfaces": interfaces}}
+        port += 1
+    for h in range(hosts):
+        r = h % routers
+        lan = f"172.{16 + r // 256}.{r % 256}"
+        inventory["hosts"][f"SH{h}"] = {"hostname": hostname, "port": port, "groups": ["linux"],
+                                        "data": {"interface": "eth0", "ip": f"{lan}.{10 + h // routers}",
+                                                 "gateway": f"{lan}.1", "connected_to": f"SR{r}"}}
+        port += 1
+    return inventory
+
+
+async def record_session(listen_port: int, upstream_host: str, upstream_port: int, out_path: str,
+                         device: str = "", platform: str = "", host: str = "127.0.0.1") -> None:
+    """
+    Transparent proxy that records one client session against a real console.
+    Each line the client sends starts a new exchange; everything the device
+    sends until the next line is that exchange's output. The recording is
+    written when the client disconnects, after which the proxy stops.
+    """
+    done = asyncio.Event()
+
+    async def handle(client_reader, client_writer):
+        upstream_reader, upstream_writer = await asyncio.open_connection(upstream_host, upstream_port)
+        recording = {"device": device, "platform": platform, "banner": "", "prompt": "", "exchanges": []}
+
+        async def client_to_device():
+            pending = b""
+            while True:
+                data = await client_reader.read(4096)
+                if not data:
+                    break
+                upstream_writer.write(data)
+                await upstream_writer.drain()
+                pending += data
+                while True:
+                    match = re.search(rb"\r\n|\r|\n", pending)
+                    if not match:
+                        break
+                    line, pending = pending[:match.start()], pending[match.end():]
+                    recording["exchanges"].append({"command": line.decode('utf-8', errors='ignore'), "output": "",
+                                                   "sent_at": time.monotonic(), "latency": 0.0})
+
+        async def device_to_client():
+            while True:
+                data = await upstream_reader.read(4096)
+                if not data:
+                    break
+                client_writer.write(data)
+                await client_writer.drain()
+                text = data.decode('utf-8', errors='ignore')
+                if not recording["exchanges"]:
+                    recording["banner"] += text
+                    continue
+                exchange = recording["exchanges"][-1]
+                if not exchange["output"]:
+                    exchange["latency"] = round(time.monotonic() - exchange["sent_at"], 4)
+                exchange["output"] += text
+
+        relay = asyncio.ensure_future(device_to_client())
+        try:
+            await client_to_device()
+        finally:
+            await asyncio.sleep(0.5)  # let the last output arrive
+            relay.cancel()
+            upstream_writer.close()
+            client_writer.close()
+            for exchange in recording["exchanges"]:
+                exchange.pop("sent_at", None)
+            tail = recording["exchanges"][-1]["output"] if recording["exchanges"] else recording["banner"]
+            recording["prompt"] = tail.rstrip("\r\n").rsplit("\n", 1)[-1].lstrip("\r")
+            with open(out_path, 'w') as f:
+                json.dump(recording, f, indent=2)
+            logger.info("Recorded %d exchanges to %s", len(recording["exchanges"]), out_path)
+            done.set()
+
+    server = await asyncio.start_server(handle, host, listen_port)
+    async with server:
+        await done.wait()
+
+
+def _device_options(args) -> Dict[str, Any]:
+    command_latency = {}
+    for item in args.command_latency or []:
+        prefix, _, value = item.rpartition("=")
+        command_latency[prefix] = float(value)
+    return {"latency": args.latency, "jitter": args.jitter, "command_latency": command_latency,
+            "seed": args.seed}
+
+
+async def _serve(args) -> None:
+    import yaml
+
+    if args.routers or args.hosts:
+        inventory = synthetic_inventory(args.routers, args.hosts, base_port=args.base_port)
+    else:
+        with open(args.inventory, 'r') as f:
+            inventory = yaml.safe_load(f) or {}
+    sim = await ConsoleSimulator.from_inventory(inventory, host=args.bind, **_device_options(args))
+    if args.write_inventory:
+        with open(args.write_inventory, 'w') as f:
+            yaml.safe_dump(inventory, f, sort_keys=False)
+    logger.info("Serving %d simulated consoles on %s", len(sim.devices), args.bind)
+    async with sim:
+        await asyncio.Event().wait()
+
+
+async def _replay(args) -> None:
+    with open(args.recording, 'r') as f:
+        recording = json.load(f)
+    fallback = None
+    platform = args.platform or recording.get("platform")
+    name = recording.get("device") or "R1"
+    options = _device_options(args)
+    if platform == "linux":
+        fallback = LinuxDevice(name, **options)
+    elif platform == "cisco_ios":
+        fallback = IOSDevice(name, **options)
+    device = ReplayDevice(recording, fallback=fallback,
+                          use_recorded_latency=not args.latency and not args.command_latency, **options)
+    sim = ConsoleSimulator(args.bind)
+    await sim.add_device(device, args.port)
+    logger.info("Replaying %s on %s:%d", args.recording, args.bind, args.port)
+    async with sim:
+        await asyncio.Event().wait()
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="GNS3 console simulator")
+    sub = parser.add_subparsers(dest="mode", required=True)
+
+    def latency_options(p):
+        p.add_argument("--bind", default="127.0.0.1")
+        p.add_argument("--latency", type=float, default=0.0, help="Seconds before each command's output")
+        p.add_argument("--jitter", type=float, default=0.0, help="Extra random latency, 0..jitter seconds")
+        p.add_argument("--command-latency", action="append", metavar="PREFIX=SECONDS",
+                       help="Latency override for commands starting with PREFIX (repeatable)")
+        p.add_argument("--seed", type=int, default=None)
+
+    serve = sub.add_parser("serve", help="Serve an inventory (real or synthetic)")
+    serve.add_argument("--inventory", default="shared/inventory.yaml")
+    serve.add_argument("--routers", type=int, default=0)
+    serve.add_argument("--hosts", type=int, default=0)
+    serve.add_argument("--base-port", type=int, default=20000)
+    serve.add_argument("--write-inventory", help="Write the served inventory (with ports) to this file")
+    latency_options(serve)
+
+    record = sub.add_parser("record", help="Record a session through a proxy")
+    record.add_argument("--listen", type=int, required=True)
+    record.add_argument("--upstream", required=True, help="host:port of the real console")
+    record.add_argument("--out", required=True)
+    record.add_argument("--device", default="")
+    record.add_argument("--platform", default="", choices=["", "cisco_ios", "linux"])
+
+    replay = sub.add_parser("replay", help="Replay a recorded session")
+    replay.add_argument("recording")
+    replay.add_argument("--port", type=int, required=True)
+    replay.add_argument("--platform", default="", choices=["", "cisco_ios", "linux"])
+    latency_options(replay)
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(message)s")
+    try:
+        if args.mode == "serve":
+            asyncio.run(_serve(args))
+        elif args.mode == "replay":
+            asyncio.run(_replay(args))
+        else:
+            up_host, _, up_port = args.upstream.rpartition(":")
+            asyncio.run(record_session(args.listen, up_host or "localhost", int(up_port), args.out,
+                                       device=args.device, platform=args.platform))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
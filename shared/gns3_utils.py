@@ -1,162 +1,754 @@
-import socket
-import time
+import asyncio
+import json
 import re
-import yaml
-import os
+
+from shared.inventory_cache import inventory_cache
+from shared.metrics import metrics
 
 def load_inventory():
-    # Helper to find inventory relative to this file or cwd
-    paths = [
-        "../../shared/inventory.yaml",
-        "../shared/inventory.yaml",
-        "shared/inventory.yaml"
-    ]
-    for p in paths:
-        if os.path.exists(p):
-            with open(p, 'r') as f:
-                return yaml.safe_load(f)
-    return {}
+    # Parsed once per process and re-read only when inventory.yaml changes
+    try:
+        return inventory_cache.get()
+    except OSError:
+        return {}
 
-class GNS3Console:
-    def __init__(self, hostname, port, platform="cisco_ios"):
+# Prompts we recognise at the tail of the console buffer:
+#   IOS:   R1>  R1#  R1(config)#  R1(config-if)#
+#   Linux: root@pc1:~#  / # (busybox)  user@host:~$
+#   VPCS:  PC1>
+PROMPT_RE = re.compile(r"[\w.\-@:~/]+(?:\([\w.\-]+\))? ?[>#$%]\s*$")
+
+def _lines(output):
+    # Parsers take either the whole output or an iterable of lines (see stream_command)
+    return output.splitlines() if isinstance(output, str) else output
+
+def parse_ip_interface_brief_line(line):
+    """
+    Parses one line of Cisco 'show ip interface brief' output; returns None for
+    headers, prompts and anything else that is not an interface row.
+    """
+    # Typical output:
+    # Interface                  IP-Address      OK? Method Status                Protocol
+    # FastEthernet0/0            unassigned      YES unset  administratively down down
+    parts = line.split()
+    if len(parts) >= 5 and parts[0] != "Interface" and not parts[0].startswith("R1"):
+        # Simple heuristic to get interface name
+        if parts[0][0].isalpha():
+            # Method is at index 3. Status starts at index 4.
+            # Protocol is the last one, Status is everything in between
+            # ("administratively down" is 2 words, "up" is 1).
+            return {
+                "name": parts[0],
+                "ip": parts[1],
+                "status": " ".join(parts[4:-1]),
+                "protocol": parts[-1]
+            }
+    return None
+
+def parse_ip_interface_brief(output):
+    """
+    Parses Cisco 'show ip interface brief' output into a list of interface dicts.
+    """
+    interfaces = []
+    for line in _lines(output):
+        entry = parse_ip_interface_brief_line(line)
+        if entry:
+            interfaces.append(entry)
+    return interfaces
+
+# IOS 'show ip route' entries, e.g.
+#   C        10.0.12.0/24 is directly connected, FastEthernet2/0
+#   S*       0.0.0.0/0 [1/0] via 20.0.0.1
+#   O        10.0.23.0 [110/20] via 10.0.12.2, 00:01:02, FastEthernet2/0
+#                      [110/20] via 10.0.13.3, 00:01:02, FastEthernet3/0   (ECMP continuation)
+#        10.0.0.0/24 is subnetted, 3 subnets                                (mask for classful lines)
+IOS_ROUTE_RE = re.compile(r"^([A-Za-z*][A-Za-z0-9*]*(?: [A-Za-z0-9*]+)?)\s+(\d+\.\d+\.\d+\.\d+)(/\d+)?\s+(.*)$")
+IOS_NEXT_HOP_RE = re.compile(r"\[(\d+)/(\d+)\]\s+via\s+(\d+\.\d+\.\d+\.\d+)(?:,\s*[\d:dhwmy]+)?(?:,\s*(\S+))?")
+IOS_CONNECTED_RE = re.compile(r"is directly connected,\s*(\S+)")
+IOS_SUBNETTED_RE = re.compile(r"^\s+\d+\.\d+\.\d+\.\d+(/\d+)\s+is (?:variably )?subnetted")
+
+class ShowIpRouteParser:
+    """
+    Line-at-a-time parser for Cisco 'show ip route', so routes can be parsed
+    while the table is still streaming in. Results accumulate in `routes`.
+    """
+
+    def __init__(self):
+        self.routes = []
+        self._subnet_mask = None
+        self._last = None
+
+    def feed(self, line):
+        header = IOS_SUBNETTED_RE.match(line)
+        if header:
+            self._subnet_mask = header.group(1)
+            return
+        match = IOS_ROUTE_RE.match(line)
+        if match and not line.startswith("Gateway"):
+            code, network, mask, rest = match.groups()
+            if mask is None:
+                mask = self._subnet_mask or ""
+            prefix = f"{network}{mask}"
+            self._last = {"prefix": prefix, "protocol": code.strip()}
+            hop = IOS_NEXT_HOP_RE.search(rest)
+            if hop:
+                self.routes.append({**self._last, "next_hop": hop.group(3), "interface": hop.group(4),
+                                    "distance": int(hop.group(1)), "metric": int(hop.group(2))})
+                return
+            connected = IOS_CONNECTED_RE.search(rest)
+            self.routes.append({**self._last, "next_hop": None,
+                                "interface": connected.group(1) if connected else None,
+                                "distance": 0, "metric": 0})
+            return
+        hop = IOS_NEXT_HOP_RE.search(line)
+        if hop and self._last and line[:1].isspace():
+            self.routes.append({**self._last, "next_hop": hop.group(3), "interface": hop.group(4),
+                                "distance": int(hop.group(1)), "metric": int(hop.group(2))})
+
+def parse_show_ip_route(output):
+    """
+    Parses Cisco 'show ip route' output into route dicts:
+    {"prefix", "protocol", "next_hop", "interface", "distance", "metric"}.
+    ECMP routes yield one dict per next hop.
+    """
+    parser = ShowIpRouteParser()
+    for line in _lines(output):
+        parser.feed(line)
+    return parser.routes
+
+LINUX_ROUTE_DEST_RE = re.compile(r"^\d+\.\d+\.\d+\.\d+(/\d+)?$")
+
+def parse_linux_ip_route_line(line):
+    """
+    Parses one line of Linux 'ip route' output, e.g.
+      default via 40.0.0.99 dev eth0
+      40.0.0.0/24 dev eth0 proto kernel scope link src 40.0.0.10
+    """
+    parts = line.split()
+    if not parts:
+        return None
+    dest = parts[0]
+    if dest == "default":
+        dest = "0.0.0.0/0"
+    elif not LINUX_ROUTE_DEST_RE.match(dest):
+        return None
+    elif "/" not in dest:
+        dest += "/32"
+    fields = dict(zip(parts[1::2], parts[2::2])) if len(parts) > 1 else {}
+    return {
+        "prefix": dest,
+        "protocol": fields.get("proto", "static"),
+        "next_hop": fields.get("via"),
+        "interface": fields.get("dev"),
+        "distance": 0,
+        "metric": int(fields["metric"]) if fields.get("metric", "").isdigit() else 0,
+    }
+
+def parse_linux_ip_route(output):
+    """
+    Parses Linux 'ip route' output into route dicts (see parse_linux_ip_route_line).
+    """
+    routes = []
+    for line in _lines(output):
+        route = parse_linux_ip_route_line(line)
+        if route:
+            routes.append(route)
+    return routes
+
+def parse_linux_ip_addr(output):
+    """
+    Parses Linux 'ip -o -4 addr show' output, e.g.
+      2: eth0    inet 40.0.0.10/24 brd 40.0.0.255 scope global eth0\\  valid_lft forever ...
+    """
+    interfaces = []
+    for line in _lines(output):
+        match = re.match(r"^\d+:\s+(\S+?)(?:@\S+)?\s+inet\s+(\S+)", line)
+        if match:
+            interfaces.append({"name": match.group(1), "ip": match.group(2), "status": None, "protocol": None})
+    return interfaces
+
+# One console round trip for a Linux host's whole state. Each section is
+# preceded by a sentinel line; the echoed command line contains the sentinels
+# too, but never as a whole line, so it cannot be mistaken for one.
+LINUX_STATE_SECTIONS = ("addr", "route", "link")
+LINUX_STATE_CMD = "; ".join(
+    [f"echo =={name}==; ip -j {name}" for name in LINUX_STATE_SECTIONS] + ["echo ==end=="]
+)
+
+class LinuxStateCollector:
+    """
+    Line-at-a-time splitter for the output of LINUX_STATE_CMD: collects the
+    text of each sentinel-delimited section. `done` once the end sentinel is seen.
+    """
+
+    def __init__(self):
+        self.sections = {}
+        self.done = False
+        self._current = None
+
+    def feed(self, line):
+        marker = line.strip()
+        if marker.startswith("==") and marker.endswith("==") and len(marker) > 4:
+            name = marker[2:-2]
+            if name == "end":
+                self.done = True
+                self._current = None
+                return
+            if name in LINUX_STATE_SECTIONS:
+                self._current = name
+                self.sections[name] = []
+                return
+        if self._current is not None:
+            self.sections[self._current].append(line)
+
+def _json_section(lines):
+    # 'ip -j' prints one JSON document; anything else (e.g. 'Option "-j" is unknown') is None
+    text = "".join(line.strip() for line in lines or [])
+    start = text.find("[")
+    if start < 0:
+        return None
+    try:
+        data = json.loads(text[start:text.rfind("]") + 1])
+    except ValueError:
+        return None
+    return data if isinstance(data, list) else None
+
+def _linux_link_state(entry):
+    """(status, protocol) of an 'ip -j' link entry, in IOS terms."""
+    flags = entry.get("flags")
+    operstate = entry.get("operstate", "UNKNOWN")
+    if flags is not None and "UP" not in flags:
+        return "administratively down", "down"
+    carrier = "LOWER_UP" in flags if flags is not None else operstate != "DOWN"
+    if not carrier:
+        return "down", "down"
+    # lo and some virtual links report UNKNOWN while passing traffic
+    return "up", "up" if operstate in ("UP", "UNKNOWN") else "down"
+
+def parse_linux_ip_json(sections):
+    """
+    Parses the sections of LINUX_STATE_CMD ('ip -j addr/route/link') into
+    {"interfaces": [...], "routes": [...]}, using the same interface dicts as
+    parse_ip_interface_brief ("name", "ip", "status", "protocol", plus
+    "addresses", "mac", "mtu") and route dicts as parse_linux_ip_route.
+    Returns None when the host's iproute2 has no JSON output.
+    """
+    addrs = _json_section(sections.get("addr"))
+    if addrs is None:
+        return None
+    routes_json = _json_section(sections.get("route")) or []
+    links = {entry.get("ifname"): entry for entry in _json_section(sections.get("link")) or []}
+
+    interfaces = []
+    for entry in addrs:
+        name = entry.get("ifname")
+        link = {**entry, **links.get(name, {})}
+        info = [a for a in entry.get("addr_info", []) if a.get("local") and "prefixlen" in a]
+        addresses = [f"{a['local']}/{a['prefixlen']}" for a in info]
+        ipv4 = [f"{a['local']}/{a['prefixlen']}" for a in info if a.get("family") == "inet"]
+        status, protocol = _linux_link_state(link)
+        interfaces.append({
+            "name": name,
+            "ip": ipv4[0] if ipv4 else "unassigned",
+            "status": status,
+            "protocol": protocol,
+            "addresses": addresses,
+            "mac": link.get("address"),
+            "mtu": link.get("mtu"),
+        })
+
+    routes = []
+    for entry in routes_json:
+        dest = entry.get("dst", "")
+        if dest == "default":
+            dest = "0.0.0.0/0"
+        elif not LINUX_ROUTE_DEST_RE.match(dest):
+            continue
+        elif "/" not in dest:
+            dest += "/32"
+        routes.append({
+            "prefix": dest,
+            "protocol": entry.get("protocol", "static"),
+            "next_hop": entry.get("gateway"),
+            "interface": entry.get("dev"),
+            "distance": 0,
+            "metric": entry.get("metric", 0),
+        })
+    return {"interfaces": interfaces, "routes": routes}
+
+# IOS pager marker (" --More-- "). Both dash pairs are required, so a marker
+# cut short by a read boundary is only answered once it is complete.
+MORE_RE = re.compile(r"-+ ?More ?--+\s*$")
+
+def _erase_backspaces(text):
+    # Backspace deletes the character before it, as on the terminal. IOS erases
+    # the marker with backspace/space/backspace runs, which also wipes whatever
+    # part of it (its trailing space) arrived after drop_more() ran.
+    chars = []
+    for ch in text:
+        if ch == "\x08":
+            if chars:
+                chars.pop()
+        else:
+            chars.append(ch)
+    return "".join(chars)
+
+def _clean_line(text):
+    text = text.rstrip("\r\x00")
+    if "\x08" in text:
+        text = _erase_backspaces(text)
+    return text
+
+class LineBuffer:
+    """
+    Splits a console byte stream into decoded lines.
+
+    Chunks are copied once into a preallocated bytearray and lines are decoded
+    straight out of a memoryview over it. Only the current partial line (the
+    prompt, a --More-- marker, or a long single-line JSON answer) is kept
+    between chunks; it is moved to the front of the buffer only when the
+    buffer runs out of room, and the buffer doubles when that line outgrows
+    half of it. Total work stays linear in the output size and memory is
+    bounded by the longest line rather than the whole output.
+    """
+
+    def __init__(self, capacity=65536):
+        self._buf = bytearray(capacity)
+        self._view = memoryview(self._buf)
+        self._start = 0  # first byte of the partial line
+        self._end = 0    # end of buffered data
+        self.bytes = 0
+
+    def _make_room(self, n):
+        tail = self._end - self._start
+        if tail + n > len(self._buf) // 2:
+            size = len(self._buf)
+            while tail + n > size // 2:
+                size *= 2
+            new = bytearray(size)
+            new[:tail] = self._view[self._start:self._end]
+            self._view.release()
+            self._buf = new
+            self._view = memoryview(new)
+        else:
+            self._buf[:tail] = bytes(self._view[self._start:self._end])
+        self._start, self._end = 0, tail
+
+    def feed(self, data):
+        """Appends a chunk and returns the lines it completed."""
+        n = len(data)
+        self.bytes += n
+        if self._end + n > len(self._buf):
+            self._make_room(n)
+        scan = self._end
+        self._view[scan:scan + n] = data
+        self._end += n
+        lines = []
+        while True:
+            newline = self._buf.find(b"\n", scan, self._end)
+            if newline < 0:
+                break
+            lines.append(_clean_line(str(self._view[self._start:newline], 'utf-8', 'ignore')))
+            self._start = scan = newline + 1
+        if self._start == self._end:
+            self._start = self._end = 0
+        return lines
+
+    def tail(self, limit=256):
+        """The end of the partial line, where prompts and --More-- markers show up."""
+        start = max(self._start, self._end - limit)
+        return _clean_line(str(self._view[start:self._end], 'utf-8', 'ignore'))
+
+    def drop_more(self):
+        """Removes a trailing --More-- marker from the partial line."""
+        marker = self._buf.rfind(b"More", self._start, self._end)
+        if marker < 0:
+            return
+        end = marker
+        while end > self._start and self._buf[end - 1] in b"- ":
+            end -= 1
+        self._end = end
+
+    def flush(self):
+        """Returns the partial line (usually the prompt) and empties the buffer."""
+        text = _clean_line(str(self._view[self._start:self._end], 'utf-8', 'ignore'))
+        self._start = self._end = 0
+        return text
+
+class AsyncGNS3Console:
+    """
+    asyncio implementation of the GNS3 telnet console.
+
+    Reads return as soon as a prompt is seen at the end of the buffer, so a
+    command costs one device round trip instead of a fixed sleep. If no prompt
+    shows up, the read falls back to the old behaviour: wait at least
+    `wait_time`, then stop once the line has been idle for `idle_timeout`.
+
+    Output is read through a LineBuffer: `stream_command` yields lines as they
+    arrive, and IOS --More-- pages are answered automatically (paging is also
+    turned off with `terminal length 0` when an IOS session is opened).
+
+    A read that stops before a prompt (idle line, deadline, stream not read to
+    the end) may leave the rest of that command's output on the way, e.g. a
+    ping still printing dots. The next command first drains it up to the
+    prompt, and reconnects if none comes, so its read is not one command behind.
+    """
+
+    def __init__(self, hostname, port, platform="cisco_ios",
+                 connect_timeout=20.0, read_timeout=10.0, idle_timeout=0.5,
+                 chunk_size=65536):
         self.hostname = hostname
         self.port = port
         self.platform = platform
-        self.sock = None
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.idle_timeout = idle_timeout
+        self.chunk_size = chunk_size
+        self.reader = None
+        self.writer = None
+        # How the last read ended ("prompt", "idle", "deadline", "eof"; None while one is in progress)
+        self.last_end = "prompt"
 
-    def connect(self):
-        self.sock = socket.create_connection((self.hostname, self.port), timeout=20)
+    @property
+    def connected(self):
+        return self.writer is not None and not self.writer.is_closing()
+
+    async def connect(self):
+        with metrics.span("console.connect"):
+            self.reader, self.writer = await asyncio.wait_for(
+                asyncio.open_connection(self.hostname, self.port),
+                timeout=self.connect_timeout
+            )
         # Wake up console
-        self.sock.send(b"\r\n")
-        time.sleep(1)
-        self.read_until_prompt()
+        self._write(b"\r\n")
+        await self.writer.drain()
+        await self.read_until_prompt(wait_time=1.0)
+        # A fresh session starts in step even if the wake-up prompt was not recognised
+        self.last_end = "prompt"
+        if self.platform == "cisco_ios":
+            # Harmless "% Invalid input" if the line was left in config mode;
+            # --More-- pages are still answered by the reader in that case.
+            await self.send_command("terminal length 0", wait_time=0.5)
 
-    def send_command(self, cmd, wait_time=1.0):
-        if not self.sock:
-            self.connect()
-        
-        self.sock.send(cmd.encode('utf-8') + b"\r\n")
-        time.sleep(wait_time)
-        return self.read_buffer()
+    def _write(self, data):
+        metrics.inc("console_bytes_written_total", len(data))
+        self.writer.write(data)
 
-    def read_buffer(self):
-        out = b""
-        self.sock.settimeout(0.5)
-        try:
+    async def _resync(self):
+        """Drains output left by a read that stopped before its prompt; reconnects if no prompt comes."""
+        # The device answers nothing else until that command finishes, so wait for its prompt
+        await self.read_until_prompt(wait_time=self.read_timeout, timeout=self.read_timeout)
+        if self.last_end != "prompt":
+            metrics.inc("console_resyncs_total")
+            await self.close()
+            await self.connect()
+
+    async def send_command(self, cmd, wait_time=1.0):
+        if not self.connected:
+            await self.connect()
+        elif self.last_end != "prompt":
+            await self._resync()
+
+        self._write(cmd.encode('utf-8') + b"\r\n")
+        await self.writer.drain()
+        return await self.read_until_prompt(wait_time=wait_time)
+
+    async def stream_command(self, cmd, wait_time=1.0, timeout=None):
+        """
+        Sends a command and yields its output line by line as it arrives (the
+        echoed command first, the prompt last). Consume it to the end, or the
+        rest of the output is left for the next read.
+        """
+        if not self.connected:
+            await self.connect()
+        elif self.last_end != "prompt":
+            await self._resync()
+
+        self._write(cmd.encode('utf-8') + b"\r\n")
+        await self.writer.drain()
+        async for line in self.stream_until_prompt(wait_time=wait_time, timeout=timeout):
+            yield line
+
+    async def read_until_prompt(self, wait_time=1.0, timeout=None):
+        """
+        Reads console output until a prompt is detected.
+
+        Args:
+            wait_time: Minimum time to keep reading when no prompt is detected.
+            timeout: Hard upper bound for the read (default: wait_time + read_timeout).
+        """
+        lines = [line async for line in self.stream_until_prompt(wait_time, timeout)]
+        return "\n".join(lines)
+
+    async def stream_until_prompt(self, wait_time=1.0, timeout=None):
+        """Yields console lines until a prompt is detected (see read_until_prompt)."""
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        deadline = start + (timeout if timeout is not None else wait_time + self.read_timeout)
+        min_until = start + wait_time
+        buffer = LineBuffer(self.chunk_size)
+        last_data = start
+        end = "deadline"
+        pages = 0
+        # Stays None if the caller stops consuming before the read ends
+        self.last_end = None
+
+        with metrics.span("console.read"):
             while True:
-                data = self.sock.recv(4096)
-                if not data: break
-                out += data
-        except socket.timeout:
-            pass
-        return out.decode('utf-8', errors='ignore')
+                now = loop.time()
+                if now >= deadline:
+                    break
+                # Before wait_time has elapsed we only stop on a prompt; after it
+                # we also stop on an idle line.
+                if now < min_until:
+                    chunk_timeout = min(deadline, min_until) - now
+                else:
+                    chunk_timeout = min(deadline - now, self.idle_timeout)
+                try:
+                    data = await asyncio.wait_for(self.reader.read(self.chunk_size), timeout=chunk_timeout)
+                except asyncio.TimeoutError:
+                    # Idle means silent for idle_timeout, not just past wait_time
+                    now = loop.time()
+                    if now >= min_until and now - last_data >= self.idle_timeout:
+                        end = "idle"
+                        break
+                    continue
+                if not data:
+                    end = "eof"
+                    break
+                last_data = loop.time()
+                lines = buffer.feed(data)
+                for line in lines:
+                    yield line
+                tail = buffer.tail()
+                if MORE_RE.search(tail):
+                    buffer.drop_more()
+                    pages += 1
+                    self._write(b" ")
+                    await self.writer.drain()
+                    continue
+                if PROMPT_RE.search(tail if tail.strip() else (lines[-1] if lines else "")):
+                    end = "prompt"
+                    break
+            self.last_end = end
+            rest = buffer.flush()
+            if rest:
+                yield rest
 
-    def read_until_prompt(self):
-        # Naive approach: read anything pending
-        return self.read_buffer()
+        metrics.inc("console_bytes_read_total", buffer.bytes)
+        metrics.inc("console_reads_total", end=end)
+        if pages:
+            metrics.inc("console_more_pages_total", pages)
+        if end != "prompt":
+            # Time spent waiting on a silent line: the fixed cost of not seeing a prompt
+            metrics.inc("console_idle_wait_seconds_total", round(loop.time() - last_data, 6))
 
-    def configure_cisco(self, config_str):
+    async def read_buffer(self):
+        # Drain whatever is pending without waiting for a prompt
+        output = await self.read_until_prompt(wait_time=0, timeout=self.idle_timeout)
+        # The caller has taken the line as it is; the next command need not resync
+        self.last_end = "prompt"
+        return output
+
+    async def configure_cisco(self, config_str):
         output = ""
         # Ensure we are in a clean state
-        self.send_command("end", wait_time=0.5)
-        self.send_command("\r\n", wait_time=0.5)
-        
+        await self.send_command("end", wait_time=0.5)
+        await self.send_command("\r\n", wait_time=0.5)
+
         # Enter privileged mode
-        self.send_command("enable", wait_time=0.5)
-        
+        await self.send_command("enable", wait_time=0.5)
+
         # Enter config mode
-        self.send_command("configure terminal", wait_time=0.5)
-        
+        await self.send_command("configure terminal", wait_time=0.5)
+
         for line in config_str.splitlines():
             stripped = line.strip()
             if not stripped:
                 continue
-            
+
             # Skip commands that we already sent or shouldn't send in loop
             if stripped.lower() in ["enable", "configure terminal", "conf t", "end", "exit"]:
                 continue
-                
-            # Send command with sufficient delay for GNS3
-            output += self.send_command(stripped, wait_time=0.5)
-        
+
+            output += await self.send_command(stripped, wait_time=0.5)
+
         # Exit and save
-        self.send_command("end", wait_time=0.5)
-        self.send_command("write memory", wait_time=1.0)
-        self.send_command("\r\n", wait_time=1.0)
+        await self.send_command("end", wait_time=0.5)
+        await self.send_command("write memory", wait_time=1.0)
+        await self.send_command("\r\n", wait_time=1.0)
         return output
 
-    def configure_linux(self, config_str):
+    async def configure_linux(self, config_str):
         output = ""
         # Linux doesn't need enable/conf t
         # We assume the config_str is a series of shell commands
-        # or we try to be smart. For now, simple shell execution.
-        
         for line in config_str.splitlines():
             if line.strip():
-                output += self.send_command(line, wait_time=0.5)
-        
+                output += await self.send_command(line, wait_time=0.5)
+
         return output
 
-    def ping(self, target_ip):
-        # VPCS or Router ping
-        if self.platform == "linux" or "pc" in str(self.port): # VPCS/Linux
-             # VPCS ping: ping 10.0.0.1
-             # Linux: ping -c 4 10.0.0.1
-             cmd = f"ping {target_ip} -c 2" if self.platform == "linux" else f"ping {target_ip}"
-             out = self.send_command(cmd, wait_time=3.0)
-             return out
-             out = self.send_command(f"ping {target_ip}", wait_time=3.0)
-             return out
+    async def ping(self, target_ip):
+        # Linux: ping -c 2 10.0.0.1
+        # VPCS / Cisco IOS: ping 10.0.0.1
+        cmd = f"ping {target_ip} -c 2" if self.platform == "linux" else f"ping {target_ip}"
+        return await self.send_command(cmd, wait_time=3.0)
 
-    def get_interfaces(self):
+    async def get_interfaces(self):
         """
-        Returns a list of interfaces from the device with details.
-        Only implemented for Cisco so far.
+        Returns a list of interfaces from the device with details
+        (Cisco 'show ip interface brief', Linux 'ip -j addr/link').
         """
+        if self.platform == "linux":
+            return (await self.get_linux_state())["interfaces"]
         if self.platform != "cisco_ios":
-             # For mock/linux, return empty or mock? 
-             # Ideally we should support linux too (ip addr) but user focused on router.
             return []
 
-        # Send command
         # Ensure we are out of config mode
-        self.send_command("end", wait_time=0.5)
-        output = self.send_command("show ip interface brief", wait_time=1.0)
-        
-        # Parse output
+        await self.send_command("end", wait_time=0.5)
         interfaces = []
-        for line in output.splitlines():
-            # Typical output:
-            # Interface                  IP-Address      OK? Method Status                Protocol
-            # FastEthernet0/0            unassigned      YES unset  administratively down down    
-            parts = line.split()
-            if len(parts) >= 5 and parts[0] != "Interface" and not parts[0].startswith("R1"):
-                 # Simple heuristic to get interface name
-                 if parts[0][0].isalpha(): 
-                     # Check if Status is "administratively down" (2 words) or "up" (1 word)
-                     # Method is at index 3. Status starts at index 4.
-                     # Protocol is the last one.
-                     
-                     name = parts[0]
-                     ip = parts[1]
-                     # Status parsing is tricky because of spaces.
-                     # But usually Protocol is last.
-                     protocol = parts[-1]
-                     
-                     # Status is everything between Method and Protocol?
-                     # Method is parts[3]. 
-                     # Status = " ".join(parts[4:-1])
-                     status = " ".join(parts[4:-1])
-                     
-                     interfaces.append({
-                         "name": name,
-                         "ip": ip,
-                         "status": status,
-                         "protocol": protocol
-                     })
-        
+        async for line in self.stream_command("show ip interface brief", wait_time=1.0):
+            entry = parse_ip_interface_brief_line(line)
+            if entry:
+                interfaces.append(entry)
         return interfaces
 
+    async def get_routes(self):
+        """
+        Returns the routing table as a list of route dicts (Cisco and Linux).
+        """
+        if self.platform == "linux":
+            routes = []
+            async for line in self.stream_command("ip route", wait_time=0.5):
+                route = parse_linux_ip_route_line(line)
+                if route:
+                    routes.append(route)
+            return routes
+
+        await self.send_command("end", wait_time=0.5)
+        parser = ShowIpRouteParser()
+        async for line in self.stream_command("show ip route", wait_time=1.0):
+            parser.feed(line)
+        return parser.routes
+
+    async def get_running_config(self):
+        """
+        Returns the IOS running configuration as text, without the command
+        echo and the trailing prompt.
+        """
+        await self.send_command("end", wait_time=0.5)
+        lines = [line async for line in self.stream_command("show running-config", wait_time=1.0)]
+        if lines and lines[0].strip().endswith("show running-config"):
+            lines = lines[1:]
+        if lines and PROMPT_RE.search(lines[-1]):
+            lines = lines[:-1]
+        return "\n".join(lines)
+
+    async def get_linux_state(self):
+        """
+        Interfaces and routes of a Linux host in one console round trip
+        ({"interfaces": [...], "routes": [...]}, see parse_linux_ip_json).
+        Falls back to the text commands when 'ip -j' is not supported.
+        """
+        collector = LinuxStateCollector()
+        async for line in self.stream_command(LINUX_STATE_CMD, wait_time=0.5):
+            collector.feed(line)
+        if not collector.done:
+            # Something looking like a prompt cut the read short; keep reading up to the real one
+            async for line in self.stream_until_prompt(wait_time=0.5):
+                collector.feed(line)
+        state = parse_linux_ip_json(collector.sections)
+        if state is not None:
+            metrics.inc("linux_state_collect_total", mode="json")
+            return state
+        metrics.inc("linux_state_collect_total", mode="text")
+        output = await self.send_command("ip -o -4 addr show", wait_time=0.5)
+        interfaces = parse_linux_ip_addr(output)
+        routes = await self.get_routes()
+        return {"interfaces": interfaces, "routes": routes}
+
+    async def close(self):
+        if self.writer:
+            self.writer.close()
+            try:
+                await self.writer.wait_closed()
+            except (ConnectionError, OSError):
+                pass
+        self.reader = None
+        self.writer = None
+
+    async def __aenter__(self):
+        await self.connect()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
+class GNS3Console:
+    """
+    Blocking wrapper around AsyncGNS3Console for scripts and synchronous callers.
+    Each instance drives its own private event loop, so it must not be used from
+    inside a running loop (use AsyncGNS3Console there).
+    """
+
+    def __init__(self, hostname, port, platform="cisco_ios"):
+        self._console = AsyncGNS3Console(hostname, port, platform=platform)
+        self._loop = None
+
+    @property
+    def hostname(self):
+        return self._console.hostname
+
+    @property
+    def port(self):
+        return self._console.port
+
+    @property
+    def platform(self):
+        return self._console.platform
+
+    def _run(self, coro):
+        if self._loop is None or self._loop.is_closed():
+            self._loop = asyncio.new_event_loop()
+        return self._loop.run_until_complete(coro)
+
+    def connect(self):
+        return self._run(self._console.connect())
+
+    def send_command(self, cmd, wait_time=1.0):
+        return self._run(self._console.send_command(cmd, wait_time=wait_time))
+
+    def read_buffer(self):
+        return self._run(self._console.read_buffer())
+
+    def read_until_prompt(self):
+        return self._run(self._console.read_until_prompt())
+
+    def configure_cisco(self, config_str):
+        return self._run(self._console.configure_cisco(config_str))
+
+    def configure_linux(self, config_str):
+        return self._run(self._console.configure_linux(config_str))
+
+    def ping(self, target_ip):
+        return self._run(self._console.ping(target_ip))
+
+    def get_interfaces(self):
+        return self._run(self._console.get_interfaces())
+
+    def get_routes(self):
+        return self._run(self._console.get_routes())
+
+    def get_running_config(self):
+        return self._run(self._console.get_running_config())
+
+    def get_linux_state(self):
+        return self._run(self._console.get_linux_state())
+
     def close(self):
-        if self.sock:
-            self.sock.close()
+        if self._loop is None or self._loop.is_closed():
+            return
+        self._run(self._console.close())
+        self._loop.close()
+        self._loop = None
@@ -0,0 +1,67 @@
+import copy
+import hashlib
+import os
+import threading
+import yaml
+
+from shared.metrics import metrics
+
+# Canonical location of the Source of Truth, independent of the caller's cwd.
+# INVENTORY_PATH overrides it (e.g. to point servers at a scaled test inventory).
+INVENTORY_PATH = os.environ.get(
+    "INVENTORY_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "inventory.yaml")
+)
+
+class InventoryCache:
+    """
+    Parsed inventory.yaml shared by every server in the process.
+
+    The file is only re-parsed when its mtime or size changes, so servers that
+    call load_inventory() on every tool invocation pay for one stat() instead
+    of a YAML parse. The returned document is shared: treat it as read-only
+    and use get(copy_data=True) before mutating it.
+    """
+
+    def __init__(self, path=INVENTORY_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._data = None
+        self._revision = None
+
+    def _file_stamp(self):
+        st = os.stat(self.path)
+        return (st.st_mtime_ns, st.st_size)
+
+    def _reload_if_changed(self):
+        stamp = self._file_stamp()
+        with self._lock:
+            if stamp != self._stamp:
+                with open(self.path, 'rb') as f:
+                    raw = f.read()
+                with metrics.span("inventory.parse"):
+                    self._data = yaml.safe_load(raw.decode('utf-8')) or {}
+                # Content hash, so the revision is stable across processes and restarts
+                self._revision = hashlib.sha1(raw).hexdigest()[:12]
+                self._stamp = stamp
+            return self._data, self._revision
+
+    def get(self, copy_data=False):
+        """
+        Returns the parsed inventory. Raises OSError / yaml.YAMLError if the
+        file is missing or invalid.
+        """
+        data, _ = self._reload_if_changed()
+        return copy.deepcopy(data) if copy_data else data
+
+    def snapshot(self):
+        """Returns (parsed inventory, revision) from the same read. The data is shared and read-only."""
+        return self._reload_if_changed()
+
+    def invalidate(self):
+        with self._lock:
+            self._stamp = None
+            self._data = None
+            self._revision = None
+
+inventory_cache = InventoryCache()
@@ -0,0 +1,307 @@
+import contextvars
+import functools
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Tuple
+
+from shared.profiling import profiler
+
+logger = logging.getLogger(__name__)
+
+# Histogram bucket upper bounds, in seconds
+BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, float("inf"))
+
+# Optional Prometheus textfile (node_exporter textfile collector format),
+# rewritten at most every METRICS_FILE_INTERVAL seconds after a tool call.
+METRICS_FILE = os.environ.get("MCP_METRICS_FILE")
+METRICS_FILE_INTERVAL = float(os.environ.get("MCP_METRICS_FILE_INTERVAL", "5"))
+
+# The tool call a span belongs to, so console/YAML/Batfish time is attributed to it
+_current_tool: contextvars.ContextVar = contextvars.ContextVar("current_tool", default=None)
+
+class Histogram:
+    __slots__ = ("counts", "count", "total", "max")
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile (capped at the observed max)."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        for bound, n in zip(BUCKETS, self.counts):
+            seen += n
+            if seen >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "count": self.count,
+            "total_s": round(self.total, 6),
+            "mean_ms": round(self.total / self.count * 1000, 3) if self.count else 0.0,
+            "p50_ms": round(self.quantile(0.5) * 1000, 3),
+            "p99_ms": round(self.quantile(0.99) * 1000, 3),
+            "max_ms": round(self.max * 1000, 3),
+        }
+
+class MetricsRegistry:
+    """
+    Process-wide timing histograms and counters.
+
+    Tool calls are recorded as `tool_seconds{server,tool,status}`. Spans opened
+    while a tool runs (console I/O, inventory parsing, Batfish...) are recorded
+    as `span_seconds{span,tool}`, so a tool's time can be broken down by where
+    it went. Counters (console bytes, idle waits...) are labelled the same way.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], Histogram] = {}
+        self._counters: Dict[Tuple[str, Tuple[Tuple[str, str], ...]], float] = {}
+        self._started = time.time()
+        self._last_file_write = 0.0
+
+    @staticmethod
+    def _key(name: str, labels: Dict[str, Any]):
+        return name, tuple(sorted((k, str(v)) for k, v in labels.items() if v is not None))
+
+    def observe(self, name: str, seconds: float, **labels) -> None:
+        key = self._key(name, labels)
+        with self._lock:
+            hist = self._histograms.get(key)
+            if hist is None:
+                hist = self._histograms[key] = Histogram()
+            hist.observe(seconds)
+
+    def inc(self, name: str, value: float = 1, **labels) -> None:
+        labels.setdefault("tool", _current_tool.get())
+        key = self._key(name, labels)
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    @contextmanager
+    def span(self, name: str):
+        """Times a block and attributes it to the tool call in progress (if any)."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe("span_seconds", time.perf_counter() - start, span=name, tool=_current_tool.get())
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+            self._counters.clear()
+
+    def snapshot(self, server: Optional[str] = None, tools: Optional[set] = None) -> Dict[str, Any]:
+        """
+        JSON-friendly view. With `tools`, only those tools (and their spans and
+        counters) are included; process-wide entries without a tool label are kept.
+        """
+        def wanted(labels: Dict[str, str]) -> bool:
+            return tools is None or labels.get("tool") in tools or "tool" not in labels
+
+        out = {"server": server, "uptime_s": round(time.time() - self._started, 1),
+               "tools": {}, "spans": {}, "counters": {}}
+        with self._lock:
+            for (name, labels), hist in sorted(self._histograms.items()):
+                labels = dict(labels)
+                if not wanted(labels):
+                    continue
+                if name == "tool_seconds":
+                    entry = out["tools"].setdefault(labels["tool"], {})
+                    entry[labels.get("status", "ok")] = hist.summary()
+                elif name == "span_seconds":
+                    out["spans"].setdefault(labels.get("tool", "-"), {})[labels["span"]] = hist.summary()
+            for (name, labels), value in sorted(self._counters.items()):
+                labels = dict(labels)
+                if wanted(labels):
+                    out["counters"].setdefault(labels.get("tool", "-"), {})[name] = value
+
+        # Share of each tool's time spent in each span
+        for tool, spans in out["spans"].items():
+            total = sum(s.get("total_s", 0) for s in out["tools"].get(tool, {}).values())
+            if total:
+                for summary in spans.values():
+                    summary["share"] = round(summary["total_s"] / total, 3)
+        return out
+
+    def prometheus(self) -> str:
+        """Prometheus text exposition format."""
+        def fmt(labels):
+            return "{" + ",".join(f'{k}="{v}"' for k, v in labels) + "}" if labels else ""
+
+        lines = []
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+        for name in sorted({n for (n, _), _ in histograms}):
+            lines.append(f"# TYPE mcp_{name} histogram")
+            for (n, labels), hist in histograms:
+                if n != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(BUCKETS, hist.counts):
+                    cumulative += count
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(f"mcp_{name}_bucket{fmt(labels + (('le', le),))} {cumulative}")
+                lines.append(f"mcp_{name}_sum{fmt(labels)} {hist.total:.6f}")
+                lines.append(f"mcp_{name}_count{fmt(labels)} {hist.count}")
+        for name in sorted({n for (n, _), _ in counters}):
+            lines.append(f"# TYPE mcp_{name} counter")
+            for (n, labels), value in counters:
+                if n == name:
+                    lines.append(f"mcp_{name}{fmt(labels)} {value:g}")
+        return "\n".join(lines) + "\n"
+
+    def maybe_write_file(self) -> None:
+        if not METRICS_FILE:
+            return
+        now = time.monotonic()
+        if now - self._last_file_write < METRICS_FILE_INTERVAL:
+            return
+        self._last_file_write = now
+        tmp = f"{METRICS_FILE}.tmp"
+        try:
+            with open(tmp, 'w') as f:
+                f.write(self.prometheus())
+            os.replace(tmp, METRICS_FILE)
+        except OSError as e:
+            logger.warning("Could not write metrics file %s: %s", METRICS_FILE, e)
+
+metrics = MetricsRegistry()
+
+def _status(result: Any) -> str:
+    # Tools report most failures as return values rather than exceptions
+    if isinstance(result, str) and result.startswith(("Error", "FAILURE")):
+        return "error"
+    if isinstance(result, dict) and "error" in result:
+        return "error"
+    return "ok"
+
+def timed_tool(fn, server: str):
+    """Wraps a tool function so each call is timed and becomes the current tool for spans."""
+    if getattr(fn, "__instrumented__", False):
+        return fn
+    name = fn.__name__
+
+    def record(start, status, profile):
+        elapsed = time.perf_counter() - start
+        metrics.observe("tool_seconds", elapsed, server=server, tool=name, status=status)
+        if profile is not None and profiler.end(profile, elapsed):
+            metrics.inc("profiles_written_total", tool=name)
+        metrics.maybe_write_file()
+
+    if inspect.iscoroutinefunction(fn):
+        @functools.wraps(fn)
+        async def wrapper(*args, **kwargs):
+            token = _current_tool.set(name)
+            coroutine = fn(*args, **kwargs)
+            # The profiler follows this coroutine, not the event-loop thread it shares with other calls
+            profile = profiler.begin(server, name, coroutine=coroutine)
+            start = time.perf_counter()
+            status = "exception"
+            try:
+                result = await coroutine
+                status = _status(result)
+                return result
+            finally:
+                _current_tool.reset(token)
+                record(start, status, profile)
+    else:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            token = _current_tool.set(name)
+            profile = profiler.begin(server, name)
+            start = time.perf_counter()
+            status = "exception"
+            try:
+                result = fn(*args, **kwargs)
+                status = _status(result)
+                return result
+            finally:
+                _current_tool.reset(token)
+                record(start, status, profile)
+
+    wrapper.__instrumented__ = True
+    return wrapper
+
+def instrument_server(mcp, server: str) -> None:
+    """
+    Times every tool registered on `mcp` so far and adds a `metrics://<server>`
+    resource with this server's tool latencies, span breakdown and counters.
+    Also adds the `configure_profiling` and `list_profiles` tools (see
+    shared/profiling.py).
+    Call it after the last @mcp.tool definition.
+    """
+    if mcp._tool_manager.get_tool("list_profiles") is None:
+        _add_profiling_tools(mcp)
+
+    tool_names = set()
+    for tool in mcp._tool_manager.list_tools():
+        tool.fn = timed_tool(tool.fn, server)
+        tool_names.add(tool.name)
+
+    @mcp.resource(f"metrics://{server}", name=f"{server}_metrics", mime_type="application/json")
+    def server_metrics() -> str:
+        """Per-tool latency histograms, time per span (console, YAML, Batfish...) and console counters."""
+        return json.dumps(metrics.snapshot(server, tool_names), indent=2)
+
+def _add_profiling_tools(mcp) -> None:
+    # The profiler is process-wide, so servers mounted together share one pair of tools
+    @mcp.tool()
+    def configure_profiling(every_n: int = -1, slow_ms: float = -1, tools: Optional[List[str]] = None) -> Dict[str, Any]:
+        """
+        Turns on/off profiling of tool calls in this server process.
+
+        Args:
+            every_n: Run every Nth call of each tool under cProfile (0 = off, -1 = unchanged).
+            slow_ms: Stack-sample every call and keep the samples of calls slower than this (0 = off, -1 = unchanged).
+            tools: Only profile these tools (empty list = all, omitted = unchanged).
+
+        Returns:
+            Dict: The active profiling settings.
+        """
+        return profiler.configure(
+            every=every_n if every_n >= 0 else None,
+            slow_ms=slow_ms if slow_ms >= 0 else None,
+            tools=tools,
+        )
+
+    @mcp.tool()
+    def list_profiles(limit: int = 10, tool: str = "") -> List[Dict[str, Any]]:
+        """
+        Lists the most recent profiles (newest first) with their hottest functions or stacks.
+
+        .pstats files open with `python -m pstats` or snakeviz; .collapsed files
+        are folded stacks for flamegraph.pl or speedscope.
+
+        Args:
+            limit: Maximum number of profiles to return.
+            tool: Only profiles of this tool.
+
+        Returns:
+            List[Dict]: file, server, tool, duration_ms, kind, created and hot entries.
+        """
+        return profiler.list_profiles(limit, tool)
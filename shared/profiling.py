@@ -0,0 +1,269 @@
+import cProfile
+import io
+import itertools
+import os
+import pstats
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+from typing import Any, Dict, List, Optional
+
+# Opt-in, off by default. Either knob (or configure() at runtime) turns it on:
+#   MCP_PROFILE_EVERY=N      run every Nth call of each tool under cProfile (.pstats)
+#   MCP_PROFILE_SLOW_MS=T    stack-sample every call, keep samples of calls slower than T ms (.collapsed)
+#   MCP_PROFILE_TOOLS=a,b    only these tools (default: all)
+#   MCP_PROFILE_DIR          output directory (default: <tmp>/mcp_profiles)
+#   MCP_PROFILE_KEEP         newest files kept in the directory (default 50)
+PROFILE_DIR = os.environ.get("MCP_PROFILE_DIR", os.path.join(tempfile.gettempdir(), "mcp_profiles"))
+SAMPLE_INTERVAL = 0.005
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+def _awaiting_stack(coroutine) -> List[str]:
+    """Root-first labels of a suspended coroutine down the chain it is awaiting."""
+    stack = []
+    awaitable = coroutine
+    while awaitable is not None:
+        frame = getattr(awaitable, "cr_frame", None) or getattr(awaitable, "gi_frame", None)
+        if frame is None:
+            break
+        stack.append(_frame_label(frame))
+        awaitable = getattr(awaitable, "cr_await", None) or getattr(awaitable, "gi_yieldfrom", None)
+    return stack + ["(awaiting)"] if stack else []
+
+class StackSampler:
+    """
+    Samples the Python stacks of registered threads from one background
+    thread, which only runs while at least one call is being sampled.
+    Output is in collapsed-stack format (root;...;leaf count), ready for
+    flamegraph.pl or speedscope.
+
+    A call registered with its coroutine shares the event-loop thread with
+    every other task, so a sample only counts the thread's stack from that
+    coroutine's frame up when the coroutine is the one running. While it is
+    suspended, the sample records where it awaits (ending in "(awaiting)")
+    instead of whatever other task holds the thread.
+    """
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL):
+        self.interval = interval
+        self._lock = threading.Lock()
+        self._targets: Dict[int, tuple] = {}
+        self._ids = itertools.count()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self, thread_id: int, coroutine=None) -> int:
+        handle = next(self._ids)
+        with self._lock:
+            self._targets[handle] = (thread_id, coroutine, Counter())
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="mcp-stack-sampler", daemon=True)
+                self._thread.start()
+        return handle
+
+    def stop(self, handle: int) -> Counter:
+        with self._lock:
+            _, _, counts = self._targets.pop(handle, (None, None, Counter()))
+        return counts
+
+    @staticmethod
+    def _stack(frame, coroutine) -> List[str]:
+        stack = []
+        while frame is not None:
+            stack.append(_frame_label(frame))
+            if coroutine is not None and frame is coroutine.cr_frame:
+                return stack[::-1]
+            frame = frame.f_back
+        if coroutine is None:
+            return stack[::-1]
+        # Another task owns the thread: charge this call only with what it is waiting on
+        return _awaiting_stack(coroutine)
+
+    def _run(self) -> None:
+        while True:
+            with self._lock:
+                if not self._targets:
+                    self._thread = None
+                    return
+                targets = list(self._targets.values())
+            frames = sys._current_frames()
+            for thread_id, coroutine, counts in targets:
+                stack = self._stack(frames.get(thread_id), coroutine)
+                if stack:
+                    counts[";".join(stack)] += 1
+            time.sleep(self.interval)
+
+class ProfileSession:
+    __slots__ = ("server", "tool", "kind", "keep", "profile", "sample_handle", "started")
+
+    def __init__(self, server: str, tool: str, kind: str, keep: bool):
+        self.server = server
+        self.tool = tool
+        self.kind = kind
+        self.keep = keep  # written regardless of duration (every-Nth calls)
+        self.profile = None
+        self.sample_handle = None
+        self.started = time.time()
+
+class Profiler:
+    """Decides which tool calls to profile and writes profiles to a rotating directory."""
+
+    def __init__(self):
+        self.every = int(os.environ.get("MCP_PROFILE_EVERY", "0") or 0)
+        self.slow_ms = float(os.environ.get("MCP_PROFILE_SLOW_MS", "0") or 0)
+        self.tools = {t.strip() for t in os.environ.get("MCP_PROFILE_TOOLS", "").split(",") if t.strip()}
+        self.directory = PROFILE_DIR
+        self.keep = int(os.environ.get("MCP_PROFILE_KEEP", "50"))
+        self._lock = threading.Lock()
+        self._calls: Counter = Counter()
+        self._cprofile_active = False
+        self.sampler = StackSampler()
+
+    @property
+    def enabled(self) -> bool:
+        return self.every > 0 or self.slow_ms > 0
+
+    def configure(self, every: Optional[int] = None, slow_ms: Optional[float] = None,
+                  tools: Optional[List[str]] = None) -> Dict[str, Any]:
+        if every is not None:
+            self.every = max(0, int(every))
+        if slow_ms is not None:
+            self.slow_ms = max(0.0, float(slow_ms))
+        if tools is not None:
+            self.tools = {t for t in tools if t}
+        return self.settings()
+
+    def settings(self) -> Dict[str, Any]:
+        return {"every": self.every, "slow_ms": self.slow_ms, "tools": sorted(self.tools),
+                "directory": self.directory, "keep": self.keep}
+
+    def begin(self, server: str, tool: str, coroutine=None) -> Optional[ProfileSession]:
+        """
+        Starts profiling one call if it is selected. Pass the tool's coroutine
+        for async tools: they are only stack-sampled, never run under cProfile,
+        because cProfile hooks the whole event-loop thread and would charge the
+        call with every task that runs while it is suspended. Their every-Nth
+        profiles are therefore .collapsed files too.
+        """
+        if not self.enabled or (self.tools and tool not in self.tools):
+            return None
+        with self._lock:
+            self._calls[tool] += 1
+            nth = self.every > 0 and self._calls[tool] % self.every == 0
+            # cProfile is per-thread and cannot nest; overlapping calls fall back to sampling
+            use_cprofile = nth and coroutine is None and not self._cprofile_active
+            if use_cprofile:
+                self._cprofile_active = True
+        if use_cprofile:
+            session = ProfileSession(server, tool, "pstats", True)
+            session.profile = cProfile.Profile()
+            try:
+                session.profile.enable()
+                return session
+            except ValueError:
+                # Another profiler (debugger, coverage...) owns the hook
+                with self._lock:
+                    self._cprofile_active = False
+        if self.slow_ms > 0 or nth:
+            session = ProfileSession(server, tool, "collapsed", nth)
+            session.sample_handle = self.sampler.start(threading.get_ident(), coroutine)
+            return session
+        return None
+
+    def end(self, session: Optional[ProfileSession], seconds: float) -> Optional[str]:
+        if session is None:
+            return None
+        if session.profile is not None:
+            session.profile.disable()
+            with self._lock:
+                self._cprofile_active = False
+            return self._write(session, seconds, session.profile)
+        counts = self.sampler.stop(session.sample_handle)
+        if not counts or (not session.keep and seconds * 1000 < self.slow_ms):
+            return None
+        return self._write(session, seconds, counts)
+
+    def _write(self, session: ProfileSession, seconds: float, data) -> Optional[str]:
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(session.started))
+        name = (f"{stamp}.{int(session.started * 1000) % 1000:03d}--{session.server}--{session.tool}"
+                f"--{int(seconds * 1000)}ms.{session.kind}")
+        path = os.path.join(self.directory, name)
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            if session.kind == "pstats":
+                data.dump_stats(path)
+            else:
+                with open(path, 'w') as f:
+                    for stack, count in data.most_common():
+                        f.write(f"{stack} {count}\n")
+        except OSError:
+            return None
+        self._rotate()
+        return path
+
+    def _rotate(self) -> None:
+        try:
+            entries = [e for e in os.scandir(self.directory) if e.name.endswith((".pstats", ".collapsed"))]
+        except OSError:
+            return
+        entries.sort(key=lambda e: e.stat().st_mtime, reverse=True)
+        for entry in entries[self.keep:]:
+            try:
+                os.remove(entry.path)
+            except OSError:
+                pass
+
+    def list_profiles(self, limit: int = 10, tool: str = "", top: int = 5) -> List[Dict[str, Any]]:
+        """Newest profiles first, each with its hottest functions (pstats) or stacks (collapsed)."""
+        try:
+            entries = [e for e in os.scandir(self.directory) if e.name.endswith((".pstats", ".collapsed"))]
+        except OSError:
+            return []
+        entries.sort(key=lambda e: e.stat().st_mtime, reverse=True)
+        results = []
+        for entry in entries:
+            base, kind = entry.name.rsplit(".", 1)
+            parts = base.split("--")
+            if len(parts) != 4:
+                continue
+            _, server, tool_name, duration = parts
+            if tool and tool_name != tool:
+                continue
+            results.append({
+                "file": entry.path,
+                "server": server,
+                "tool": tool_name,
+                "duration_ms": int(duration[:-2]) if duration[:-2].isdigit() else None,
+                "kind": kind,
+                "created": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(entry.stat().st_mtime)),
+                "hot": self._hot(entry.path, kind, top),
+            })
+            if len(results) >= limit:
+                break
+        return results
+
+    @staticmethod
+    def _hot(path: str, kind: str, top: int) -> List[str]:
+        try:
+            if kind == "pstats":
+                stream = io.StringIO()
+                stats = pstats.Stats(path, stream=stream)
+                rows = sorted(stats.stats.items(), key=lambda item: item[1][3], reverse=True)[:top]
+                return [f"{os.path.basename(f)}:{line}({fn}) cum={cum * 1000:.1f}ms calls={nc}"
+                        for (f, line, fn), (cc, nc, tt, cum, _) in rows]
+            leaves: Counter = Counter()
+            total = 0
+            with open(path, 'r') as f:
+                for line in f:
+                    stack, _, count = line.rstrip("\n").rpartition(" ")
+                    leaves[stack.rsplit(";", 1)[-1]] += int(count)
+                    total += int(count)
+            return [f"{leaf} {count / total:.0%}" for leaf, count in leaves.most_common(top)]
+        except (OSError, ValueError, TypeError, EOFError):
+            return []
+
+profiler = Profiler()
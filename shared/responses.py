@@ -0,0 +1,176 @@
+import hashlib
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+# Tools return compact summaries; the raw output behind them (console
+# transcripts, whole files) is kept here and fetched with get_transcript.
+
+# Newest transcripts kept per process, and their total size in bytes
+TRANSCRIPT_KEEP = int(os.environ.get("MCP_TRANSCRIPT_KEEP", "256"))
+TRANSCRIPT_MAX_BYTES = int(os.environ.get("MCP_TRANSCRIPT_MAX_BYTES", str(16 << 20)))
+
+# Device errors quoted inline; the rest are counted
+MAX_INLINE_ERRORS = 10
+
+# Device replies that mean a command was rejected
+DEVICE_ERROR_RE = re.compile(
+    r"^% (?:Invalid|Incomplete|Ambiguous|Unknown)|RTNETLINK answers|^Error:|Cannot find device|command not found",
+    re.MULTILINE,
+)
+# A prompt followed by the echo of the next command: "R1(config-if)#ip address ...", "root@pc1:~# ip route ..."
+ECHO_RE = re.compile(r"^[\w.\-@:~/]+(?:\([\w.\-]+\))? ?[>#$%] ?(\S.*)$")
+
+IOS_PING_RE = re.compile(r"Success rate is (\d+) percent(?: \((\d+)/(\d+)\))?")
+LINUX_PING_RE = re.compile(r"(?<!\d)(\d+)% packet loss")
+LINUX_PING_COUNTS_RE = re.compile(r"(\d+) packets transmitted, (\d+) (?:packets )?received")
+# IOS "round-trip min/avg/max = 1/2/4 ms", Linux "rtt min/avg/max/mdev = 0.1/0.2/0.3/0.05 ms"
+PING_RTT_RE = re.compile(r"min/avg/max(?:/mdev)? = ([\d.]+)/([\d.]+)/([\d.]+)")
+
+class TranscriptStore:
+    """
+    Raw tool output kept in memory, oldest dropped first once there are more
+    than `keep` entries or `max_bytes` in total. The id is derived from the
+    content, so storing the same text again (an unchanged file) reuses it.
+    """
+
+    def __init__(self, keep: int = TRANSCRIPT_KEEP, max_bytes: int = TRANSCRIPT_MAX_BYTES):
+        self.keep = keep
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def put(self, text: str, tool: str = "", device: Optional[str] = None) -> str:
+        text = text.replace("\r\n", "\n").replace("\r", "\n")
+        ref = "t" + hashlib.sha1(f"{tool}\0{device}\0{text}".encode()).hexdigest()[:12]
+        with self._lock:
+            if ref in self._entries:
+                self._entries.move_to_end(ref)
+                return ref
+            size = len(text.encode())
+            self._entries[ref] = {"tool": tool, "device": device, "created": time.time(),
+                                  "bytes": size, "lines": text.split("\n")}
+            self._bytes += size
+            while len(self._entries) > 1 and (len(self._entries) > self.keep or self._bytes > self.max_bytes):
+                _, old = self._entries.popitem(last=False)
+                self._bytes -= old["bytes"]
+        return ref
+
+    def get(self, ref: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            return self._entries.get(ref)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"transcripts": len(self._entries), "bytes": self._bytes,
+                "keep": self.keep, "max_bytes": self.max_bytes}
+
+transcripts = TranscriptStore()
+
+def device_errors(lines: List[str]) -> List[Dict[str, Any]]:
+    """Rejected commands in a console transcript: 1-based line number, device message and the command echoed before it."""
+    errors = []
+    command = None
+    for number, line in enumerate(lines, 1):
+        text = line.strip()
+        echo = ECHO_RE.match(text)
+        if number == 1 or echo:
+            # The first line is the echo of the first command (its prompt was read earlier)
+            command = echo.group(1) if echo else text
+        if DEVICE_ERROR_RE.search(text):
+            errors.append({"line": number, "message": text, "command": command})
+    return errors
+
+def with_transcript(result: Dict[str, Any], output: str, tool: str, device: Optional[str] = None,
+                    scan_errors: bool = True) -> Dict[str, Any]:
+    """
+    Stores `output` and adds its reference to `result`, with the device errors
+    found in it (first MAX_INLINE_ERRORS quoted with their line numbers).
+    """
+    ref = transcripts.put(output or "", tool, device)
+    lines = transcripts.get(ref)["lines"]
+    if scan_errors:
+        errors = device_errors(lines)
+        if errors:
+            result["device_errors"] = errors[:MAX_INLINE_ERRORS]
+            if len(errors) > MAX_INLINE_ERRORS:
+                result["device_errors_total"] = len(errors)
+    result["transcript_id"] = ref
+    result["transcript_lines"] = len(lines)
+    return result
+
+def parse_ping(output: str) -> Dict[str, Any]:
+    """IOS or Linux ping output -> {"reachable", "sent", "received", "loss_percent", "rtt_ms"} (fields found)."""
+    summary: Dict[str, Any] = {}
+    ios = IOS_PING_RE.search(output)
+    linux = LINUX_PING_RE.search(output)
+    if ios:
+        summary["loss_percent"] = 100 - int(ios.group(1))
+        if ios.group(2):
+            summary["received"], summary["sent"] = int(ios.group(2)), int(ios.group(3))
+    elif linux:
+        summary["loss_percent"] = int(linux.group(1))
+        counts = LINUX_PING_COUNTS_RE.search(output)
+        if counts:
+            summary["sent"], summary["received"] = int(counts.group(1)), int(counts.group(2))
+    rtt = PING_RTT_RE.search(output)
+    if rtt:
+        summary["rtt_ms"] = {"min": float(rtt.group(1)), "avg": float(rtt.group(2)), "max": float(rtt.group(3))}
+    if "loss_percent" in summary:
+        summary["reachable"] = summary["loss_percent"] < 100
+    else:
+        summary["reachable"] = "!!!!" in output or "bytes from" in output
+    return summary
+
+def get_transcript(transcript_id: str, start_line: int = 1, max_lines: int = 200,
+                   match: str = "") -> Dict[str, Any]:
+    """One page of a stored transcript, or the lines containing `match` (with their numbers)."""
+    entry = transcripts.get(transcript_id)
+    if entry is None:
+        return {"error": f"Transcript '{transcript_id}' not found (expired or from another server process)"}
+    lines = entry["lines"]
+    result = {"transcript_id": transcript_id, "tool": entry["tool"], "device": entry["device"],
+              "created": entry["created"], "total_lines": len(lines)}
+    if match:
+        hits = [{"line": n, "text": line} for n, line in enumerate(lines, 1) if match in line]
+        result["matches"] = hits[:max_lines]
+        result["truncated"] = len(hits) > max_lines
+        return result
+    start = max(1, start_line)
+    page = lines[start - 1:start - 1 + max_lines]
+    result["start_line"] = start
+    result["text"] = "\n".join(page)
+    result["truncated"] = start - 1 + len(page) < len(lines)
+    return result
+
+def register_transcript_tool(mcp) -> None:
+    """
+    Adds the `get_transcript` tool to a server whose tools return transcript ids.
+    Transcripts live in this process, so servers mounted together share one tool.
+    Call it before instrument_server so the tool is timed too.
+    """
+    if mcp._tool_manager.get_tool("get_transcript") is not None:
+        return
+
+    @mcp.tool(name="get_transcript")
+    def get_transcript_tool(transcript_id: str, start_line: int = 1, max_lines: int = 200,
+                            match: str = "") -> Dict[str, Any]:
+        """
+        Returns the raw output behind a compact tool result (console transcript,
+        full file), one page at a time. Tool results refer to it by `transcript_id`
+        and quote device errors with their line numbers.
+
+        Args:
+            transcript_id: The `transcript_id` from a tool result.
+            start_line: First line to return (1-based).
+            max_lines: Maximum number of lines.
+            match: Only return the lines containing this text, with their line numbers.
+
+        Returns:
+            Dict: tool, device, total_lines and the page ("text") or "matches";
+                  "error" if the transcript expired from the bounded store.
+        """
+        return get_transcript(transcript_id, start_line, max_lines, match)
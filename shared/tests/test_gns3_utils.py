@@ -0,0 +1,212 @@
+import asyncio
+import json
+import os
+import sys
+
+import pytest
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "../../"))
+from shared.console_sim import ConsoleSimulator, IOSDevice
+from shared.gns3_utils import (AsyncGNS3Console, LINUX_STATE_CMD, LineBuffer, LinuxStateCollector, MORE_RE,
+                               PROMPT_RE, ShowIpRouteParser, parse_ip_interface_brief, parse_linux_ip_json,
+                               parse_linux_ip_route, parse_show_ip_route)
+
+SHOW_IP_ROUTE = """R1#show ip route
+Codes: L - local, C - connected, S - static, R - RIP, M - mobile, B - BGP
+       D - EIGRP, EX - EIGRP external, O - OSPF, IA - OSPF inter area
+       * - candidate default, U - per-user static route, o - ODR
+
+Gateway of last resort is 20.0.0.1 to network 0.0.0.0
+
+S*       0.0.0.0/0 [1/0] via 20.0.0.1
+     10.0.0.0/24 is subnetted, 2 subnets
+O        10.0.23.0 [110/20] via 10.0.12.2, 00:01:02, FastEthernet2/0
+                   [110/20] via 10.0.13.3, 00:01:02, FastEthernet3/0
+C        10.0.12.0 is directly connected, FastEthernet2/0
+     10.0.0.0/8 is variably subnetted, 2 subnets, 2 masks
+L        10.0.12.1/32 is directly connected, FastEthernet2/0
+O IA     172.16.0.0/16 [110/30] via 10.0.12.2, 1d02h, FastEthernet2/0
+R1#"""
+
+# --- IOS parsers ---
+
+def test_show_ip_route_codes_masks_and_ecmp():
+    routes = parse_show_ip_route(SHOW_IP_ROUTE)
+    by_prefix = {}
+    for route in routes:
+        by_prefix.setdefault(route["prefix"], []).append(route)
+    assert by_prefix["0.0.0.0/0"][0]["protocol"] == "S*"
+    assert by_prefix["0.0.0.0/0"][0]["next_hop"] == "20.0.0.1"
+    # Classful entries take the mask of the "is subnetted" header above them
+    assert [r["next_hop"] for r in by_prefix["10.0.23.0/24"]] == ["10.0.12.2", "10.0.13.3"]
+    assert [r["interface"] for r in by_prefix["10.0.23.0/24"]] == ["FastEthernet2/0", "FastEthernet3/0"]
+    assert by_prefix["10.0.12.0/24"][0]["next_hop"] is None
+    assert by_prefix["10.0.12.0/24"][0]["interface"] == "FastEthernet2/0"
+    assert by_prefix["10.0.12.1/32"][0]["protocol"] == "L"
+    assert by_prefix["172.16.0.0/16"][0]["protocol"] == "O IA"
+    assert by_prefix["172.16.0.0/16"][0]["metric"] == 30
+    assert len(routes) == 6
+
+def test_show_ip_route_streamed_line_by_line_matches_whole_output():
+    parser = ShowIpRouteParser()
+    for line in SHOW_IP_ROUTE.splitlines():
+        parser.feed(line)
+    assert parser.routes == parse_show_ip_route(SHOW_IP_ROUTE)
+
+def test_show_ip_route_without_routes():
+    assert parse_show_ip_route("Gateway of last resort is not set\n\nR1#") == []
+
+def test_ip_interface_brief_two_word_status():
+    output = """Interface                  IP-Address      OK? Method Status                Protocol
+FastEthernet0/0            10.0.0.1        YES manual up                    up
+FastEthernet0/1            unassigned      YES unset  administratively down down"""
+    interfaces = parse_ip_interface_brief(output)
+    assert interfaces == [
+        {"name": "FastEthernet0/0", "ip": "10.0.0.1", "status": "up", "protocol": "up"},
+        {"name": "FastEthernet0/1", "ip": "unassigned", "status": "administratively down", "protocol": "down"},
+    ]
+
+# --- Linux parsers ---
+
+def test_linux_ip_route_text():
+    output = """default via 40.0.0.99 dev eth0
+40.0.0.0/24 dev eth0 proto kernel scope link src 40.0.0.10
+10.9.9.9 via 40.0.0.1 dev eth0 metric 100
+root@pc1:~#"""
+    routes = parse_linux_ip_route(output)
+    assert [r["prefix"] for r in routes] == ["0.0.0.0/0", "40.0.0.0/24", "10.9.9.9/32"]
+    assert routes[0]["next_hop"] == "40.0.0.99"
+    assert routes[1]["protocol"] == "kernel"
+    assert routes[2]["metric"] == 100
+
+def _sections(addr, route, link):
+    return {"addr": [json.dumps(addr)], "route": [json.dumps(route)], "link": [json.dumps(link)]}
+
+def test_linux_ip_json_interfaces_and_link_states():
+    addr = [
+        {"ifname": "lo", "addr_info": [{"family": "inet", "local": "127.0.0.1", "prefixlen": 8}]},
+        {"ifname": "eth0", "addr_info": [{"family": "inet6", "local": "fe80::1", "prefixlen": 64},
+                                         {"family": "inet", "local": "40.0.0.10", "prefixlen": 24}]},
+        {"ifname": "eth1", "addr_info": []},
+        {"ifname": "eth2", "addr_info": []},
+    ]
+    link = [
+        {"ifname": "lo", "flags": ["LOOPBACK", "UP", "LOWER_UP"], "operstate": "UNKNOWN"},
+        {"ifname": "eth0", "flags": ["BROADCAST", "UP", "LOWER_UP"], "operstate": "UP",
+         "address": "52:54:00:12:34:56", "mtu": 1500},
+        {"ifname": "eth1", "flags": ["BROADCAST"], "operstate": "DOWN"},
+        {"ifname": "eth2", "flags": ["BROADCAST", "UP", "NO-CARRIER"], "operstate": "DOWN"},
+    ]
+    state = parse_linux_ip_json(_sections(addr, [], link))
+    interfaces = {i["name"]: i for i in state["interfaces"]}
+    assert (interfaces["lo"]["status"], interfaces["lo"]["protocol"]) == ("up", "up")
+    assert interfaces["eth0"]["ip"] == "40.0.0.10/24"
+    assert interfaces["eth0"]["addresses"] == ["fe80::1/64", "40.0.0.10/24"]
+    assert interfaces["eth0"]["mac"] == "52:54:00:12:34:56"
+    assert interfaces["eth1"]["status"] == "administratively down"
+    assert (interfaces["eth2"]["status"], interfaces["eth2"]["protocol"]) == ("down", "down")
+    assert interfaces["eth2"]["ip"] == "unassigned"
+
+def test_linux_ip_json_routes():
+    route = [
+        {"dst": "default", "gateway": "40.0.0.99", "dev": "eth0"},
+        {"dst": "40.0.0.0/24", "dev": "eth0", "protocol": "kernel"},
+        {"dst": "10.9.9.9", "gateway": "40.0.0.1", "dev": "eth0", "metric": 100},
+        {"dst": "fe80::/64", "dev": "eth0"},
+    ]
+    state = parse_linux_ip_json(_sections([], route, []))
+    assert [r["prefix"] for r in state["routes"]] == ["0.0.0.0/0", "40.0.0.0/24", "10.9.9.9/32"]
+    assert state["routes"][2]["metric"] == 100
+
+def test_linux_ip_json_without_json_support():
+    sections = {"addr": ['Option "-j" is unknown, try "ip -help".'], "route": [], "link": []}
+    assert parse_linux_ip_json(sections) is None
+
+def test_linux_ip_json_ignores_text_around_the_document():
+    sections = {"addr": ["ip -j addr", '[{"ifname": "eth0",', '"addr_info": []}]', "trailing"]}
+    state = parse_linux_ip_json(sections)
+    assert [i["name"] for i in state["interfaces"]] == ["eth0"]
+
+def test_linux_state_collector_skips_the_echoed_command():
+    collector = LinuxStateCollector()
+    lines = [LINUX_STATE_CMD, "==addr==", "[]", "==route==", "[]", "==link==", "[]", "==end==", "root@pc1:~#"]
+    for line in lines:
+        collector.feed(line)
+    assert collector.done
+    assert collector.sections == {"addr": ["[]"], "route": ["[]"], "link": ["[]"]}
+
+# --- LineBuffer and --More-- paging ---
+
+def test_line_buffer_lines_split_across_chunks():
+    buffer = LineBuffer(capacity=16)
+    assert buffer.feed(b"first li") == []
+    assert buffer.feed(b"ne\r\nsecond\r") == ["first line"]
+    assert buffer.feed(b"\nR1#") == ["second"]
+    assert buffer.tail() == "R1#"
+    assert buffer.flush() == "R1#"
+    assert buffer.flush() == ""
+
+def test_line_buffer_grows_for_a_line_longer_than_its_capacity():
+    buffer = LineBuffer(capacity=8)
+    long_line = b"x" * 1000
+    for i in range(0, len(long_line), 7):
+        assert buffer.feed(long_line[i:i + 7]) == []
+    assert buffer.feed(b"\nnext\n") == ["x" * 1000, "next"]
+    assert buffer.bytes == 1006
+
+def test_line_buffer_more_marker_split_across_chunks():
+    buffer = LineBuffer(capacity=32)
+    assert buffer.feed(b"line 1\r\nline 2\r\n --Mo") == ["line 1", "line 2"]
+    assert not MORE_RE.search(buffer.tail())
+    buffer.feed(b"re-- ")
+    assert MORE_RE.search(buffer.tail())
+    buffer.drop_more()
+    # IOS erases the marker with backspaces before the next line
+    lines = buffer.feed(b"\x08" * 9 + b" " * 9 + b"\x08" * 9 + b"line 3\r\nR1#")
+    assert lines == ["line 3"]
+    assert PROMPT_RE.search(buffer.tail())
+
+def test_more_marker_is_answered_only_once_complete():
+    buffer = LineBuffer()
+    buffer.feed(b"line 1\r\n --More-")
+    assert not MORE_RE.search(buffer.tail())
+    buffer.feed(b"- ")
+    assert MORE_RE.search(buffer.tail())
+
+def test_erase_sequence_removes_the_marker_space_that_arrived_late():
+    buffer = LineBuffer()
+    buffer.feed(b"line 1\r\n --More--")
+    assert MORE_RE.search(buffer.tail())
+    buffer.drop_more()
+    lines = buffer.feed(b" " + b"\x08" * 9 + b" " * 9 + b"\x08" * 9 + b"O        10.0.1.0/24\r\n")
+    assert lines == ["O        10.0.1.0/24"]
+
+def test_line_buffer_prompt_split_across_chunks():
+    buffer = LineBuffer()
+    buffer.feed(b"output\r\nR1(conf")
+    assert not PROMPT_RE.search(buffer.tail())
+    buffer.feed(b"ig-if)#")
+    assert PROMPT_RE.search(buffer.tail())
+
+@pytest.mark.parametrize("chunk_size", [5, 64, 65536])
+def test_paged_show_ip_route_over_a_console(chunk_size):
+    learned = [{"prefix": f"10.{i // 256}.{i % 256}.0/24", "next_hop": "10.255.0.2"} for i in range(150)]
+    device = IOSDevice("R1", interfaces=[{"name": "FastEthernet0/0", "ip": "10.255.0.1/24"}], routes=learned)
+
+    async def run():
+        simulator = ConsoleSimulator()
+        port = await simulator.add_device(device)
+        console = AsyncGNS3Console("127.0.0.1", port, chunk_size=chunk_size)
+        try:
+            await console.connect()
+            # connect() turns paging off; turn it back on to exercise the --More-- handling
+            device.terminal_length = 24
+            return await console.get_routes(), console.last_end
+        finally:
+            await console.close()
+            await simulator.stop()
+
+    routes, end = asyncio.run(run())
+    assert end == "prompt"
+    assert len(routes) == len(learned) + 1
+    assert {r["prefix"] for r in routes} >= {r["prefix"] for r in learned}
@@ -0,0 +1,379 @@
+import bisect
+import ipaddress
+import logging
+import os
+import threading
+from collections import deque
+from typing import Any, Dict, List, Optional, Tuple
+
+import yaml
+
+from shared.inventory_cache import inventory_cache
+
+logger = logging.getLogger(__name__)
+
+TOPOLOGY_PATH = os.environ.get(
+    "TOPOLOGY_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "topology_physical.yaml")
+)
+
+def _norm(name: str) -> str:
+    # topology_physical.yaml uses lowercase names (pc3), inventory uses PC3
+    return str(name).lower()
+
+class TopologyGraph:
+    """
+    In-memory graph of the lab built from topology_physical.yaml and the
+    interfaces declared in inventory.yaml.
+
+    Links are multi-access segments: a link with N endpoints makes every pair
+    of its devices adjacent. Shortest-path trees are cached per source device,
+    so repeated path() queries only walk the tree.
+    """
+
+    def __init__(self):
+        self.devices: Dict[str, Dict[str, Any]] = {}           # key -> {"name", "type"}
+        self.links: Dict[str, Dict[str, Any]] = {}             # link id -> link
+        self.adjacency: Dict[str, Dict[str, List[str]]] = {}   # device -> neighbor -> [link ids]
+        self._device_links: Dict[str, List[str]] = {}
+        self._endpoint_index: Dict[Tuple[str, str], str] = {}  # (device, interface) -> link id
+        self._subnet_index: Dict[Any, List[str]] = {}
+        self._subnet_sorted: List[Tuple[int, int, Any]] = []   # (version, network int, network)
+        self._bfs_cache: Dict[str, Dict[str, Optional[Tuple[str, str]]]] = {}
+        self._lock = threading.Lock()
+
+    # --- Building ---
+
+    def add_device(self, name: str, type_: Optional[str] = None) -> str:
+        key = _norm(name)
+        dev = self.devices.setdefault(key, {"name": name, "type": type_})
+        if type_ and not dev["type"]:
+            dev["type"] = type_
+        self.adjacency.setdefault(key, {})
+        self._device_links.setdefault(key, [])
+        return key
+
+    def add_link(self, endpoints: List[Dict[str, str]], subnet: Optional[str] = None,
+                 description: str = "", link_id: Optional[str] = None, source: str = "physical") -> str:
+        link_id = link_id or f"L{len(self.links) + 1}"
+        eps = []
+        for ep in endpoints:
+            key = self.add_device(ep["device"])
+            eps.append({"device": self.devices[key]["name"], "interface": ep.get("interface")})
+            if ep.get("interface"):
+                self._endpoint_index[(key, ep["interface"].lower())] = link_id
+            self._device_links[key].append(link_id)
+
+        network = None
+        if subnet:
+            try:
+                network = ipaddress.ip_network(subnet, strict=False)
+            except ValueError:
+                logger.warning("Ignoring invalid subnet %s on link %s", subnet, link_id)
+
+        self.links[link_id] = {
+            "id": link_id,
+            "endpoints": eps,
+            "subnet": str(network) if network else None,
+            "description": description,
+            "source": source,
+        }
+        if network is not None:
+            if network not in self._subnet_index:
+                bisect.insort(self._subnet_sorted, (network.version, int(network.network_address), network))
+            self._subnet_index.setdefault(network, []).append(link_id)
+
+        keys = [_norm(ep["device"]) for ep in eps]
+        for a in keys:
+            for b in keys:
+                if a != b:
+                    self.adjacency[a].setdefault(b, []).append(link_id)
+        return link_id
+
+    @classmethod
+    def from_sources(cls, physical: Dict[str, Any], inventory: Dict[str, Any]) -> "TopologyGraph":
+        graph = cls()
+        physical = physical or {}
+        inventory = inventory or {}
+
+        for name, role in (physical.get("device_roles") or {}).items():
+            graph.add_device(name, (role or {}).get("type"))
+        for name, host in (inventory.get("hosts") or {}).items():
+            groups = (host or {}).get("groups") or []
+            graph.add_device(name, groups[0] if groups else None)
+
+        for i, link in enumerate(physical.get("links") or []):
+            graph.add_link(
+                link.get("endpoints") or [],
+                subnet=link.get("subnet"),
+                description=link.get("description", ""),
+                link_id=link.get("id") or f"L{i + 1}",
+            )
+
+        graph._add_inventory_links(inventory)
+        return graph
+
+    def _add_inventory_links(self, inventory: Dict[str, Any]) -> None:
+        """
+        Derives segments from inventory addressing: interfaces that share a
+        subnet are on the same link. Endpoints already described in
+        topology_physical.yaml are skipped.
+        """
+        segments: Dict[Any, List[Dict[str, str]]] = {}
+        hosts_without_prefix = []
+
+        for name, host in (inventory.get("hosts") or {}).items():
+            data = (host or {}).get("data") or {}
+            ifaces = list(data.get("interfaces") or [])
+            if data.get("ip"):
+                ifaces.append({"name": data.get("interface"), "ip": data["ip"]})
+            for iface in ifaces:
+                ip = str(iface.get("ip", ""))
+                if "/" not in ip:
+                    hosts_without_prefix.append((name, iface.get("name"), ip))
+                    continue
+                try:
+                    network = ipaddress.ip_interface(ip).network
+                except ValueError:
+                    continue
+                segments.setdefault(network, []).append({"device": name, "interface": iface.get("name")})
+
+        # Hosts listed with a bare IP join whichever known segment contains it
+        known = list(segments) + list(self._subnet_index)
+        for name, iface, ip in hosts_without_prefix:
+            try:
+                addr = ipaddress.ip_address(ip)
+            except ValueError:
+                continue
+            for network in known:
+                if addr.version == network.version and addr in network:
+                    segments.setdefault(network, []).append({"device": name, "interface": iface})
+                    break
+
+        for network, endpoints in segments.items():
+            existing = set()
+            for link_id in self._subnet_index.get(network, []):
+                existing.update(_norm(ep["device"]) for ep in self.links[link_id]["endpoints"])
+            new = [ep for ep in endpoints if _norm(ep["device"]) not in existing]
+            if not new:
+                continue
+            if existing:
+                # Extend the physical link with the devices it didn't list
+                link_id = self._subnet_index[network][0]
+                self._extend_link(link_id, new)
+            elif len(new) > 1:
+                self.add_link(new, subnet=str(network), description="Derived from inventory addressing",
+                              link_id=f"inv:{network}", source="inventory")
+
+    def _extend_link(self, link_id: str, endpoints: List[Dict[str, str]]) -> None:
+        link = self.links[link_id]
+        old_keys = [_norm(ep["device"]) for ep in link["endpoints"]]
+        for ep in endpoints:
+            key = self.add_device(ep["device"])
+            link["endpoints"].append({"device": self.devices[key]["name"], "interface": ep.get("interface")})
+            if ep.get("interface"):
+                self._endpoint_index[(key, ep["interface"].lower())] = link_id
+            self._device_links[key].append(link_id)
+            for other in old_keys:
+                if other != key:
+                    self.adjacency[key].setdefault(other, []).append(link_id)
+                    self.adjacency[other].setdefault(key, []).append(link_id)
+            old_keys.append(key)
+
+    # --- Queries ---
+
+    def _key(self, device: str) -> str:
+        key = _norm(device)
+        if key not in self.devices:
+            raise KeyError(f"Device '{device}' not found in topology.")
+        return key
+
+    def neighbors(self, device: str) -> List[Dict[str, Any]]:
+        key = self._key(device)
+        result = []
+        for link_id in self._device_links[key]:
+            link = self.links[link_id]
+            local = [ep["interface"] for ep in link["endpoints"] if _norm(ep["device"]) == key]
+            for ep in link["endpoints"]:
+                if _norm(ep["device"]) == key:
+                    continue
+                result.append({
+                    "device": ep["device"],
+                    "remote_interface": ep["interface"],
+                    "local_interface": local[0] if local else None,
+                    "link": link_id,
+                    "subnet": link["subnet"],
+                })
+        return result
+
+    def _bfs_tree(self, src: str) -> Dict[str, Optional[Tuple[str, str]]]:
+        with self._lock:
+            tree = self._bfs_cache.get(src)
+        if tree is not None:
+            return tree
+
+        tree = {src: None}
+        queue = deque([src])
+        while queue:
+            node = queue.popleft()
+            for nbr, link_ids in self.adjacency[node].items():
+                if nbr not in tree:
+                    tree[nbr] = (node, link_ids[0])
+                    queue.append(nbr)
+
+        with self._lock:
+            self._bfs_cache[src] = tree
+        return tree
+
+    def _interface_on(self, link_id: str, device_key: str) -> Optional[str]:
+        for ep in self.links[link_id]["endpoints"]:
+            if _norm(ep["device"]) == device_key:
+                return ep["interface"]
+        return None
+
+    def path(self, source: str, target: str) -> Optional[List[Dict[str, Any]]]:
+        """Shortest hop path as a list of hops, or None if unreachable."""
+        src, dst = self._key(source), self._key(target)
+        tree = self._bfs_tree(src)
+        if dst not in tree:
+            return None
+
+        hops = []
+        node = dst
+        while tree[node] is not None:
+            prev, link_id = tree[node]
+            hops.append({
+                "from": self.devices[prev]["name"],
+                "out_interface": self._interface_on(link_id, prev),
+                "to": self.devices[node]["name"],
+                "in_interface": self._interface_on(link_id, node),
+                "link": link_id,
+            })
+            node = prev
+        hops.reverse()
+        return hops
+
+    def resolve_link(self, ref: str) -> str:
+        """Accepts a link id, a subnet, or a 'device:interface' endpoint."""
+        if ref in self.links:
+            return ref
+        if ":" in ref:
+            device, _, iface = ref.partition(":")
+            link_id = self._endpoint_index.get((_norm(device), iface.lower()))
+            if link_id:
+                return link_id
+        try:
+            network = ipaddress.ip_network(ref, strict=False)
+            if network in self._subnet_index:
+                return self._subnet_index[network][0]
+        except ValueError:
+            pass
+        raise KeyError(f"Link '{ref}' not found in topology.")
+
+    def blast_radius(self, ref: str) -> Dict[str, Any]:
+        """
+        Devices that lose reachability when a link fails. Only the connected
+        component that contains the link is walked.
+        """
+        link_id = self.resolve_link(ref)
+        link = self.links[link_id]
+        members = {_norm(ep["device"]) for ep in link["endpoints"]}
+
+        # Every device of the component is reachable from some member without
+        # crossing the failed link, so walking from each member is enough.
+        def walk(start):
+            seen = {start}
+            queue = deque([start])
+            while queue:
+                node = queue.popleft()
+                for nbr, link_ids in self.adjacency[node].items():
+                    if nbr in seen:
+                        continue
+                    if all(l == link_id for l in link_ids):
+                        continue
+                    seen.add(nbr)
+                    queue.append(nbr)
+            return seen
+
+        partitions = []
+        assigned = set()
+        for start in sorted(members):
+            if start in assigned:
+                continue
+            part = walk(start)
+            assigned |= part
+            partitions.append(part)
+
+        partitions.sort(key=len, reverse=True)
+        names = lambda keys: sorted(self.devices[k]["name"] for k in keys)
+        return {
+            "link": link_id,
+            "subnet": link["subnet"],
+            "endpoints": link["endpoints"],
+            "partitioned": len(partitions) > 1,
+            "isolated": names(set().union(*partitions[1:])) if len(partitions) > 1 else [],
+            "partitions": [names(p) for p in partitions],
+        }
+
+    def links_for_subnet(self, subnet: str) -> List[Dict[str, Any]]:
+        """Links whose subnet equals, contains, or is contained in `subnet`."""
+        query = ipaddress.ip_network(subnet, strict=False)
+        found = []
+
+        # Covering prefixes: walk up the supernets of the query
+        for plen in range(query.prefixlen, -1, -1):
+            found.extend(self._subnet_index.get(query.supernet(new_prefix=plen), []))
+
+        # Contained prefixes: range scan over the sorted network addresses
+        lo = bisect.bisect_left(self._subnet_sorted, (query.version, int(query.network_address)))
+        hi_addr = int(query.broadcast_address)
+        for version, start, network in self._subnet_sorted[lo:]:
+            if version != query.version or start > hi_addr:
+                break
+            if network.prefixlen > query.prefixlen:
+                found.extend(self._subnet_index[network])
+
+        seen = set()
+        return [self.links[l] for l in found if not (l in seen or seen.add(l))]
+
+    def summary(self) -> Dict[str, int]:
+        return {"devices": len(self.devices), "links": len(self.links)}
+
+_graph_lock = threading.Lock()
+_graph: Optional[TopologyGraph] = None
+_graph_stamp = None
+
+def _stamp(path):
+    try:
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
+def get_topology_graph() -> TopologyGraph:
+    """
+    Returns the process-wide graph, rebuilding it only when
+    topology_physical.yaml or inventory.yaml changed on disk.
+    """
+    global _graph, _graph_stamp
+    stamp = (_stamp(TOPOLOGY_PATH), _stamp(inventory_cache.path))
+    with _graph_lock:
+        if _graph is not None and stamp == _graph_stamp:
+            return _graph
+
+        physical = {}
+        try:
+            with open(TOPOLOGY_PATH, 'r') as f:
+                # The file may carry a leading '---' document marker
+                docs = [d for d in yaml.safe_load_all(f) if d]
+                physical = docs[0] if docs else {}
+        except (OSError, yaml.YAMLError) as e:
+            logger.warning("Building topology without physical links: %s", e)
+        try:
+            inventory = inventory_cache.get()
+        except (OSError, yaml.YAMLError) as e:
+            logger.warning("Building topology without inventory interfaces: %s", e)
+            inventory = {}
+
+        _graph = TopologyGraph.from_sources(physical, inventory)
+        _graph_stamp = stamp
+        return _graph